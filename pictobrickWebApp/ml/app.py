@@ -91,6 +91,7 @@ class Job:
     id: str
     status: JobStatus = JobStatus.PENDING
     progress: str = "Queued"
+    progress_fraction: float | None = None  # of the current sub-stage, when known
     glb_path: str | None = None
     error: str | None = None
 
@@ -114,6 +115,7 @@ def _run_pipeline(job_id: str, input_path: Path) -> None:
         try:
             from ptb_ml.pipeline import PipelineReq, run_pipeline
             from ptb_ml.preprocess.settings import MaskingSettings, PreprocessSettings
+            from ptb_ml.runtime import progress_sink
         except ImportError:
             _set(job_id, status=JobStatus.FAILED, progress="Failed",
                  error="Full pipeline not available in this container. "
@@ -128,10 +130,15 @@ def _run_pipeline(job_id: str, input_path: Path) -> None:
                 masking=MaskingSettings(enabled=False),
             ),
         )
-        result = run_pipeline(req)
+        # stages and COLMAP/ffmpeg sub-steps report here as they run
+        def on_progress(event) -> None:
+            _set(job_id, progress=event.describe(), progress_fraction=event.fraction)
+
+        with progress_sink(on_progress):
+            result = run_pipeline(req)
 
         if result.instructions and result.instructions.ok and result.instructions.glb_path:
-            _set(job_id, status=JobStatus.DONE, progress="Complete",
+            _set(job_id, status=JobStatus.DONE, progress="Complete", progress_fraction=1.0,
                  glb_path=str(result.instructions.glb_path))
         else:
             _set(job_id, status=JobStatus.FAILED,
@@ -160,6 +167,7 @@ class JobResp(BaseModel):
     job_id: str
     status: str
     progress: str
+    progress_fraction: float | None = None
     error: str | None = None
 
 
@@ -169,7 +177,8 @@ def get_job(job_id: str):
         job = _jobs.get(job_id)
     if not job:
         raise HTTPException(404, "Job not found")
-    return JobResp(job_id=job.id, status=job.status, progress=job.progress, error=job.error)
+    return JobResp(job_id=job.id, status=job.status, progress=job.progress,
+                   progress_fraction=job.progress_fraction, error=job.error)
 
 
 @app.get("/api/jobs/3d/{job_id}/glb")
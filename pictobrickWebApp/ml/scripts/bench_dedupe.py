@@ -0,0 +1,110 @@
+"""
+Benchmark indexed dedupe_keep_best against the original greedy O(n^2) loop.
+
+Uses synthetic phash clusters (random centres with a few flipped bits per
+member), so no frames need to be decoded — this measures the dedupe search only.
+
+Usage:
+    python scripts/bench_dedupe.py
+    python scripts/bench_dedupe.py --sizes 1000 10000 50000 --greedy-max 50000
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import imagehash
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from ptb_ml.preprocess.dedupe import dedupe_keep_best, score  # noqa: E402
+from ptb_ml.preprocess.hash_index import pack_hash_bits  # noqa: E402
+from ptb_ml.preprocess.quality import QualityMetrics  # noqa: E402
+from ptb_ml.preprocess.settings import PreprocessSettings  # noqa: E402
+
+
+def make_frames(n: int, hash_size: int, cluster_size: int, max_flips: int, seed: int):
+    rng = np.random.default_rng(seed)
+    nbits = hash_size * hash_size
+    centres = rng.integers(0, 2, size=(max(1, n // cluster_size), nbits), dtype=np.uint8).astype(bool)
+
+    keep, hashes = [], {}
+    for i in range(n):
+        bits = centres[rng.integers(len(centres))].copy()
+        flip = rng.choice(nbits, size=rng.integers(0, max_flips + 1), replace=False)
+        bits[flip] = ~bits[flip]
+        p = Path(f"frame_{i:06d}.jpg")
+        m = QualityMetrics(
+            sharpness=float(rng.uniform(50, 500)),
+            brightness=float(rng.uniform(0.2, 0.8)),
+            clip_high=0.0,
+            clip_low=0.0,
+        )
+        keep.append((p, m))
+        hashes[p] = imagehash.ImageHash(bits.reshape(hash_size, hash_size))
+    return keep, hashes
+
+
+def greedy_reference(keep, hashes, threshold):
+    """The pre-index dedupe loop: every frame scans every representative."""
+    selected, removed = [], []
+    for p, m in keep:
+        h = hashes[p]
+        for i, (sp, sm, sh) in enumerate(selected):
+            if (h - sh) <= threshold:
+                if score(m) > score(sm):
+                    removed.append(sp)
+                    selected[i] = (p, m, h)
+                else:
+                    removed.append(p)
+                break
+        else:
+            selected.append((p, m, h))
+    return [(p, m) for p, m, _ in selected], removed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark indexed vs greedy phash dedupe.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--hash-size", type=int, default=PreprocessSettings().dedupe_phash_size)
+    parser.add_argument("--threshold", type=int, default=PreprocessSettings().dedupe_hamming_threshold)
+    parser.add_argument("--cluster-size", type=int, default=4,
+                        help="Average frames per near-duplicate cluster")
+    parser.add_argument("--max-flips", type=int, default=8,
+                        help="Max bits flipped from the cluster centre")
+    parser.add_argument("--greedy-max", type=int, default=10000,
+                        help="Skip the greedy baseline above this many frames (it is quadratic)")
+    args = parser.parse_args()
+
+    settings = PreprocessSettings(
+        dedupe_phash_size=args.hash_size,
+        dedupe_hamming_threshold=args.threshold,
+    )
+
+    print(f"hash_size={args.hash_size} threshold={args.threshold} "
+          f"cluster_size~{args.cluster_size} max_flips={args.max_flips}")
+    print(f"{'frames':>8} {'kept':>8} {'indexed s':>10} {'greedy s':>10} {'speedup':>8}  same")
+
+    for n in args.sizes:
+        keep, hashes = make_frames(n, args.hash_size, args.cluster_size, args.max_flips, seed=n)
+
+        codes = {p: pack_hash_bits(h.hash) for p, h in hashes.items()}
+        t0 = time.perf_counter()
+        got = dedupe_keep_best(keep, settings, precomputed=codes)
+        t_index = time.perf_counter() - t0
+
+        if n <= args.greedy_max:
+            t0 = time.perf_counter()
+            ref = greedy_reference(keep, hashes, args.threshold)
+            t_greedy = time.perf_counter() - t0
+            print(f"{n:>8} {len(got[0]):>8} {t_index:>10.3f} {t_greedy:>10.3f} "
+                  f"{t_greedy / t_index:>7.1f}x  {got == ref}")
+        else:
+            print(f"{n:>8} {len(got[0]):>8} {t_index:>10.3f} {'skipped':>10} {'-':>8}  -")
+
+
+if __name__ == "__main__":
+    main()
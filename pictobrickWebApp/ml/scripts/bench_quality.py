@@ -0,0 +1,113 @@
+"""
+Benchmark reduced-resolution quality metrics against the exact full-frame metrics.
+
+Every input frame is also re-encoded with a few Gaussian blur levels so the set
+spans sharp to unusable. For each quality_scale it reports decode+metric time per
+frame and how often keep/drop decisions agree with the exact metrics, both for the
+blur rule alone and for the full passes_quality rules.
+
+--fit refits SHARPNESS_CALIBRATION (ln full = a + b ln reduced) on the same set;
+paste the printed table into preprocess/quality.py.
+
+Usage:
+    python scripts/bench_quality.py /path/to/job/frames
+    python scripts/bench_quality.py /path/to/job/frames --scales 2 4 --fit
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "src"))
+
+from ptb_ml.preprocess.quality import (  # noqa: E402
+    compute_metrics,
+    passes_quality,
+    read_gray,
+)
+from ptb_ml.preprocess.settings import PreprocessSettings  # noqa: E402
+
+
+def make_corpus(frame_dirs: list[Path], sigmas: list[float], out_dir: Path, limit: int) -> list[Path]:
+    srcs = sorted(p for d in frame_dirs for p in d.glob("*.jpg"))[:limit]
+    if not srcs:
+        sys.exit(f"No .jpg frames found in {', '.join(map(str, frame_dirs))}")
+
+    out: list[Path] = []
+    for i, src in enumerate(srcs):
+        bgr = cv2.imread(str(src), cv2.IMREAD_COLOR)
+        for sigma in sigmas:
+            img = cv2.GaussianBlur(bgr, (0, 0), sigma) if sigma > 0 else bgr
+            dst = out_dir / f"{i:05d}_s{sigma:g}.jpg"
+            cv2.imwrite(str(dst), img, [cv2.IMWRITE_JPEG_QUALITY, 95])
+            out.append(dst)
+    return out
+
+
+def fit_calibration(exact: np.ndarray, raw: np.ndarray, lo: float, hi: float) -> tuple[float, float]:
+    m = (exact > lo) & (exact < hi) & (raw > 0)
+    b, a = np.polyfit(np.log(raw[m]), np.log(exact[m]), 1)
+    return float(a), float(b)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark reduced-resolution quality metrics.")
+    parser.add_argument("frames", type=Path, nargs="+", help="Directories of .jpg frames")
+    parser.add_argument("--scales", type=int, nargs="+", default=[2, 4])
+    parser.add_argument("--sigmas", type=float, nargs="+", default=[0, 1, 2, 3, 4, 6],
+                        help="Gaussian blur levels (px) applied to every frame")
+    parser.add_argument("--limit", type=int, default=200, help="Max source frames")
+    parser.add_argument("--fit", action="store_true", help="Refit SHARPNESS_CALIBRATION")
+    parser.add_argument("--fit-range", type=float, nargs=2, default=[20.0, 400.0],
+                        help="Full-res sharpness range the fit is weighted to")
+    args = parser.parse_args()
+
+    settings = PreprocessSettings()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus = make_corpus(args.frames, args.sigmas, Path(tmp), args.limit)
+        print(f"{len(corpus)} frames ({len(corpus) // len(args.sigmas)} sources x {len(args.sigmas)} blur levels), "
+              f"min_sharpness={settings.min_sharpness}")
+
+        t0 = time.perf_counter()
+        exact = [compute_metrics(p) for p in corpus]
+        t_exact = (time.perf_counter() - t0) / len(corpus)
+        exact_sharp = np.array([m.sharpness for m in exact])
+        exact_blur = exact_sharp >= settings.min_sharpness
+        exact_pass = np.array([passes_quality(m, settings)[0] for m in exact])
+
+        print(f"{'scale':>5} {'ms/frame':>9} {'speedup':>8} {'blur agree':>11} {'pass agree':>11}")
+        print(f"{1:>5} {t_exact * 1e3:>9.2f} {1.0:>7.1f}x {1.0:>11.3f} {1.0:>11.3f}")
+
+        fits: dict[int, tuple[float, float]] = {}
+        for scale in args.scales:
+            t0 = time.perf_counter()
+            fast = [compute_metrics(p, scale=scale) for p in corpus]
+            t_fast = (time.perf_counter() - t0) / len(corpus)
+
+            blur_agree = np.mean((np.array([m.sharpness for m in fast]) >= settings.min_sharpness) == exact_blur)
+            pass_agree = np.mean(np.array([passes_quality(m, settings)[0] for m in fast]) == exact_pass)
+            print(f"{scale:>5} {t_fast * 1e3:>9.2f} {t_exact / t_fast:>7.1f}x {blur_agree:>11.3f} {pass_agree:>11.3f}")
+
+            if args.fit:
+                raw = np.array([
+                    cv2.Laplacian(read_gray(p, scale), cv2.CV_64F).var() for p in corpus
+                ])
+                fits[scale] = fit_calibration(exact_sharp, raw, *args.fit_range)
+
+        if args.fit:
+            print("\nSHARPNESS_CALIBRATION: dict[int, tuple[float, float]] = {")
+            print("    1: (0.0, 1.0),")
+            for scale, (a, b) in fits.items():
+                print(f"    {scale}: ({a:.4f}, {b:.4f}),")
+            print("}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Minimal dependency-graph executor for the pipeline stages.
+
+Each Task names the tasks it needs; run_graph starts a task on a worker thread as soon as
+all of its dependencies have finished and hands it the results so far, so independent
+branches (the COLMAP chain and the learned priors) run side by side and only join where a
+later stage consumes both. Tasks run under a copy of the caller's context, so progress
+events still reach the job's sink (see runtime/progress.py).
+
+If a task raises, no further tasks are started; the ones already running are waited for
+and the first exception is re-raised.
+"""
+from __future__ import annotations
+
+import contextvars
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Mapping, Sequence
+
+log = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class Task:
+    name: str
+    fn: Callable[[Mapping[str, Any]], Any]  # gets the results of all finished tasks
+    deps: tuple[str, ...] = ()
+
+
+def _check_graph(tasks: Sequence[Task]) -> None:
+    names = [t.name for t in tasks]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Duplicate task names in {names}")
+    known = set(names)
+    for t in tasks:
+        missing = [d for d in t.deps if d not in known]
+        if missing:
+            raise ValueError(f"Task '{t.name}' depends on unknown tasks {missing}")
+
+    # Kahn's algorithm: anything left over sits on a cycle
+    remaining = {t.name: set(t.deps) for t in tasks}
+    while True:
+        ready = [n for n, deps in remaining.items() if not deps]
+        if not ready:
+            break
+        for n in ready:
+            del remaining[n]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+    if remaining:
+        raise ValueError(f"Task graph has a cycle through {sorted(remaining)}")
+
+
+def run_graph(tasks: Sequence[Task], *, max_workers: int | None = None) -> dict[str, Any]:
+    """Run tasks in dependency order, at most max_workers at a time (None = no limit)."""
+    _check_graph(tasks)
+    if max_workers is not None and max_workers < 1:
+        raise ValueError(f"max_workers must be >= 1, got {max_workers}")
+
+    results: dict[str, Any] = {}
+    pending = list(tasks)
+    running: dict[Future, tuple[Task, float]] = {}
+    error: BaseException | None = None
+    limit = max_workers or max(1, len(tasks))
+
+    with ThreadPoolExecutor(max_workers=limit, thread_name_prefix="pipeline") as pool:
+        while pending or running:
+            if error is None:
+                for task in [t for t in pending if all(d in results for d in t.deps)]:
+                    if len(running) >= limit:
+                        break
+                    pending.remove(task)
+                    log.info(f"Pipeline task '{task.name}' started")
+                    ctx = contextvars.copy_context()
+                    fut = pool.submit(ctx.run, task.fn, dict(results))
+                    running[fut] = (task, time.perf_counter())
+            elif not running:
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for fut in done:
+                task, started = running.pop(fut)
+                elapsed = time.perf_counter() - started
+                exc = fut.exception()
+                if exc is not None:
+                    log.error(f"Pipeline task '{task.name}' failed after {elapsed:.1f}s: {exc}")
+                    if error is None:
+                        error = exc
+                    continue
+                results[task.name] = fut.result()
+                log.info(f"Pipeline task '{task.name}' finished in {elapsed:.1f}s")
+
+    if error is not None:
+        raise error
+    return results
@@ -1,16 +1,19 @@
 from __future__ import annotations
 
 import json
+import logging
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Literal
+from typing import Any, Callable, Literal, Mapping
 
 from ..preprocess.engine import PreprocessReq, PreprocessResult, run_preprocess
 from ..preprocess.io import JobWorkSpace
 from ..preprocess.settings import PreprocessSettings
+from ..runtime import cpu_lease, report_stage
 from ..sfm.engine import run_sfm
 from ..sfm.models import SfmReq, SfmResult
 from ..sfm.settings import SfmSettings
+from ..sfm.streaming import StreamingFeatureExtractor
 from ..sfm_qc.engine import run_sfm_qc
 from ..sfm_qc.models import SfmQcReq, SfmQcResult
 from ..sfm_qc.settings import SfmQcSettings
@@ -29,8 +32,11 @@ from ..brickification.settings import BrickificationSettings
 from ..instructions.engine import run_instructions
 from ..instructions.models import InstructionsReq, InstructionsResult
 from ..instructions.settings import InstructionsSettings
+from .graph import Task, run_graph
 
 
+log = logging.getLogger(__name__)
+
 # Maps preprocess source_type -> SfM input_mode
 _SOURCE_TO_MODE: dict[str, Literal["sequential", "unordered"]] = {
     "video": "sequential",
@@ -46,13 +52,21 @@ class PipelineReq:
     clean: bool = False
     preprocess_settings: PreprocessSettings = None  # defaults applied below
     sfm_settings: SfmSettings = None               # defaults applied below
-
+    priors_settings: PriorsSettings = None         # defaults applied below
+    sfm_qc_settings: SfmQcSettings = None          # defaults applied below
+    # run the priors next to the SfM chain; the CPU governor splits the cores between
+    # them unless sfm_settings / priors_settings set num_threads
+    concurrent_priors: bool = True
 
     def __post_init__(self) -> None:
         if self.preprocess_settings is None:
             object.__setattr__(self, "preprocess_settings", PreprocessSettings())
         if self.sfm_settings is None:
             object.__setattr__(self, "sfm_settings", SfmSettings())
+        if self.priors_settings is None:
+            object.__setattr__(self, "priors_settings", PriorsSettings(device="cpu"))
+        if self.sfm_qc_settings is None:
+            object.__setattr__(self, "sfm_qc_settings", SfmQcSettings())
 
 
 @dataclass(frozen=True)
@@ -83,10 +97,41 @@ def _read_source_type(manifest_path: Path) -> str:
     return source_type
 
 
-def _mask_dir_if_present(ws: JobWorkSpace) -> Path | None:
-    """Return ws.masks_dir only if the masking manifest was actually written."""
+def _mask_dir_if_present(ws: JobWorkSpace, tier: str = "full", mask_tier: str | None = "full") -> Path | None:
+    """Return ws.masks_dir only if the masking manifest was written for the same frame tier."""
     mask_manifest = ws.masks_dir / "mask_manifest.json"
-    return ws.masks_dir if mask_manifest.exists() else None
+    if not mask_manifest.exists():
+        return None
+    if mask_tier != tier:
+        log.warning(f"Masks were computed on the '{mask_tier}' frame tier, SfM reads '{tier}'; "
+                    "running SfM without masks")
+        return None
+    return ws.masks_dir
+
+
+def _frames_dir_for(ws: JobWorkSpace, tier: str, manifest_path: Path) -> tuple[Path, str]:
+    """Resolve a stage's frame tier to a directory, falling back to full if no work tier was written."""
+    if tier == "work":
+        with manifest_path.open(encoding="utf-8") as f:
+            has_work = json.load(f).get("work_max_side") is not None
+        if not has_work:
+            log.warning("frame_tier='work' requested but preprocess wrote no work tier; using frames/")
+            return ws.frames_dir, "full"
+    return ws.frames_dir_for(tier), tier
+
+
+def _read_mask_tier(manifest_path: Path) -> str | None:
+    with manifest_path.open(encoding="utf-8") as f:
+        # manifests from before tiers existed only had full-resolution masks
+        return json.load(f).get("mask_tier", "full")
+
+
+def _leased(stage: str, job_id: str, fn: Callable[[Mapping[str, Any]], Any]):
+    """Run a graph task under its own CPU governor lease (runtime/governor.py)."""
+    def run(done: Mapping[str, Any]) -> Any:
+        with cpu_lease(stage, job_id):
+            return fn(done)
+    return run
 
 
 def preprocess_to_sfm_req(
@@ -97,30 +142,60 @@ def preprocess_to_sfm_req(
     """Build an SfmReq from a completed PreprocessResult + its workspace."""
     source_type = _read_source_type(preprocess_result.manifest_path)
     input_mode = _SOURCE_TO_MODE[source_type]
+    image_dir, tier = _frames_dir_for(ws, sfm_settings.frame_tier, preprocess_result.manifest_path)
 
     return SfmReq(
         job_id=ws.job_id,
-        image_dir=ws.frames_dir,
+        image_dir=image_dir,
         output_dir=ws.sfm_dir,
         input_mode=input_mode,
         database_path=ws.sfm_database_path,
         sparse_dir=ws.sfm_sparse_dir,
         logs_dir=ws.sfm_logs_dir,
-        mask_dir=_mask_dir_if_present(ws),
+        mask_dir=_mask_dir_if_present(ws, tier, _read_mask_tier(preprocess_result.manifest_path)),
         manifest_path=preprocess_result.manifest_path,
     )
 
 
+def _feature_streamer(req: PipelineReq) -> StreamingFeatureExtractor | None:
+    """Streaming feature extraction for this job, or None when SfM needs the finished set."""
+    if not req.sfm_settings.stream_features:
+        return None
+    if req.preprocess_settings.masking.enabled or req.sfm_settings.frame_tier != "full":
+        log.info("stream_features needs unmasked full-resolution frames; extracting after preprocess")
+        return None
+    ws = JobWorkSpace(job_id=req.job_id, root=Path(req.base_dir) / req.job_id)
+    return StreamingFeatureExtractor(
+        job_id=req.job_id,
+        image_dir=ws.frames_dir,
+        database_path=ws.sfm_database_path,
+        logs_dir=ws.sfm_logs_dir,
+        settings=req.sfm_settings,
+    )
+
+
 def run_pipeline(req: PipelineReq) -> PipelineResult:
-    # --- Stage 1: Preprocess ---
+    # --- Stage 1: Preprocess, with SfM feature extraction streaming alongside ---
+    report_stage("preprocess", "Preprocessing frames")
+    streamer = _feature_streamer(req)
     preprocess_req = PreprocessReq(
         base_dir=req.base_dir,
         job_id=req.job_id,
         input_paths=req.input_paths,
         clean=req.clean,
         settings=req.preprocess_settings,
+        on_frames=streamer.add if streamer is not None else None,
     )
-    preprocess_result = run_preprocess(preprocess_req)
+    try:
+        with cpu_lease("preprocess", req.job_id):
+            preprocess_result = run_preprocess(preprocess_req)
+    except BaseException:
+        if streamer is not None:
+            streamer.close()
+        raise
+    if streamer is not None:
+        # waits for the last chunk; run_sfm picks the features up through the cache state
+        streamer.finish()
 
     if preprocess_result.kept_frames == 0:
         # No point running SfM with zero frames
@@ -135,10 +210,25 @@ def run_pipeline(req: PipelineReq) -> PipelineResult:
             best_model_dir=None,
             error="Preprocess produced zero kept frames; SfM skipped.",
         )
+        # every stage gets its entry, as in the graph path: QC routes a missing model
+        # orange, the stages after it were skipped (None)
+        sfm_qc_result = SfmQcResult(
+            job_id=req.job_id,
+            ok=False,
+            route="orange",
+            score=0.0,
+            error=sfm_result.error,
+        )
         return PipelineResult(
             job_id=req.job_id,
             preprocess=preprocess_result,
             sfm=sfm_result,
+            sfm_qc=sfm_qc_result,
+            priors=None,
+            shape_completion=None,
+            voxelization=None,
+            brickification=None,
+            instructions=None,
             ok=False,
             error=sfm_result.error,
         )
@@ -151,52 +241,65 @@ def run_pipeline(req: PipelineReq) -> PipelineResult:
 
     sfm_req = preprocess_to_sfm_req(preprocess_result, ws, req.sfm_settings)
 
-    # --- Stage 3: SfM ---
-    sfm_result = run_sfm(sfm_req, req.sfm_settings)
-
-    sfm_qc_result = run_sfm_qc(
-        SfmQcReq(
-            job_id=req.job_id,
-            sparse_model_dir=sfm_result.best_model_dir,
-            num_input_images=preprocess_result.kept_frames,
-        ),
-        SfmQcSettings(colmap_bin=req.sfm_settings.colmap_bin),
+    # --- Stage 3: SfM / SfM QC alongside the priors, joined at shape completion ---
+    priors_frames_dir, _ = _frames_dir_for(
+        ws, req.priors_settings.frame_tier, preprocess_result.manifest_path
     )
 
-    #Priors
-    priors_result:PriorsResult | None=None
-    if True: #sfm_qc_result.route == "orange": # temporary force routing to orange \
-        #for testing until blue implemented TODO
-        priors_result = run_priors(
+    def sfm_task(_: Mapping[str, Any]) -> SfmResult:
+        report_stage("sfm", "Reconstructing cameras")
+        # the match-graph pre-check (sfm_settings.precheck) skips the mapper and the watchdog
+        # (sfm_settings.watchdog) stops it early when QC could not route blue
+        return run_sfm(sfm_req, req.sfm_settings, req.sfm_qc_settings)
+
+    def sfm_qc_task(done: Mapping[str, Any]) -> SfmQcResult:
+        report_stage("sfm_qc", "Checking reconstruction")
+        return run_sfm_qc(
+            SfmQcReq(
+                job_id=req.job_id,
+                sparse_model_dir=done["sfm"].best_model_dir,
+                num_input_images=preprocess_result.kept_frames,
+            ),
+            req.sfm_qc_settings,
+        )
+
+    # the priors need only the frames, so they do not wait for the QC route; the orange
+    # stages below run whatever route QC picks, as there is no blue route to take instead
+    def priors_task(_: Mapping[str, Any]) -> PriorsResult:
+        report_stage("priors", "Estimating depth and normals")
+        return run_priors(
             PriorsReq(
                 job_id=req.job_id,
-                frames_dir=ws.frames_dir,
+                frames_dir=priors_frames_dir,
                 output_dir=ws.root / "priors",
             ),
-            PriorsSettings(device="cpu"),
-    )
-    """sfm_qc_result.route == "orange" and""" # dont check for orange pipeline 
-    # until all blue is added TODO
-    shape_result: ShapeCompletionResult | None = None
-    if  priors_result is not None and priors_result.ok:
-        shape_result = run_shape_completion(
+            req.priors_settings,
+        )
+
+    def shape_completion_task(done: Mapping[str, Any]) -> ShapeCompletionResult | None:
+        priors_result = done["priors"]
+        if not priors_result.ok:
+            return None
+        report_stage("shape_completion", "Completing shape")
+        return run_shape_completion(
             ShapeCompletionReq(
                 job_id=req.job_id,
-                frames_dir=ws.frames_dir,
+                frames_dir=priors_frames_dir,
                 depth_dir=priors_result.depth_dir,
                 normals_dir=priors_result.normals_dir,
                 segmentation_dir=priors_result.segmentation_dir,
                 output_dir=ws.root / "shape_completion",
-                sparse_model_dir=sfm_result.best_model_dir,
-                colmap_bin=req.sfm_settings.colmap_bin,
+                sparse_model_dir=done["sfm"].best_model_dir,
             ),
             ShapeCompletionSettings(),
         )
 
-    #Voxelization
-    voxel_result: VoxelizationResult | None = None
-    if shape_result is not None and shape_result.ok:
-        voxel_result = run_voxelization(
+    def voxelization_task(done: Mapping[str, Any]) -> VoxelizationResult | None:
+        shape_result = done["shape_completion"]
+        if shape_result is None or not shape_result.ok:
+            return None
+        report_stage("voxelization", "Voxelizing")
+        return run_voxelization(
             VoxelizationReq(
                 job_id=req.job_id,
                 tsdf_path=shape_result.tsdf_path,
@@ -205,10 +308,12 @@ def run_pipeline(req: PipelineReq) -> PipelineResult:
             VoxelizationSettings(),
         )
 
-    # Brickification
-    brickification_result: BrickificationResult | None = None
-    if voxel_result is not None and voxel_result.ok:
-        brickification_result = run_brickification(
+    def brickification_task(done: Mapping[str, Any]) -> BrickificationResult | None:
+        voxel_result = done["voxelization"]
+        if voxel_result is None or not voxel_result.ok:
+            return None
+        report_stage("brickification", "Placing bricks")
+        return run_brickification(
             BrickificationReq(
                 job_id=req.job_id,
                 voxel_path=voxel_result.voxel_path,
@@ -217,29 +322,46 @@ def run_pipeline(req: PipelineReq) -> PipelineResult:
             BrickificationSettings(),
         )
 
-        # Instruction Generation and final outputs
-        instructions_result: InstructionsResult | None = None
-    if brickification_result is not None and brickification_result.ok:
-        instructions_result = run_instructions(
+    def instructions_task(done: Mapping[str, Any]) -> InstructionsResult | None:
+        brickification_result = done["brickification"]
+        if brickification_result is None or not brickification_result.ok:
+            return None
+        report_stage("instructions", "Generating instructions")
+        return run_instructions(
             InstructionsReq(
                 job_id=req.job_id,
                 bricks_path=brickification_result.bricks_path,
                 bom_path=brickification_result.bom_path,
                 output_dir=ws.root / "instructions",
-        ),
-        InstructionsSettings(),
+            ),
+            InstructionsSettings(),
+        )
+
+    stages = [
+        ("sfm", sfm_task, ()),
+        ("sfm_qc", sfm_qc_task, ("sfm",)),
+        ("priors", priors_task, ()),
+        ("shape_completion", shape_completion_task, ("sfm", "sfm_qc", "priors")),
+        ("voxelization", voxelization_task, ("shape_completion",)),
+        ("brickification", brickification_task, ("voxelization",)),
+        ("instructions", instructions_task, ("brickification",)),
+    ]
+    results = run_graph(
+        [Task(name, _leased(name, req.job_id, fn), deps) for name, fn, deps in stages],
+        max_workers=None if req.concurrent_priors else 1,
     )
+    sfm_result = results["sfm"]
 
     return PipelineResult(
         job_id=req.job_id,
         preprocess=preprocess_result,
         sfm=sfm_result,
-        sfm_qc= sfm_qc_result,
-        priors=priors_result,
-        shape_completion=shape_result,
-        voxelization=voxel_result,
-        brickification=brickification_result,
-        instructions=instructions_result,
+        sfm_qc=results["sfm_qc"],
+        priors=results["priors"],
+        shape_completion=results["shape_completion"],
+        voxelization=results["voxelization"],
+        brickification=results["brickification"],
+        instructions=results["instructions"],
         ok=sfm_result.ok,
         error=sfm_result.error,
-    )
\ No newline at end of file
+    )
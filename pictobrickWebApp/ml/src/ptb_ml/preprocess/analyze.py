@@ -0,0 +1,154 @@
+"""analyze.py — fused per-frame analysis pass.
+
+Decodes every frame exactly once and derives everything the later preprocess
+steps need from that single decode:
+
+    quality metrics   -> score_and_filter (on a 1/quality_scale reduction of the
+                         decoded frame when quality_scale > 1)
+    perceptual hash   -> dedupe_keep_best (workers return the small DCT input,
+                         the DCTs run afterwards as one phash_batch call)
+    width / height    -> FrameRecord
+    sky mask          -> run_masking (only when the sky backend is enabled,
+                         and only for frames that pass the quality gate)
+
+Frames are fanned out over a ProcessPoolExecutor; results come back in the
+same order as the input paths. Workers are started with forkserver (spawn where
+that is unavailable): the pipeline process runs other stages on threads, and
+forking it could copy a lock held by one of them into the workers.
+"""
+
+from __future__ import annotations
+
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, Sequence
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from ..runtime.governor import cpu_budget
+from .dedupe import phash_batch, phash_input
+from .masking import _sky_mask
+from .quality import QualityMetrics, metrics_from_gray, passes_quality, reduce_gray
+from .settings import PreprocessSettings
+
+log = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class FrameAnalysis:
+    path: Path
+    width: int
+    height: int
+    metrics: QualityMetrics
+    # (4*hash_size)^2 grayscale thumbnail from phash_input
+    phash_thumb: np.ndarray
+    # np.packbits of the boolean sky mask (True = mask out), None if not computed
+    sky_packed: Optional[np.ndarray] = None
+
+    def sky_mask(self) -> Optional[np.ndarray]:
+        """Unpack the sky mask back to a (height, width) bool array."""
+        if self.sky_packed is None:
+            return None
+        flat = np.unpackbits(self.sky_packed, count=self.width * self.height)
+        return flat.reshape(self.height, self.width).astype(bool)
+
+
+def _wants_sky(settings: PreprocessSettings) -> bool:
+    m = settings.masking
+    return m.enabled and "sky_hsv" in m.backend.strip().lower()
+
+
+def analyze_frame(path: Path, settings: PreprocessSettings) -> FrameAnalysis:
+    """
+    Decode one frame and compute metrics, phash, dims and (optionally) the sky mask.
+    quality_scale only reduces the frame the metrics run on; the phash always comes
+    from the full-resolution pixels so dedupe does not depend on it.
+    """
+    bgr = cv2.imread(str(path), cv2.IMREAD_COLOR)
+    if bgr is None:
+        raise ValueError(f"Could not read image at {path}")
+
+    h, w = bgr.shape[:2]
+    gray = cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
+    rgb = cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB)
+
+    scale = settings.quality_scale
+    metrics = metrics_from_gray(reduce_gray(gray, scale), scale=scale)
+    # PIL's convert("L") of the RGB pixels, not `gray`: cv2 rounds the luma differently
+    # and the hash must equal imagehash.phash(Image.open(path)) (see phash_input)
+    thumb = phash_input(Image.fromarray(rgb), settings.dedupe_phash_size)
+
+    sky_packed: Optional[np.ndarray] = None
+    if _wants_sky(settings) and passes_quality(metrics, settings)[0]:
+        m = settings.masking
+        sky = _sky_mask(
+            rgb,
+            top_fraction=m.sky_top_fraction,
+            blue_strength=m.sky_blue_strength,
+            low_sat=m.sky_low_sat,
+            high_val=m.sky_high_val,
+        )
+        sky_packed = np.packbits(sky, axis=None)
+
+    return FrameAnalysis(
+        path=Path(path),
+        width=w,
+        height=h,
+        metrics=metrics,
+        phash_thumb=thumb,
+        sky_packed=sky_packed,
+    )
+
+
+def _analyze_star(args: tuple[Path, PreprocessSettings]) -> FrameAnalysis:
+    return analyze_frame(*args)
+
+
+def resolve_workers(workers: int) -> int:
+    """0 means one worker per CPU of the stage's budget (runtime/governor.py)."""
+    return workers if workers > 0 else cpu_budget()
+
+
+def _mp_context():
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+
+
+def _init_worker() -> None:
+    # parallelism comes from the pool; OpenCV threads per process would oversubscribe
+    cv2.setNumThreads(1)
+
+
+def analyze_frames(
+        frame_paths: Sequence[Path],
+        settings: PreprocessSettings,
+) -> list[FrameAnalysis]:
+    """
+    Run analyze_frame over every path, in parallel when analysis_workers != 1.
+    Returned list is in the same order as frame_paths.
+    """
+    paths = [Path(p) for p in frame_paths]
+    if not paths:
+        return []
+
+    workers = min(resolve_workers(settings.analysis_workers), len(paths))
+    if workers <= 1:
+        return [analyze_frame(p, settings) for p in paths]
+
+    log.info(f"Analyzing {len(paths)} frames with {workers} worker processes")
+    chunksize = max(1, len(paths) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers, mp_context=_mp_context(), initializer=_init_worker) as ex:
+        return list(ex.map(_analyze_star, [(p, settings) for p in paths], chunksize=chunksize))
+
+
+def phash_codes_for(analyses: Sequence[FrameAnalysis], hash_size: int) -> dict[Path, np.ndarray]:
+    """Batch-hash the thumbnails of an analysis pass into packed phash codes by path."""
+    if not analyses:
+        return {}
+    codes = phash_batch(np.stack([a.phash_thumb for a in analyses]), hash_size)
+    return {a.path: c for a, c in zip(analyses, codes)}
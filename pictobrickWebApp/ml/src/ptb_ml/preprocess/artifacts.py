@@ -0,0 +1,141 @@
+"""artifacts.py — background PNG writer shared by masking and priors.
+
+Stages hand finished arrays to an ArtifactWriter and carry on computing; encoding and
+file I/O run on a small thread pool (PIL's zlib encoder releases the GIL). At most
+max_pending arrays are queued, so a slow disk applies back-pressure instead of
+buffering the whole job in memory. flush() at stage end waits for every write,
+optionally fsyncs the files and their directories, and raises the first write error.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+from PIL import Image
+
+log = logging.getLogger(__name__)
+
+
+class ArtifactWriteError(RuntimeError):
+    """One or more background artifact writes failed."""
+
+
+class ArtifactWriter:
+    """
+    Bounded background PNG writer. workers=0 writes synchronously on the caller's thread
+    (same API, errors still surface at the latest on flush()). Arrays must not be
+    modified after they are submitted.
+    """
+
+    def __init__(self, *, workers:int = 2, max_pending:int = 0, fsync:bool = False) -> None:
+        if workers < 0:
+            raise ValueError(f"workers must be >= 0, got {workers}")
+        self.fsync = fsync
+        self._pool = (
+            ThreadPoolExecutor(max_workers=workers, thread_name_prefix="artifact-writer")
+            if workers > 0 else None
+        )
+        self._slots = threading.BoundedSemaphore(max_pending or 2 * max(1, workers))
+        self._lock = threading.Lock()
+        self._pending:list[Future] = []
+        self._written:list[Path] = []
+        self._dirs:set[Path] = set()
+        self._error:Optional[BaseException] = None
+
+    def write_png(
+            self,
+            array:np.ndarray,
+            path:Path,
+            *,
+            mode:Optional[str] = None,
+            compress_level:int = 6,
+    ) -> None:
+        """Queue `array` to be written to `path` as PNG (zlib level 0 = store .. 9 = smallest)."""
+        self._raise_if_failed()
+        path = Path(path)
+        if path.parent not in self._dirs:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._dirs.add(path.parent)
+
+        if self._pool is None:
+            self._write(array, path, mode, compress_level)
+            return
+
+        self._slots.acquire()  # back-pressure once max_pending writes are in flight
+        try:
+            fut = self._pool.submit(self._write, array, path, mode, compress_level)
+        except BaseException:
+            self._slots.release()
+            raise
+        fut.add_done_callback(self._on_done)
+        with self._lock:
+            self._pending.append(fut)
+
+    def flush(self) -> None:
+        """Wait for all queued writes, fsync them if requested, and raise the first failure."""
+        with self._lock:
+            pending, self._pending = self._pending, []
+        for fut in pending:
+            fut.exception()  # waits; failures were recorded by _on_done
+
+        if self._error is None and self.fsync:
+            with self._lock:
+                written, self._written = self._written, []
+            for p in written:
+                _fsync_path(p)
+            for d in self._dirs:
+                _fsync_path(d)
+
+        self._raise_if_failed()
+
+    def close(self) -> None:
+        try:
+            self.flush()
+        finally:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True)
+
+    def __enter__(self) -> ArtifactWriter:
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.close()
+            return
+        # the body already failed; finish in-flight writes without masking its exception
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+        if self._error is not None:
+            log.warning(f"Artifact write also failed: {self._error}")
+
+    def _write(self, array:np.ndarray, path:Path, mode:Optional[str], compress_level:int) -> None:
+        with Image.fromarray(array, mode=mode) as im:
+            im.save(path, format="PNG", compress_level=compress_level)
+        if self.fsync:
+            with self._lock:
+                self._written.append(path)
+
+    def _on_done(self, fut:Future) -> None:
+        self._slots.release()
+        exc = fut.exception()
+        if exc is not None:
+            with self._lock:
+                if self._error is None:
+                    self._error = exc
+
+    def _raise_if_failed(self) -> None:
+        if self._error is not None:
+            raise ArtifactWriteError(f"Artifact write failed: {self._error}") from self._error
+
+
+def _fsync_path(path:Path) -> None:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
@@ -1,58 +1,146 @@
 from __future__ import annotations
 
 from pathlib import Path
-from typing import List, Tuple
+from typing import List, Mapping, Optional, Tuple
 
 from PIL import Image
 import imagehash
+import numpy as np
 
+from .hash_index import HammingIndex, pack_hashes
 from .quality import QualityMetrics
 from .settings import PreprocessSettings
 
+# same factor imagehash.phash uses: DCT input is (hash_size * 4) square
+PHASH_HIGHFREQ_FACTOR = 4
+
 
 def phash(path:Path, hash_size:int) -> imagehash.ImageHash:
     with Image.open(path) as img:
         return imagehash.phash(img, hash_size=hash_size)
-    
+
+
+def phash_input(img:Image.Image | np.ndarray, hash_size:int) -> np.ndarray:
+    """
+    Downscale a frame to the grayscale square that phash runs its DCT on.
+    Uses the same convert('L') + LANCZOS resize as imagehash.phash, so stacking
+    these and calling phash_batch reproduces imagehash bit for bit. Pass the RGB
+    pixels of a colour frame, not a cv2 grayscale of it: cv2's BGR2GRAY rounds
+    differently from convert('L') and hashes near the threshold would flip.
+    """
+    if isinstance(img, np.ndarray):
+        img = Image.fromarray(img)
+    size = hash_size * PHASH_HIGHFREQ_FACTOR
+    small = img.convert("L").resize((size, size), Image.Resampling.LANCZOS)
+    return np.asarray(small, dtype=np.uint8)
+
+
+def _dct_rows(n:int, k:int) -> np.ndarray:
+    """First k rows of the unnormalized DCT-II matrix (scipy.fftpack.dct type 2)."""
+    j = np.arange(n)
+    return 2.0 * np.cos(np.pi * np.arange(k)[:, None] * (2 * j + 1) / (2 * n))
+
+
+def phash_batch(stack:np.ndarray, hash_size:int) -> np.ndarray:
+    """
+    Perceptual hash of a stack of phash_input frames, shape (n, 4*hash_size, 4*hash_size).
+    Returns packed uint64 codes, shape (n, words), identical to packing
+    imagehash.phash(...).hash for each frame.
+
+    The low-frequency DCT block is one batched matrix product. Frames whose
+    coefficients sit within float rounding of the median (flat images) are
+    recomputed with scipy's DCT, which is what imagehash uses.
+    """
+    stack = np.asarray(stack)
+    if stack.ndim != 3 or stack.shape[1] != stack.shape[2]:
+        raise ValueError(f"expected an (n, size, size) stack, got shape {stack.shape}")
+    n, size = stack.shape[0], stack.shape[1]
+    if size != hash_size * PHASH_HIGHFREQ_FACTOR:
+        raise ValueError(f"stack frames must be {hash_size * PHASH_HIGHFREQ_FACTOR}px for hash_size={hash_size}")
+    if n == 0:
+        return pack_hashes(np.zeros((0, hash_size * hash_size), dtype=bool))
+
+    pixels = stack.astype(np.float64)
+    d = _dct_rows(size, hash_size)
+    low = (d @ pixels @ d.T).reshape(n, -1)
+
+    # the bits only depend on which coefficients fall above the median, so they
+    # are exact unless the two values either side of the split are ~equal
+    nbits = low.shape[1]
+    srt = np.sort(low, axis=1)
+    k = nbits // 2
+    gap = srt[:, k] - srt[:, k - 1] if nbits % 2 == 0 else srt[:, k + 1] - srt[:, k]
+    tol = 1e-9 * (np.abs(srt).max(axis=1) + 1.0)
+    unsure = np.flatnonzero(gap <= tol)
+    if unsure.size:
+        import scipy.fftpack
+        ref = scipy.fftpack.dct(scipy.fftpack.dct(pixels[unsure], axis=1), axis=2)
+        low[unsure] = ref[:, :hash_size, :hash_size].reshape(unsure.size, -1)
+
+    bits = low > np.median(low, axis=1, keepdims=True)
+    return pack_hashes(bits)
+
+
+def phash_codes(paths:list[Path], hash_size:int) -> list[np.ndarray]:
+    """Packed phash codes for frames on disk, hashed as one batch."""
+    thumbs = []
+    for p in paths:
+        with Image.open(p) as img:
+            thumbs.append(phash_input(img, hash_size))
+    if not thumbs:
+        return []
+    return list(phash_batch(np.stack(thumbs), hash_size))
+
+
+def score(m:QualityMetrics) -> tuple[float, float]:
+    # maxamize sharpness, then minimize dist of brightness from 0.5
+    return(m.sharpness, -abs(m.brightness - 0.5))
+
 
 def dedupe_keep_best(
         keep:list[tuple[Path, QualityMetrics]],
-        settings:PreprocessSettings
+        settings:PreprocessSettings,
+        *,
+        precomputed:Optional[Mapping[Path, np.ndarray]] = None,
 ) -> tuple[list[tuple[Path, QualityMetrics]], list[Path]]:
     """
     Greedy dedupe: keep one representative for each near duplicate cluster
     "BEST" = highest sharpness, then brightness closer to mid
+    `precomputed` maps frame paths to packed phash codes (see phash_batch);
+    frames missing from it are read and hashed as one batch.
+    Each frame joins the earliest selected representative within the hamming
+    threshold; lookups go through a HammingIndex instead of a scan over all
+    representatives.
     returns (deduped_kept, removed_paths)
     """
 
-    hashes:list[tuple[Path, QualityMetrics, imagehash.ImageHash]] = []
-    for p,m in keep:
-        h = phash(p, hash_size=settings.dedupe_phash_size)
-        hashes.append((p, m, h))
+    precomputed = precomputed or {}
+    missing = [p for p, _ in keep if p not in precomputed]
+    computed = dict(zip(missing, phash_codes(missing, settings.dedupe_phash_size)))
+    codes = [precomputed[p] if p in precomputed else computed[p] for p, _ in keep]
+
+    nbits = settings.dedupe_phash_size * settings.dedupe_phash_size
+    index = HammingIndex(nbits, settings.dedupe_hamming_threshold)
 
-    selected:list[tuple[Path, QualityMetrics, imagehash.ImageHash]] = []
+    selected:list[tuple[Path, QualityMetrics]] = []
     removed:list[Path] = []
 
-    def score(m:QualityMetrics) -> tuple[float, float]:
-        # maxamize sharpness, then minimize dist of brightness from 0.5
-        return(m.sharpness, -abs(m.brightness - 0.5))
-    
-    for p, m, h in hashes:
-        found_cluster= False
-        for i, (sp, sm, sh) in enumerate(selected):
-            if (h - sh) <= settings.dedupe_hamming_threshold:
-                found_cluster = True
-                # same cluster, keep the better one
-                if score(m) > score(sm):
-                    # replace with current one
-                    removed.append(sp)
-                    selected[i] = (p, m, h)
-                else:
-                    # keep existing, remove current
-                    removed.append(p)
-                break
-
-        if not found_cluster:
-            selected.append((p, m, h))
-    deduped = [(p,m) for p, m, _ in selected]
-    return deduped, removed
\ No newline at end of file
+    for (p, m), c in zip(keep, codes):
+        i = index.first_within(c)
+        if i is None:
+            index.add(c)
+            selected.append((p, m))
+            continue
+
+        # same cluster, keep the better one
+        sp, sm = selected[i]
+        if score(m) > score(sm):
+            # replace with current one
+            removed.append(sp)
+            selected[i] = (p, m)
+            index.replace(i, c)
+        else:
+            # keep existing, remove current
+            removed.append(p)
+
+    return selected, removed
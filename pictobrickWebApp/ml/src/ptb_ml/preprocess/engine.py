@@ -1,18 +1,29 @@
 from __future__ import annotations
 
+from collections import Counter
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Union
+from typing import Callable, Optional, Sequence, Union
 
 from .io import JobWorkSpace
 from .settings import PreprocessSettings
 from . import ingest
-from .video import extract_frames_ffmpeg
+from .video import (
+    extract_frames_budgeted,
+    extract_frames_ffmpeg,
+    extract_frames_streaming,
+    extract_videos_parallel,
+    plan_frame_budget,
+    probe_video,
+)
 from .quality import score_and_filter
 from .dedupe import dedupe_keep_best
+from .hash_index import code_to_hex
 from .models import FrameRecord, DroppedRec
 from .manifest import build_min_manifest, write_manifest
 from .masking import run_masking, MaskingRunResults
+from .analyze import analyze_frames, phash_codes_for, resolve_workers
+from .work_tier import WorkFrame, write_work_tier
 
 
 
@@ -23,6 +34,9 @@ class PreprocessReq:
     input_paths: list [str | Path]
     clean: bool = False
     settings: PreprocessSettings = field(default_factory=PreprocessSettings)
+    # called with frames as they land in frames/, before quality/dedupe see the whole set
+    # (see sfm/streaming.py); names are final, files are not rewritten afterwards
+    on_frames: Optional[Callable[[Sequence[Path]], None]] = None
 
 
 @dataclass(frozen=True)
@@ -35,12 +49,6 @@ class PreprocessResult:
     deduped_frames:int
 
 
-def _frame_dims(path:Path) -> tuple[int, int]:
-    from PIL import Image
-    with Image.open(path) as im:
-        return im.size[0], im.size[1]
-
-
 def run_preprocess(req:PreprocessReq) -> PreprocessResult:
     s = req.settings
     ws = JobWorkSpace.create(req.base_dir, req.job_id, clean=req.clean)
@@ -48,46 +56,129 @@ def run_preprocess(req:PreprocessReq) -> PreprocessResult:
     #stage raw uploads
     staged = ingest.stage_raw_inputs(ws, req.input_paths)
 
+    reported: set[Path] = set()
+
+    def report_new_frames() -> None:
+        if req.on_frames is None:
+            return
+        new = [p for p in ws.list_frames() if p not in reported]
+        reported.update(new)
+        if new:
+            req.on_frames(new)
+
+    def report_frame(p: Path) -> None:
+        reported.add(p)
+        req.on_frames([p])
+
     #split inputs by type
     img_paths, vid_paths = ingest.split_inputs(staged)
 
     #normalize image inputs into frames
     next_idx = 0
+    ingest_counts = {m: 0 for m in ingest.INGEST_METHODS}
     if img_paths:
-        _, next_idx = ingest.normalize_images_to_frames(ws, img_paths, start_idx=next_idx)
+        ingested = ingest.ingest_images(
+            ws,
+            img_paths,
+            start_idx=next_idx,
+            workers=s.ingest_workers,
+            max_side=s.ingest_max_side,
+            draft=s.ingest_jpeg_draft,
+            passthrough=s.ingest_passthrough,
+        )
+        next_idx = ingested.next_idx
+        ingest_counts = ingested.counts
+        report_new_frames()
 
     #extract video frames
-    for vp in vid_paths:
-        next_idx= extract_frames_ffmpeg(ws, vp, start_idx=next_idx, settings=s)
-
-        # Soft cap: stop if we hit max frames
-        frames_now = ws.list_frames()
-        if len(frames_now) >= s.max_video_frames:
-            print(f"Reached max frames limit of {s.max_video_frames} after processing {vp.name}, stopping further video processing.")
-            break
+    stream_dropped: list[tuple[str, str]] = []
+    if s.video_extraction == "budget":
+        # Hard cap: max_video_frames is planned up front from the video durations
+        infos = [probe_video(vp) for vp in vid_paths]
+        budgets = plan_frame_budget([i.duration_s for i in infos], s.max_video_frames, fps=s.fps)
+        for vp, info, budget in zip(vid_paths, infos, budgets):
+            next_idx = extract_frames_budgeted(
+                ws, vp, settings=s, budget=budget, start_idx=next_idx, info=info
+            )
+            report_new_frames()
+    elif s.video_extraction == "files" and (s.video_workers != 1 or s.video_segment_seconds > 0):
+        # segments are renumbered once all are decoded, so frames are final only here
+        next_idx = extract_videos_parallel(ws, vid_paths, settings=s, start_idx=next_idx)
+        report_new_frames()
+    else:
+        for vp in vid_paths:
+            if s.video_extraction == "stream":
+                streamed = extract_frames_streaming(
+                    ws, vp, start_idx=next_idx, settings=s,
+                    on_frame=report_frame if req.on_frames is not None else None,
+                )
+                next_idx = streamed.next_idx
+                stream_dropped.extend((label, reason) for label, reason, _ in streamed.dropped)
+            else:
+                next_idx= extract_frames_ffmpeg(ws, vp, start_idx=next_idx, settings=s)
+            report_new_frames()
+
+            # Soft cap: stop if we hit max frames
+            frames_now = ws.list_frames()
+            if len(frames_now) >= s.max_video_frames:
+                print(f"Reached max frames limit of {s.max_video_frames} after processing {vp.name}, stopping further video processing.")
+                break
     all_frames = ws.list_frames()
 
-    kept_scored, dropped_scored = score_and_filter(all_frames, s)
+    # decode every frame once: metrics, phash, dims and sky mask in one pass
+    analyses = analyze_frames(all_frames, s)
+    analysis = {a.path: a for a in analyses}
 
-    deduped_kept, deduped_removed = dedupe_keep_best(kept_scored, s)
+    kept_scored, dropped_scored = score_and_filter(
+        all_frames, s, precomputed={p: a.metrics for p, a in analysis.items()}
+    )
+
+    phash_codes = phash_codes_for([analysis[p] for p, _ in kept_scored], s.dedupe_phash_size)
+    deduped_kept, deduped_removed = dedupe_keep_best(kept_scored, s, precomputed=phash_codes)
 
     kept_frame_paths = [p for p, _ in deduped_kept] 
 
-    masking_results = run_masking(
-        image_paths=kept_frame_paths,
-        image_root=ws.frames_dir,
-        output_dir=ws.masks_dir,
-        settings=s.masking
-    )
+    # downscaled tier for the stages that don't need full resolution
+    work: dict[Path, WorkFrame] = {}
+    if s.work_max_side > 0:
+        work = write_work_tier(
+            ws,
+            kept_frame_paths,
+            max_side=s.work_max_side,
+            workers=resolve_workers(s.analysis_workers),
+        )
+
+    # temporal masking picks keyframes over the video frames; codes by name serve both tiers
+    mask_codes = {p.name: c for p, c in phash_codes.items()}
+    if s.masking.frame_tier == "work":
+        masking_results = run_masking(
+            image_paths=[work[p].path for p in kept_frame_paths],
+            image_root=ws.frames_work_dir,
+            output_dir=ws.masks_dir,
+            settings=s.masking,
+            temporal=bool(vid_paths),
+            phash_codes=mask_codes,
+        )
+    else:
+        masking_results = run_masking(
+            image_paths=kept_frame_paths,
+            image_root=ws.frames_dir,
+            output_dir=ws.masks_dir,
+            settings=s.masking,
+            precomputed_sky=lambda p: analysis[p].sky_mask() if p in analysis else None,
+            temporal=bool(vid_paths),
+            phash_codes=mask_codes,
+        )
 
+    # tiers share file names, so look masks up by frame name
     mask_lookup: dict[str, str] = {}
     if masking_results:
         for fs in masking_results.frames:
-            mask_lookup[fs.image] = fs.mask
+            mask_lookup[Path(fs.image).name] = fs.mask
 
     frame_records:list[FrameRecord] = []
     for p,m in sorted(deduped_kept, key=lambda t: t[0].name):
-        w,h = _frame_dims(p)
+        w,h = analysis[p].width, analysis[p].height
         frame_records.append(
             FrameRecord(
                 id=p.stem,
@@ -96,11 +187,18 @@ def run_preprocess(req:PreprocessReq) -> PreprocessResult:
                 height=h,
                 sharpness=m.sharpness,
                 exposure=m.brightness,
-                mask_path=mask_lookup.get(str(p)),
+                mask_path=mask_lookup.get(p.name),
+                phash=code_to_hex(phash_codes[p]) if p in phash_codes else None,
+                work_path=str(work[p].path.relative_to(ws.root)) if p in work else None,
+                work_width=work[p].width if p in work else None,
+                work_height=work[p].height if p in work else None,
+                work_scale=work[p].scale if p in work else None,
             )
         )
 
-    dropped_records: list[DroppedRec] = []
+    dropped_records: list[DroppedRec] = [
+        DroppedRec(path=label, reason=reason) for label, reason in stream_dropped
+    ]
     for p, reason, m in dropped_scored:
         dropped_records.append(
             DroppedRec(
@@ -122,6 +220,8 @@ def run_preprocess(req:PreprocessReq) -> PreprocessResult:
         frame_records, 
         dropped_records,
         source_type="video" if vid_paths else "image_set",
+        work_max_side=s.work_max_side if s.work_max_side > 0 else None,
+        mask_tier=s.masking.frame_tier if masking_results is not None else None,
     )
     manifest_path = write_manifest(ws, manifest)
 
@@ -131,15 +231,28 @@ def run_preprocess(req:PreprocessReq) -> PreprocessResult:
         "settings": {
             "fps": s.fps,
             "max_video_frames": s.max_video_frames,
+            "ingest_workers": s.ingest_workers,
+            "ingest_max_side": s.ingest_max_side,
+            "ingest_jpeg_draft": s.ingest_jpeg_draft,
+            "ingest_passthrough": s.ingest_passthrough,
+            "video_extraction": s.video_extraction,
+            "budget_candidates_per_window": s.budget_candidates_per_window,
+            "video_workers": s.video_workers,
+            "video_segment_seconds": s.video_segment_seconds,
             "min_sharpness": s.min_sharpness,
             "min_brightness": s.min_brightness,
             "max_brightness": s.max_brightness,
             "max_clip_high": s.max_clip_high,
             "max_clip_low": s.max_clip_low,
+            "quality_scale": s.quality_scale,
             "dedupe_phash_size": s.dedupe_phash_size,
             "dedupe_hamming_threshold": s.dedupe_hamming_threshold,
+            "analysis_workers": s.analysis_workers,
+            "work_max_side": s.work_max_side,
         },
+        "ingest": ingest_counts,
         "counts": {
+            "dropped_during_extraction": len(stream_dropped),
             "total_frames_found": len(all_frames),
             "kept_after_quality": len(kept_scored),
             "dropped_after_quality": len(dropped_scored),
@@ -153,6 +266,7 @@ def run_preprocess(req:PreprocessReq) -> PreprocessResult:
             "backend": s.masking.backend,
             "masked_frames": masking_results.masked_frames,
             "bad_for_sfm_frames": masking_results.bad_for_sfm_frames,
+            "provenance": dict(Counter(fs.provenance for fs in masking_results.frames)),
             "manifest_path": str(masking_results.manifest_path.relative_to(ws.root)),
     } 
     else:
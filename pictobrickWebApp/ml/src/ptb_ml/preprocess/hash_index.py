@@ -0,0 +1,164 @@
+"""hash_index.py — bit-packed perceptual hashes and a Hamming-radius index.
+
+Hashes are stored as rows of uint64 words (bits packed MSB first, zero padded).
+Distances are computed with a byte popcount table over XOR-ed rows, so a query
+against many candidates is a single vectorized numpy expression.
+
+HammingIndex implements multi-index hashing: the nbits of each code are split
+into (max_distance + 1) disjoint chunks, and every chunk value is bucketed.
+By the pigeonhole principle two codes within max_distance bits agree exactly
+on at least one chunk, so only codes sharing a bucket need to be verified.
+When the chunks would get too small to be selective the index degrades to a
+vectorized linear scan, which is still exact.
+"""
+
+from __future__ import annotations
+
+from typing import Optional
+
+import numpy as np
+
+_POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+# below this many bits per chunk the buckets stop pruning anything useful
+_MIN_CHUNK_BITS = 8
+
+
+def pack_hash_bits(bits: np.ndarray) -> np.ndarray:
+    """Pack one boolean hash (any shape, row-major) into a row of uint64 words."""
+    return pack_hashes(np.asarray(bits, dtype=bool).reshape(1, -1))[0]
+
+
+def pack_hashes(bits: np.ndarray) -> np.ndarray:
+    """Pack an (n, nbits) boolean matrix into an (n, words) uint64 matrix."""
+    bits = np.asarray(bits, dtype=bool)
+    if bits.ndim != 2:
+        raise ValueError(f"expected an (n, nbits) array, got shape {bits.shape}")
+    packed = np.packbits(bits, axis=1)
+    pad = (-packed.shape[1]) % 8
+    if pad:
+        packed = np.pad(packed, ((0, 0), (0, pad)))
+    return np.ascontiguousarray(packed).view(">u8").astype(np.uint64)
+
+
+def hamming(codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+    """Hamming distance between every row of `codes` (n, words) and `query` (words,)."""
+    x = np.bitwise_xor(codes, query)
+    return _POPCOUNT8[x.view(np.uint8)].reshape(x.shape[0], -1).sum(axis=1, dtype=np.int64)
+
+
+def code_to_hex(code: np.ndarray) -> str:
+    """Hex string of one packed code (16 digits per uint64 word), as stored in the manifest."""
+    return "".join(f"{int(w):016x}" for w in code)
+
+
+def codes_from_hex(hexes: list[str]) -> np.ndarray:
+    """Inverse of code_to_hex for equally long codes -> (n, words) uint64 matrix."""
+    return np.array(
+        [[int(h[i:i + 16], 16) for i in range(0, len(h), 16)] for h in hexes],
+        dtype=np.uint64,
+    ).reshape(len(hexes), -1)
+
+
+def _code_to_int(code: np.ndarray) -> int:
+    v = 0
+    for w in code:
+        v = (v << 64) | int(w)
+    return v
+
+
+class HammingIndex:
+    """
+    Mutable set of codes addressed by slot id, answering
+    "lowest slot id within max_distance of this code".
+    """
+
+    def __init__(self, nbits: int, max_distance: int, *, words: Optional[int] = None) -> None:
+        if nbits <= 0:
+            raise ValueError(f"nbits must be > 0, got {nbits}")
+        if max_distance < 0:
+            raise ValueError(f"max_distance must be >= 0, got {max_distance}")
+
+        self.nbits = nbits
+        self.max_distance = max_distance
+        self.words = words if words is not None else (nbits + 63) // 64
+        self._total_bits = self.words * 64
+
+        self._codes = np.zeros((16, self.words), dtype=np.uint64)
+        self._n = 0
+
+        num_chunks = max_distance + 1
+        self.linear = nbits // num_chunks < _MIN_CHUNK_BITS
+        self._bounds: list[tuple[int, int]] = []
+        self._tables: list[dict[int, set[int]]] = []
+        self._keys: list[tuple[int, ...]] = []
+        if not self.linear:
+            edges = np.linspace(0, nbits, num_chunks + 1).astype(int)
+            self._bounds = [(int(a), int(b)) for a, b in zip(edges[:-1], edges[1:])]
+            self._tables = [{} for _ in self._bounds]
+
+    def __len__(self) -> int:
+        return self._n
+
+    def _chunk_keys(self, code: np.ndarray) -> tuple[int, ...]:
+        v = _code_to_int(code)
+        return tuple(
+            (v >> (self._total_bits - end)) & ((1 << (end - start)) - 1)
+            for start, end in self._bounds
+        )
+
+    def _index(self, slot: int, keys: tuple[int, ...]) -> None:
+        for table, key in zip(self._tables, keys):
+            table.setdefault(key, set()).add(slot)
+
+    def _unindex(self, slot: int, keys: tuple[int, ...]) -> None:
+        for table, key in zip(self._tables, keys):
+            bucket = table.get(key)
+            if bucket is not None:
+                bucket.discard(slot)
+                if not bucket:
+                    del table[key]
+
+    def add(self, code: np.ndarray) -> int:
+        """Append a code, returning its slot id."""
+        if self._n == self._codes.shape[0]:
+            self._codes = np.concatenate([self._codes, np.zeros_like(self._codes)])
+        slot = self._n
+        self._codes[slot] = code
+        self._n += 1
+        if not self.linear:
+            keys = self._chunk_keys(code)
+            self._keys.append(keys)
+            self._index(slot, keys)
+        return slot
+
+    def replace(self, slot: int, code: np.ndarray) -> None:
+        """Overwrite the code stored at an existing slot."""
+        if not (0 <= slot < self._n):
+            raise IndexError(f"slot {slot} out of range")
+        self._codes[slot] = code
+        if not self.linear:
+            self._unindex(slot, self._keys[slot])
+            keys = self._chunk_keys(code)
+            self._keys[slot] = keys
+            self._index(slot, keys)
+
+    def first_within(self, code: np.ndarray) -> Optional[int]:
+        """Lowest slot id whose code is within max_distance of `code`, else None."""
+        if self._n == 0:
+            return None
+
+        if self.linear:
+            cands = np.arange(self._n)
+        else:
+            found: set[int] = set()
+            for table, key in zip(self._tables, self._chunk_keys(code)):
+                bucket = table.get(key)
+                if bucket:
+                    found.update(bucket)
+            if not found:
+                return None
+            cands = np.fromiter(sorted(found), dtype=np.int64, count=len(found))
+
+        hits = cands[hamming(self._codes[cands], code) <= self.max_distance]
+        return int(hits[0]) if hits.size else None
@@ -1,7 +1,12 @@
 from __future__ import annotations
 
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
 from typing import Iterable, Tuple, List
+from ..runtime.governor import cpu_budget
 from .io import JobWorkSpace
 from PIL import Image, ImageOps
 
@@ -32,37 +37,138 @@ def split_inputs(paths:Iterable[str | Path]) -> tuple[list[Path], list[Path]]:
     return imgs, vids
 
 
+# EXIF tag 274
+_ORIENTATION_TAG = 0x0112
+
+INGEST_METHODS = ("hardlink", "copy", "reencode")
+
+
+@dataclass(frozen=True)
+class IngestResult:
+    written:list[Path]
+    next_idx:int
+    # how many frames took each INGEST_METHODS path
+    counts:dict[str, int] = field(default_factory=dict)
+
+
+def _is_passthrough(im:Image.Image, max_side:int) -> bool:
+    """True when saving `im` as a frame would only re-encode an already upright baseline RGB JPEG."""
+    if im.format != "JPEG" or im.mode != "RGB":
+        return False
+    if im.info.get("progressive") or im.info.get("progression"):
+        return False
+    if im.getexif().get(_ORIENTATION_TAG, 1) != 1:
+        return False
+    return not (max_side > 0 and max(im.size) > max_side)
+
+
+def _place_file(src:Path, dst:Path) -> str:
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        os.link(src, dst)
+        return "hardlink"
+    except OSError:
+        shutil.copyfile(src, dst)
+        return "copy"
+
+
+def _normalize_one(
+        src:Path,
+        dst:Path,
+        *,
+        jpg_quality:int,
+        max_side:int,
+        draft:bool,
+        passthrough:bool = False,
+) -> str:
+    """Write one frame, returning the INGEST_METHODS path it took."""
+    with Image.open(src) as im:
+        if passthrough and _is_passthrough(im, max_side):
+            return _place_file(src, dst)
+        if max_side > 0 and max(im.size) > max_side:
+            r = max_side / max(im.size)
+            if draft and im.format == "JPEG":
+                # let libjpeg decode at 1/2, 1/4 or 1/8 scale, never below the target size
+                im.draft("RGB", (round(im.size[0] * r), round(im.size[1] * r)))
+        im = ImageOps.exif_transpose(im)  # Fix orientation based on EXIF
+        if im.mode != "RGB":
+            im = im.convert("RGB")  # Ensure RGB format for JPEG
+        if max_side > 0 and max(im.size) > max_side:
+            im.thumbnail((max_side, max_side), Image.LANCZOS)
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        im.save(dst, format="JPEG", quality=jpg_quality)
+    return "reencode"
+
+
+def ingest_images(
+        ws: JobWorkSpace,
+        image_paths: Iterable[Path],
+        *,
+        start_idx:int = 0,
+        jpg_quality:int = 95,
+        workers:int = 1,
+        max_side:int = 0,
+        draft:bool = True,
+        passthrough:bool = True,
+) -> IngestResult:
+    """
+    Place image inputs into frames/ as JPEGs, in input order.
+    With `passthrough`, upright baseline RGB JPEGs that need no resize are hardlinked
+    (or byte-copied across filesystems) instead of being decoded and re-encoded.
+    See normalize_images_to_frames for the other options.
+    """
+    srcs = list(image_paths)
+    dsts = [ws.frame_path(start_idx + i, ext=".jpg") for i in range(len(srcs))]
+
+    def _one(pair:tuple[Path, Path]) -> str:
+        return _normalize_one(
+            pair[0], pair[1],
+            jpg_quality=jpg_quality, max_side=max_side, draft=draft, passthrough=passthrough,
+        )
+
+    n_workers = min(workers or cpu_budget(), len(srcs))
+    if n_workers <= 1:
+        methods = [_one(pair) for pair in zip(srcs, dsts)]
+    else:
+        # Pillow releases the GIL while decoding/encoding, so threads scale
+        with ThreadPoolExecutor(max_workers=n_workers) as ex:
+            methods = list(ex.map(_one, zip(srcs, dsts)))
+
+    counts = {m: methods.count(m) for m in INGEST_METHODS}
+    return IngestResult(written=dsts, next_idx=start_idx + len(dsts), counts=counts)
+
+
 def normalize_images_to_frames(
         ws: JobWorkSpace,
         image_paths: Iterable[Path],
         *,
         start_idx:int = 0,
         jpg_quality:int = 95,
+        workers:int = 1,
+        max_side:int = 0,
+        draft:bool = True,
 ) -> tuple[list[Path], int]:
     """
     Reads image inputs, fixes EXIF orientation, converts to RGB, and saves as JPEG frames in the workspace.
+    With max_side > 0 images are downscaled so their long side fits (JPEGs use draft-mode decoding
+    when `draft`), and workers != 1 normalizes in a thread pool (0 = one per CPU).
+    Frame indices follow the order of image_paths regardless of workers.
     Returns a list of frame paths and the next available index after the last frame.
     """
-    written:list[Path] = []
-    idx = start_idx
-
-    for src in image_paths:
-        dst = ws.frame_path(idx, ext=".jpg")
-
-        with Image.open(src) as im:
-            im = ImageOps.exif_transpose(im)  # Fix orientation based on EXIF
-            if im.mode != "RGB":
-                im = im.convert("RGB")  # Ensure RGB format for JPEG
-            dst.parent.mkdir(parents=True, exist_ok=True)
-            im.save(dst, format="JPEG", quality=jpg_quality)
-        
-        written.append(dst)
-        idx += 1
-
-    return written, idx
+    res = ingest_images(
+        ws,
+        image_paths,
+        start_idx=start_idx,
+        jpg_quality=jpg_quality,
+        workers=workers,
+        max_side=max_side,
+        draft=draft,
+        passthrough=False,
+    )
+    return res.written, res.next_idx
 
 
 def stage_raw_inputs(ws: JobWorkSpace, input_paths: Iterable[str | Path]) -> list[Path]:
-    """Copy raw uploads into ws.inputs_dir for traceability."""
+    """Stage raw uploads into ws.inputs_dir for traceability (see JobWorkSpace.stage_inputs)."""
     return ws.stage_inputs(input_paths, copy=True)
 
@@ -36,6 +36,27 @@ def mask_path(*, image_path: Path, image_root: Path, mask_root: Path) -> Path:
         rel = image_path.relative_to(image_root)
         return mask_root / rel.parent / f"{rel.name}.png"
 
+# Linux FICLONE ioctl: share extents copy-on-write (btrfs, xfs, overlayfs on those)
+_FICLONE = 0x40049409
+
+
+def _reflink(src:Path, dst:Path) -> None:
+    """Clone src into a new file dst, raising OSError if the filesystem can't."""
+    try:
+        import fcntl
+    except ImportError as e:  # not on Linux
+        raise OSError("reflink not supported on this platform") from e
+
+    with open(src, "rb") as fs, open(dst, "xb") as fd:
+        try:
+            fcntl.ioctl(fd.fileno(), _FICLONE, fs.fileno())
+        except OSError:
+            fd.close()
+            dst.unlink(missing_ok=True)
+            raise
+    shutil.copystat(src, dst)
+
+
 def _atomic_write_bytes(dst:Path, data:bytes) -> None:
     """Atomic Write to dst by writing to a tmp file in the same direcroty then replace"""
     ensure_dir(dst.parent)
@@ -72,6 +93,7 @@ def atomic_write_json(dst:Path, obj:Any, *, indent:int=2) -> None:
 class WorkSpace:
     """Standardized DIR layout for preproc outputs """
     frames_dirname:str = "frames"
+    frames_work_dirname:str = "frames_work"
     masks_dirname:str = "masks"
     metadata_filename:str = "metadata"
     logs_dirname:str = "logs"
@@ -80,6 +102,7 @@ class WorkSpace:
 
     manifest_filename:str = "manifest.json"
     quality_report_filename:str = "quality_report.json"
+    staging_filename:str = "staging.json"
 
     sfm_dirname="sfm"
 
@@ -90,10 +113,12 @@ class JobWorkSpace:
     job_root/
         inputs/
         frames/
+        frames_work/    (optional downscaled copies of the kept frames)
         masks/
         metadata/
             manifest.json
             queality_report.json
+            staging.json
         logs/
         tmp/
     """
@@ -151,6 +176,18 @@ class JobWorkSpace:
     def frames_dir(self) -> Path:
         return self.root / self.layout.frames_dirname
     
+    @property
+    def frames_work_dir(self) -> Path:
+        return self.root / self.layout.frames_work_dirname
+
+    def frames_dir_for(self, tier:str) -> Path:
+        """frames/ for the "full" tier, frames_work/ for "work"."""
+        if tier == "full":
+            return self.frames_dir
+        if tier == "work":
+            return self.frames_work_dir
+        raise ValueError(f"Unknown frame tier '{tier}', expected full|work")
+
     @property
     def masks_dir(self) -> Path:
         return self.root / self.layout.masks_dirname
@@ -174,6 +211,10 @@ class JobWorkSpace:
     @property
     def quality_report_path(self) -> Path:
         return self.metadata_dir / self.layout.quality_report_filename  
+
+    @property
+    def staging_path(self) -> Path:
+        return self.metadata_dir / self.layout.staging_filename
     
     # ----- Utility Methods ----- #
     def frame_path(self, index:int, ext:str=".jpg") -> Path:
@@ -196,9 +237,38 @@ class JobWorkSpace:
         atomic_write_text(log_path, text)
         return log_path
     
+    def _stage_one(self, src:Path, dst:Path) -> str:
+        """
+        Place src at dst as cheaply as possible, returning the strategy used:
+        rename (src already inside this job) -> reflink -> hardlink -> copy.
+        """
+        if src.is_relative_to(self.root):
+            try:
+                os.rename(src, dst)
+                return "rename"
+            except OSError:
+                pass  # e.g. a different mount inside the job dir
+        try:
+            _reflink(src, dst)
+            return "reflink"
+        except OSError:
+            pass
+        try:
+            os.link(src, dst)
+            return "hardlink"
+        except OSError:
+            pass
+        shutil.copy2(src, dst)
+        return "copy"
+
     def stage_inputs(self, input_paths: Iterable[Path | str], *, copy:bool=True) -> list[Path]:
-        """Stage raw uploads inot  inputs/ . IF copy=False, moves instead"""
+        """
+        Stage raw uploads inot  inputs/ . IF copy=False, moves instead.
+        With copy=True the upload is only renamed when the job already owns it, otherwise it is
+        reflinked, hardlinked or copied (first that works). Strategies go to metadata/staging.json
+        """
         staged: list[Path] = []
+        records: list[dict[str, str]] = []
         for p in input_paths:
             src = Path(p).resolve()
             if not src.exists():
@@ -207,10 +277,15 @@ class JobWorkSpace:
             if dst.exists():
                 raise FileExistsError(f"Staged file {dst} already exists")
             if copy:
-                shutil.copy2(src, dst)
+                strategy = self._stage_one(src, dst)
             else:
                 shutil.move(str(src), str(dst))
+                strategy = "move"
             staged.append(dst)
+            records.append({"source": str(src), "staged": str(dst.relative_to(self.root)), "strategy": strategy})
+
+        if records:
+            atomic_write_json(self.staging_path, {"inputs": records})
         return staged
     
 
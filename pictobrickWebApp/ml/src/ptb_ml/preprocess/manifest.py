@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from pathlib import Path
-from typing import Iterable, Literal
+from typing import Iterable, Literal, Optional
 
 from .io import JobWorkSpace
 from .models import DroppedRec, FrameRecord, Manifest
@@ -14,12 +14,16 @@ def build_min_manifest(
         dropped:Iterable[DroppedRec],
         *,
         source_type:SourceType,
+        work_max_side:Optional[int] = None,
+        mask_tier:Optional[str] = None,
     ) -> Manifest:
     return Manifest(
         job_id=job_id,
         source_type=source_type,
         frames=list(frames),
-        dropped_frames=list(dropped)
+        dropped_frames=list(dropped),
+        work_max_side=work_max_side,
+        mask_tier=mask_tier,
     )
 
 def write_manifest(ws: JobWorkSpace, manifest: Manifest) -> Path:
@@ -19,13 +19,17 @@ import json
 import logging
 from dataclasses import dataclass, asdict
 from pathlib import Path
-from typing import Any, Iterable, Optional, Sequence
+from functools import lru_cache, partial
+from typing import Any, Callable, Iterable, Mapping, Optional, Sequence
 from .io import mask_path
 
+import cv2
 import numpy as np
 from PIL import Image, ImageFilter
 
+from .artifacts import ArtifactWriter
 from .settings import MaskingSettings
+from .temporal import backward_flow, plan_keyframes, read_flow_frame, warp_mask
 
 log =logging.getLogger(__name__)
 
@@ -39,6 +43,11 @@ class MaskingFrameStatus:
     masked_ratio:float
     bad_for_sfm:bool
     notes:tuple[str, ...] = ()
+    # inferred (backend ran) | keyframe | propagated (warped from `keyframe`) | fallback
+    # (flow confidence too low, backend ran and the frame became the new keyframe)
+    provenance:str = "inferred"
+    keyframe:Optional[str] = None
+    flow_confidence:Optional[float] = None
 
 
 @dataclass(frozen=True)
@@ -56,9 +65,17 @@ def run_masking(
         output_dir:Path,
         *,
         settings: MaskingSettings,
+        precomputed_sky: Optional[Callable[[Path], Optional[np.ndarray]]] = None,
+        temporal: bool = False,
+        phash_codes: Optional[Mapping[str, np.ndarray]] = None,
 ) -> Optional[MaskingRunResults]:
     """ Validate the config and run the masking. Returns None if masking is disabled. """
     """ Creates per pixel mask -PNGs where 255=foreground, 0=background. Returns summary results. """
+    """ precomputed_sky(path) may return the sky mask from the fused analysis pass; the frame
+    is then only decoded again if deeplab needs the pixels. """
+    """ temporal=True marks the frames as one video sequence; with settings.temporal the backend
+    then only runs on keyframes (phash_codes, keyed by frame file name, drive the
+    keyframe_phash_distance rule) and the other masks are propagated by optical flow. """
     if not isinstance(settings, MaskingSettings):
         raise TypeError("settings must be a MaskingSettings instance")
 
@@ -82,72 +99,51 @@ def run_masking(
             classes_to_mask=settings.semantic_classes_to_mask
     )
 
-    stats:list[MaskingFrameStatus] = []
-    bad_count = 0
+    paths: list[Path] = []
     for img_p in image_paths:
         img_p = Path(img_p)
         if not img_p.exists():
             log.warning(f"Masking: image path {img_p} does not exist, skipping.")
             continue
+        paths.append(img_p)
+
+    # deeplab frames go through the model deeplab_batch_size at a time
+    chunk_size = settings.deeplab_batch_size if deeplab_ctx is not None else 1
+
+    def infer(chunk:Sequence[Path]) -> list[tuple[np.ndarray, list[str]]]:
+        return _infer_chunk(
+            chunk,
+            use_sky=use_sky,
+            deeplab_ctx=deeplab_ctx,
+            precomputed_sky=precomputed_sky,
+            settings=settings,
+            batch_size=chunk_size,
+        )
 
-        rgb= _read_rgb(img_p)
-        h,w = rgb.shape[:2]
-
-        keep = np.ones((h,w), dtype=bool)
-        notes: list[str] = []
+    # PNG encoding runs in the background while the next frames are masked
+    writer = ArtifactWriter(workers=settings.artifact_writer_workers, fsync=settings.artifact_fsync)
+    write = partial(
+        _finish_mask, settings=settings, image_root=image_root, output_dir=output_dir, writer=writer
+    )
 
-        if use_sky:
-            sky = _sky_mask(
-                rgb,
-                top_fraction= settings.sky_top_fraction,
-                blue_strength= settings.sky_blue_strength,
-                low_sat= settings.sky_low_sat,
-                high_val= settings.sky_high_val
+    use_temporal = temporal and settings.temporal
+    stats:list[MaskingFrameStatus] = []
+    with writer:
+        if use_temporal:
+            stats = _mask_temporal(
+                paths, infer, write, settings=settings, phash_codes=phash_codes, chunk_size=chunk_size
             )
-            keep[sky] = False
-            notes.append("sky_hsv")
-
-        if use_deeplab and deeplab_ctx is not None:
-            sem = _deeplab_mask(rgb, deeplab_ctx)
-            keep[sem] = False
-            notes.append("deeplab")
-
-        if settings.dilation_px and settings.dilation_px > 0:
-            keep = _dilate_masked_out(keep, dilation_px= settings.dilation_px)
-
-        
-        unmasked_ratio = float(np.mean(keep))
-        masked_ratio = 1.0 - unmasked_ratio
-        bad_for_sfm = unmasked_ratio < settings.min_unmasked_ratio
-        if bad_for_sfm:
-            bad_count += 1
-            notes.append(f"low_unmasked_ratio<{settings.min_unmasked_ratio:g}")
-        
-        mask_u8 = np.where(keep, 255, 0).astype(np.uint8)
-        mask_p = mask_path(
-            image_path=img_p,
-            image_root=image_root,
-            mask_root=output_dir,
-        )
-        _write_mask(mask_u8, mask_p)
-
-        stats.append(
-            MaskingFrameStatus(
-                image=str(img_p),
-                mask=str(mask_p),
-                width=w,
-                height=h,   
-                unmasked_ratio=unmasked_ratio,
-                masked_ratio=masked_ratio,
-                bad_for_sfm=bad_for_sfm,
-                notes=tuple(notes)
-            )   
-            
-        )
-    
+        else:
+            for start in range(0, len(paths), chunk_size):
+                chunk = paths[start:start + chunk_size]
+                for img_p, (masked_out, notes) in zip(chunk, infer(chunk)):
+                    stats.append(write(img_p, masked_out, notes))
+    bad_count = sum(int(st.bad_for_sfm) for st in stats)
+
     payload: dict[str, Any] = {
         "version": 1,
         "backend": settings.backend,
+        "temporal": use_temporal,
         "masked_frames": len(stats),
         "bad_for_sfm_frames": bad_count,
         "frames": [asdict(s) for s in stats]
@@ -166,6 +162,171 @@ def run_masking(
 
 
 
+def _infer_chunk(
+        chunk:Sequence[Path],
+        *,
+        use_sky:bool,
+        deeplab_ctx:Optional["_DeepLabCtx"],
+        precomputed_sky:Optional[Callable[[Path], Optional[np.ndarray]]],
+        settings:MaskingSettings,
+        batch_size:int,
+) -> list[tuple[np.ndarray, list[str]]]:
+    """Run the backend on a chunk of frames: (masked-out bool HxW, notes) per frame."""
+    skies = [
+        precomputed_sky(p) if (use_sky and precomputed_sky is not None) else None
+        for p in chunk
+    ]
+    rgbs = [
+        _read_rgb(p) if (sky is None or deeplab_ctx is not None) else None
+        for p, sky in zip(chunk, skies)
+    ]
+    sems = (
+        _deeplab_masks(rgbs, deeplab_ctx, batch_size=batch_size)
+        if deeplab_ctx is not None else [None] * len(chunk)
+    )
+    return [
+        _masked_out(sky, rgb, sem, use_sky=use_sky, settings=settings)
+        for sky, rgb, sem in zip(skies, rgbs, sems)
+    ]
+
+
+def _masked_out(
+        sky:Optional[np.ndarray],
+        rgb:Optional[np.ndarray],
+        sem:Optional[np.ndarray],
+        *,
+        use_sky:bool,
+        settings:MaskingSettings,
+) -> tuple[np.ndarray, list[str]]:
+    """Union of the sky / semantic masks of one frame (True = mask out)."""
+    h,w = rgb.shape[:2] if rgb is not None else sky.shape[:2]
+
+    out = np.zeros((h,w), dtype=bool)
+    notes: list[str] = []
+
+    if use_sky:
+        if sky is None:
+            sky = _sky_mask(
+                rgb,
+                top_fraction= settings.sky_top_fraction,
+                blue_strength= settings.sky_blue_strength,
+                low_sat= settings.sky_low_sat,
+                high_val= settings.sky_high_val
+            )
+        out |= sky
+        notes.append("sky_hsv")
+
+    if sem is not None:
+        out |= sem
+        notes.append("deeplab")
+
+    return out, notes
+
+
+def _finish_mask(
+        img_p:Path,
+        masked_out:np.ndarray,
+        notes:list[str],
+        *,
+        settings:MaskingSettings,
+        image_root:Path,
+        output_dir:Path,
+        writer:ArtifactWriter,
+        provenance:str = "inferred",
+        keyframe:Optional[Path] = None,
+        flow_confidence:Optional[float] = None,
+) -> MaskingFrameStatus:
+    """Dilate a frame's masked-out region, write the PNG and summarize it."""
+    h,w = masked_out.shape
+    keep = ~masked_out
+    notes = list(notes)
+
+    if settings.dilation_px and settings.dilation_px > 0:
+        keep = _dilate_masked_out(keep, dilation_px= settings.dilation_px)
+
+    unmasked_ratio = float(np.mean(keep))
+    masked_ratio = 1.0 - unmasked_ratio
+    bad_for_sfm = unmasked_ratio < settings.min_unmasked_ratio
+    if bad_for_sfm:
+        notes.append(f"low_unmasked_ratio<{settings.min_unmasked_ratio:g}")
+
+    mask_u8 = np.where(keep, 255, 0).astype(np.uint8)
+    mask_p = mask_path(
+        image_path=img_p,
+        image_root=image_root,
+        mask_root=output_dir,
+    )
+    _write_mask(mask_u8, mask_p, writer, compress_level=settings.png_compress_level)
+
+    return MaskingFrameStatus(
+        image=str(img_p),
+        mask=str(mask_p),
+        width=w,
+        height=h,
+        unmasked_ratio=unmasked_ratio,
+        masked_ratio=masked_ratio,
+        bad_for_sfm=bad_for_sfm,
+        notes=tuple(notes),
+        provenance=provenance,
+        keyframe=str(keyframe) if keyframe is not None else None,
+        flow_confidence=flow_confidence,
+    )
+
+
+def _mask_temporal(
+        paths:Sequence[Path],
+        infer:Callable[[Sequence[Path]], list[tuple[np.ndarray, list[str]]]],
+        write:Callable[..., MaskingFrameStatus],
+        *,
+        settings:MaskingSettings,
+        phash_codes:Optional[Mapping[str, np.ndarray]],
+        chunk_size:int,
+) -> list[MaskingFrameStatus]:
+    """
+    Keyframe masking over frames in name (= time) order. Keyframes are inferred chunk_size
+    at a time; each following frame gets its keyframe's mask warped along the flow, or is
+    inferred itself and takes over as keyframe when the flow is not trustworthy.
+    """
+    ordered = sorted(paths, key=lambda p: p.name)
+    codes = [phash_codes.get(p.name) if phash_codes else None for p in ordered]
+    is_key = plan_keyframes(
+        codes, stride=settings.keyframe_stride, phash_distance=settings.keyframe_phash_distance
+    )
+    key_pos = [i for i, k in enumerate(is_key) if k]
+
+    stats:list[MaskingFrameStatus] = []
+    for start in range(0, len(key_pos), chunk_size):
+        batch = key_pos[start:start + chunk_size]
+        for i, (masked_out, notes) in zip(batch, infer([ordered[i] for i in batch])):
+            key_p = ordered[i]
+            stats.append(write(key_p, masked_out, notes, provenance="keyframe"))
+
+            key_flow = None
+            j = i + 1
+            while j < len(ordered) and not is_key[j]:
+                cur_p = ordered[j]
+                if key_flow is None:
+                    key_flow = read_flow_frame(key_p, settings.flow_max_side)
+                cur_flow = read_flow_frame(cur_p, settings.flow_max_side)
+                flow, conf = backward_flow(key_flow, cur_flow)
+                if flow is not None and conf >= settings.min_flow_confidence:
+                    stats.append(write(
+                        cur_p, warp_mask(masked_out, flow, cur_flow.size), [*notes, "propagated"],
+                        provenance="propagated", keyframe=key_p, flow_confidence=conf,
+                    ))
+                else:
+                    log.info(f"Masking: flow confidence {conf:.2f} from {key_p.name} to {cur_p.name}, "
+                             "running the backend")
+                    cur_out, cur_notes = infer([cur_p])[0]
+                    stats.append(write(
+                        cur_p, cur_out, cur_notes,
+                        provenance="fallback", keyframe=key_p, flow_confidence=conf,
+                    ))
+                    key_p, masked_out, notes, key_flow = cur_p, cur_out, cur_notes, cur_flow
+                j += 1
+    return stats
+
+
 def _read_rgb(path:Path) -> np.ndarray:
     with Image.open(path) as im:
         im = im.convert("RGB")
@@ -214,29 +375,99 @@ def _init_deeplab_ctx(*, device:str, classes_to_mask:tuple[str, ...]) -> _DeepLa
         preprocess=preprocess,
     )
 
-def _deeplab_mask(rgb:np.ndarray, ctx: _DeepLabCtx) -> np.ndarray:
+def _deeplab_masks(
+        rgbs:Sequence[np.ndarray],
+        ctx: _DeepLabCtx,
+        *,
+        batch_size:int = 4,
+) -> list[np.ndarray]:
+    """
+    Boolean HxW masks (True = class to mask) for a list of RGB frames.
+    Frames of the same size are stacked into batches of up to batch_size. The argmax is
+    taken at model resolution and only the 1-channel class mask is upsampled (nearest)
+    to frame size, instead of interpolating all 21 logit channels.
+    """
     import torch
-    import torch.nn.functional as F
-    
+
+    out:list[Optional[np.ndarray]] = [None] * len(rgbs)
     if not ctx.class_ids_to_mask:
-        return np.zeros(rgb.shape[:2], dtype=bool)
-    
-    h,w = rgb.shape[:2]
+        return [np.zeros(rgb.shape[:2], dtype=bool) for rgb in rgbs]
 
-    pil = Image.fromarray(rgb, mode="RGB")
-    input_tensor = ctx.preprocess(pil).unsqueeze(0).to(ctx.device)  
+    groups: dict[tuple[int, int], list[int]] = {}
+    for i, rgb in enumerate(rgbs):
+        groups.setdefault(rgb.shape[:2], []).append(i)
 
-    with torch.no_grad():
-        out = ctx.model(input_tensor)["out"]
-        out = F.interpolate(
-            out,
-            size=(h, w),
-            mode="bilinear",
-            align_corners=False
-        )
-        pred = out.argmax(1).squeeze(0).cpu().numpy().astype(np.int32)
+    ids = torch.tensor(sorted(ctx.class_ids_to_mask), device=ctx.device)
+    with torch.inference_mode():
+        for (h, w), idxs in groups.items():
+            for start in range(0, len(idxs), batch_size):
+                part = idxs[start:start + batch_size]
+                batch = torch.stack([
+                    ctx.preprocess(Image.fromarray(rgbs[i], mode="RGB")) for i in part
+                ]).to(ctx.device)
+                pred = ctx.model(batch)["out"].argmax(1)
+                hits = torch.isin(pred, ids).to(torch.uint8).cpu().numpy()
+                for i, hit in zip(part, hits):
+                    out[i] = cv2.resize(hit, (w, h), interpolation=cv2.INTER_NEAREST).astype(bool)
+
+    return out  # type: ignore[return-value]
+
+
+def _deeplab_mask(rgb:np.ndarray, ctx: _DeepLabCtx) -> np.ndarray:
+    """Single-frame wrapper around _deeplab_masks."""
+    return _deeplab_masks([rgb], ctx, batch_size=1)[0]
+
+
+def _sky_terms(
+        r:np.ndarray,
+        g:np.ndarray,
+        b:np.ndarray,
+        *,
+        blue_strength:float,
+        low_sat:float,
+        high_val:float,
+) -> tuple[np.ndarray, np.ndarray]:
+    """The float32 sky rules on channels in [0, 1]: (blue dominant, bright and grey)."""
+    blue_dom = (b - np.maximum(r, g)) > blue_strength
+
+    maxc = np.maximum(np.maximum(r, g), b)
+    minc = np.minimum(np.minimum(r, g), b)
+    val = maxc
+    sat = np.where(maxc > 1e-6, (maxc - minc) / maxc, 0.0)
+
+    cloudy = (sat < low_sat) & (val > high_val)
+    return blue_dom, cloudy
 
-    return np.isin(pred, list(ctx.class_ids_to_mask))
+
+@lru_cache(maxsize=8)
+def _sky_thresholds(blue_strength:float, low_sat:float, high_val:float) -> Optional[tuple[np.ndarray, np.ndarray]]:
+    """
+    Per-value uint8 thresholds for the integer sky mask:
+        blue_dom <=> b > blue_thr[max(r, g)]      cloudy <=> min > cloudy_thr[max]
+    blue_dom only depends on (b, max(r, g)) and is monotone in b; cloudy only on (max, min)
+    and is monotone in min, since float32 rounding never breaks monotonicity. The tables are
+    read off _sky_terms evaluated on every uint8 pair, so results are bit-identical.
+    255 means "never" (nothing exceeds it). "Always" (true at 0 already) has no uint8
+    threshold; it only occurs outside MaskingSettings' ranges (blue_strength < 0,
+    low_sat > 1, high_val < 0), and then None is returned.
+    """
+    v = np.arange(256, dtype=np.uint8).astype(np.float32) / 255.0
+    hi = np.repeat(v, 256).reshape(256, 256)   # rows
+    lo = np.tile(v, 256).reshape(256, 256)     # columns
+
+    with np.errstate(invalid="ignore"):  # 0/0 at black, discarded by the np.where
+        # rows b, columns max(r, g): r = g = max(r, g) leaves blue_dom unchanged
+        blue_dom, _ = _sky_terms(lo, lo, hi, blue_strength=blue_strength, low_sat=low_sat, high_val=high_val)
+        # rows max, columns min: (r, g, b) = (max, min, min) has that max and min
+        _, cloudy = _sky_terms(hi, lo, lo, blue_strength=blue_strength, low_sat=low_sat, high_val=high_val)
+
+    # only min <= max ever occurs
+    cloudy &= np.tril(np.ones((256, 256), dtype=bool))
+    if blue_dom[0].any() or cloudy[:, 0].any():
+        return None
+    blue_thr = np.where(blue_dom.any(axis=0), blue_dom.argmax(axis=0) - 1, 255)
+    cloudy_thr = np.where(cloudy.any(axis=1), cloudy.argmax(axis=1) - 1, 255)
+    return blue_thr.astype(np.uint8), cloudy_thr.astype(np.uint8)
 
 
 def _sky_mask(
@@ -250,36 +481,75 @@ def _sky_mask(
     """
     Returns boolean mask of where true means mask out
     only considers top portion of the image as the sky to avoid confusing for blue objects
+    uint8-only version of _sky_mask_float (same output, see _sky_thresholds).
     """
 
+    thresholds = _sky_thresholds(blue_strength, low_sat, high_val)
+    if thresholds is None:
+        with np.errstate(invalid="ignore"):
+            return _sky_mask_float(rgb, top_fraction=top_fraction, blue_strength=blue_strength,
+                                   low_sat=low_sat, high_val=high_val)
+    blue_thr, cloudy_thr = thresholds
+
     h,w = rgb.shape[:2]
     top_h= int(max(1, min(h, round(h * top_fraction))))
-    region = rgb[:top_h].astype(np.float32) / 255.0
+    top = np.ascontiguousarray(rgb[:top_h])
+    r, g, b = (cv2.extractChannel(top, c) for c in range(3))
 
-    r= region[...,0]
-    g = region[...,1]
-    b = region[...,2]
+    rg_max = cv2.max(r, g)
+    sky = cv2.compare(b, cv2.LUT(rg_max, blue_thr), cv2.CMP_GT)
+    maxc = cv2.max(rg_max, b, dst=rg_max)
+    minc = cv2.min(cv2.min(r, g, dst=r), b, dst=r)
+    cloudy = cv2.compare(minc, cv2.LUT(maxc, cloudy_thr), cv2.CMP_GT)
+    cv2.bitwise_or(sky, cloudy, dst=sky)
 
-    blue_dom = (b - np.maximum(r, g)) > blue_strength
+    out = np.zeros((h,w), dtype=bool)
+    np.greater(sky, 0, out=out[:top_h])
+    return out
 
-    maxc = np.maximum(np.maximum(r, g), b)
-    minc = np.minimum(np.minimum(r, g), b)
-    val = maxc
-    sat = np.where(maxc > 1e-6, (maxc - minc) / maxc, 0.0)
 
-    cloudy = (sat < low_sat) & (val > high_val)
-    sky_top = blue_dom | cloudy
+def _sky_mask_float(
+        rgb:np.ndarray,
+        *,
+        top_fraction:float,
+        blue_strength:float,
+        low_sat:float,
+        high_val:float
+) -> np.ndarray:
+    """Reference float32 implementation of _sky_mask (tests and scripts/bench_masking.py)."""
+    h,w = rgb.shape[:2]
+    top_h= int(max(1, min(h, round(h * top_fraction))))
+    region = rgb[:top_h].astype(np.float32) / 255.0
+
+    blue_dom, cloudy = _sky_terms(
+        region[...,0], region[...,1], region[...,2],
+        blue_strength=blue_strength, low_sat=low_sat, high_val=high_val,
+    )
 
     out = np.zeros((h,w), dtype=bool)
-    out[:top_h] = sky_top
+    out[:top_h] = blue_dom | cloudy
     return out
-    
+
 
 def _dilate_masked_out(mask:np.ndarray, dilation_px:int) -> np.ndarray:
     """Dilates the False (masked-out) regions of the mask by the specified pixel radius."""
     if dilation_px <=0:
         return mask
-    
+
+    k = max(3, 2 * int(dilation_px) + 1)
+
+    # a k x k max filter: the rectangular kernel is applied as separate row/column passes,
+    # and pixels outside the frame never win, like PIL's edge-extended MaxFilter
+    masked_out = (~mask).view(np.uint8)
+    dilated = cv2.dilate(masked_out, cv2.getStructuringElement(cv2.MORPH_RECT, (k, k)))
+    return dilated == 0
+
+
+def _dilate_masked_out_pil(mask:np.ndarray, dilation_px:int) -> np.ndarray:
+    """Reference PIL MaxFilter implementation of _dilate_masked_out."""
+    if dilation_px <=0:
+        return mask
+
     masked_out = (~mask).astype(np.uint8)*255
 
     k = max(3, 2 * int(dilation_px) + 1)
@@ -291,11 +561,8 @@ def _dilate_masked_out(mask:np.ndarray, dilation_px:int) -> np.ndarray:
     return ~dilated_masked_out
 
 
-def _write_mask(mask_u8:np.ndarray, path:Path) -> None:
-    path.parent.mkdir(parents=True, exist_ok=True)
+def _write_mask(mask_u8:np.ndarray, path:Path, writer:ArtifactWriter, *, compress_level:int = 1) -> None:
     if mask_u8.dtype != np.uint8:
         mask_u8 = mask_u8.astype(np.uint8)
-
-    with Image.fromarray(mask_u8, mode="L") as im:
-        im.save(path, format="PNG")
+    writer.write_png(mask_u8, path, mode="L", compress_level=compress_level)
 
@@ -26,6 +26,15 @@ class FrameRecord(BaseModel):
 
     mask_path:Optional[str]=None
 
+    # packed perceptual hash as hex (see hash_index.code_to_hex), for SfM pair retrieval
+    phash:Optional[str]=None
+
+    # downscaled frames_work/ copy; work_scale = work_width / width (same for height)
+    work_path:Optional[str]=None
+    work_width:Optional[int]=None
+    work_height:Optional[int]=None
+    work_scale:Optional[float]=None
+
 
 class DroppedRec(BaseModel):
     path:str
@@ -35,4 +44,8 @@ class Manifest(BaseModel):
     job_id:str
     source_type:SourceType
     frames:list[FrameRecord]= Field(default_factory=list)
-    dropped_frames:list[DroppedRec] = Field(default_factory=list)
\ No newline at end of file
+    dropped_frames:list[DroppedRec] = Field(default_factory=list)
+    # None when no work tier was written
+    work_max_side:Optional[int]=None
+    # tier the masks in masks/ were computed on (None = masking off)
+    mask_tier:Optional[str]=None
\ No newline at end of file
@@ -2,7 +2,7 @@ from __future__ import annotations
 
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional, Tuple, List
+from typing import Mapping, Optional, Tuple, List
 
 import cv2
 import numpy as np
@@ -18,12 +18,60 @@ class QualityMetrics:
     clip_low:float
 
 
-def compute_metrics(image_path:Path) -> QualityMetrics:
+# Laplacian variance grows when a frame is downscaled, and faster for soft frames than for
+# crisp ones, so a plain factor doesn't work. Per scale:
+#   ln(full_res_sharpness) = a + b * ln(reduced_sharpness)
+# fitted on JPEG frames blurred with sigma 0..6 px, over the full-res range 20..400 around
+# min_sharpness. The fit is specific to the reduction, so every path reduces with
+# reduce_gray. Regenerate with `python scripts/bench_quality.py --fit <frames dir>`.
+# At scale 4 blur of ~1-2 px is invisible on large frames, so prefer 2 above ~1080p.
+SHARPNESS_CALIBRATION: dict[int, tuple[float, float]] = {
+    1: (0.0, 1.0),
+    2: (-5.2448, 1.5968),
+    4: (-17.8001, 3.2021),
+}
+
+
+def calibrate_sharpness(raw:float, scale:int) -> float:
+    """Map a Laplacian variance measured at 1/scale resolution to full-resolution units."""
+    a, b = SHARPNESS_CALIBRATION[scale]
+    if scale == 1 or raw <= 0.0:
+        return float(raw)
+    return float(np.exp(a + b * np.log(raw)))
+
+
+def read_gray(image_path:Path, scale:int = 1) -> np.ndarray:
+    """
+    Decode a frame to uint8 grayscale and reduce it to 1/scale with reduce_gray, exactly
+    like the in-memory paths (analyze_frame, extract_frames_streaming), so a frame gets
+    the same metrics whichever way it is scored.
+    """
     img = cv2.imread(str(image_path), cv2.IMREAD_COLOR)
     if img is None:
         raise ValueError(f"Could not read image at {image_path}")
-    
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    return reduce_gray(cv2.cvtColor(img, cv2.COLOR_BGR2GRAY), scale)
+
+
+def reduce_gray(gray:np.ndarray, scale:int) -> np.ndarray:
+    """Box-downscale a full-resolution grayscale frame to 1/scale (the only reduction method)."""
+    if scale == 1:
+        return gray
+    h, w = gray.shape[:2]
+    return cv2.resize(gray, (max(1, w // scale), max(1, h // scale)), interpolation=cv2.INTER_AREA)
+
+
+def compute_metrics(image_path:Path, *, scale:int = 1) -> QualityMetrics:
+    return metrics_from_gray(read_gray(image_path, scale), scale=scale)
+
+
+def metrics_from_gray(gray:np.ndarray, *, scale:int = 1) -> QualityMetrics:
+    """
+    Compute quality metrics from an already decoded uint8 grayscale frame.
+    scale > 1 means `gray` is a 1/scale reduction: integer histogram + int16 Laplacian,
+    with sharpness mapped back to full-resolution units through SHARPNESS_CALIBRATION.
+    """
+    if scale != 1:
+        return _fast_metrics(gray, scale)
 
     # Sharpness via Variance of Laplacian
     sharpness = float(cv2.Laplacian(gray, cv2.CV_64F).var())
@@ -38,6 +86,25 @@ def compute_metrics(image_path:Path) -> QualityMetrics:
     return QualityMetrics(sharpness=sharpness, brightness=brightness, clip_high=clip_high, clip_low=clip_low)
 
 
+_LEVELS = np.arange(256, dtype=np.float64)
+
+
+def _fast_metrics(gray:np.ndarray, scale:int) -> QualityMetrics:
+    # the 3x3 Laplacian of uint8 input is within +-1020, so int16 is exact
+    lap = cv2.Laplacian(gray, cv2.CV_16S)
+    _, std = cv2.meanStdDev(lap)
+    raw_sharpness = float(std[0, 0]) ** 2
+
+    hist = np.bincount(gray.ravel(), minlength=256)
+    n = float(gray.size)
+    return QualityMetrics(
+        sharpness=calibrate_sharpness(raw_sharpness, scale),
+        brightness=float(hist @ _LEVELS) / n / 255.0,
+        clip_high=float(hist[250:].sum()) / n,
+        clip_low=float(hist[:6].sum()) / n,
+    )
+
+
 def passes_quality(m:QualityMetrics, s:PreprocessSettings) -> tuple[bool, Optional[str]]:
     if m.sharpness < s.min_sharpness:
         return False, "blur"
@@ -51,16 +118,22 @@ def passes_quality(m:QualityMetrics, s:PreprocessSettings) -> tuple[bool, Option
 
 def score_and_filter(
         frames_paths:list[Path],
-        settings:PreprocessSettings
+        settings:PreprocessSettings,
+        *,
+        precomputed:Optional[Mapping[Path, QualityMetrics]] = None,
     ) -> tuple[list[tuple[Path, QualityMetrics]], list[Tuple[Path, str, QualityMetrics]]]:
     """
-
+    Split frames into (kept, dropped) by the quality rules.
+    Metrics found in `precomputed` (e.g. from the fused analysis pass) are used
+    as-is; anything missing is read from disk.
     """
     kept:list[tuple[Path, QualityMetrics]] = []
     dropped:list[Tuple[Path, str, QualityMetrics]] = []
 
     for p in frames_paths:
-        m = compute_metrics(p)
+        m = precomputed.get(p) if precomputed is not None else None
+        if m is None:
+            m = compute_metrics(p, scale=settings.quality_scale)
         passed, reason = passes_quality(m, settings)
         if passed:
             kept.append((p, m))
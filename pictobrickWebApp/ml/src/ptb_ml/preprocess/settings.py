@@ -3,6 +3,8 @@
 from __future__ import annotations
 from dataclasses import dataclass, field
 
+# which copy of the frames a stage reads: "full" = frames/, "work" = frames_work/
+FRAME_TIERS = ("full", "work")
 
 
 @dataclass(frozen=True)
@@ -23,6 +25,24 @@ class MaskingSettings:
         "person", "car", "bus", "truck", "motorcycle", "bicycle"
     )
     device: str = "auto"  # auto|cpu|cuda
+    # frames per deeplab forward pass (frames of equal size are batched together)
+    deeplab_batch_size: int = 4
+
+    # "work" masks frames_work/ (needs PreprocessSettings.work_max_side > 0)
+    frame_tier: str = "full"
+
+    # temporal mode (video sources only): run the backend on keyframes and warp their
+    # masks onto the frames in between with optical flow
+    temporal: bool = False
+    keyframe_stride: int = 5              # max frames between keyframes
+    keyframe_phash_distance: int = 0      # >0: also start a keyframe past this hamming distance
+    flow_max_side: int = 480              # long side of the grayscale the flow is computed on
+    min_flow_confidence: float = 0.8      # forward-backward consistent fraction; below -> infer
+
+    # mask PNGs are written in the background; they only feed SfM, so favour speed
+    png_compress_level: int = 1           # zlib level, 0 (store) .. 9 (smallest)
+    artifact_writer_workers: int = 2      # 0 = write on the masking thread
+    artifact_fsync: bool = False          # fsync masks before run_masking returns
 
     def __post_init__(self) -> None:
         allowed_backends = {"none", "sky_hsv", "sky_hsv+deeplabv3"}
@@ -35,6 +55,42 @@ class MaskingSettings:
         if self.dilation_px < 0:
             raise ValueError(f"dilation_px must be >= 0, got {self.dilation_px}")
 
+        if self.deeplab_batch_size < 1:
+            raise ValueError(
+                f"deeplab_batch_size must be >= 1, got {self.deeplab_batch_size}"
+            )
+
+        if self.frame_tier not in FRAME_TIERS:
+            raise ValueError(
+                f"frame_tier must be one of full|work, got '{self.frame_tier}'"
+            )
+
+        if self.keyframe_stride < 1:
+            raise ValueError(f"keyframe_stride must be >= 1, got {self.keyframe_stride}")
+
+        if self.keyframe_phash_distance < 0:
+            raise ValueError(
+                f"keyframe_phash_distance must be >= 0, got {self.keyframe_phash_distance}"
+            )
+
+        if not (0 <= self.png_compress_level <= 9):
+            raise ValueError(
+                f"png_compress_level must be in [0, 9], got {self.png_compress_level}"
+            )
+
+        if self.artifact_writer_workers < 0:
+            raise ValueError(
+                f"artifact_writer_workers must be >= 0, got {self.artifact_writer_workers}"
+            )
+
+        if self.flow_max_side < 32:
+            raise ValueError(f"flow_max_side must be >= 32, got {self.flow_max_side}")
+
+        if not (0.0 <= self.min_flow_confidence <= 1.0):
+            raise ValueError(
+                f"min_flow_confidence must be in [0, 1], got {self.min_flow_confidence}"
+            )
+
         if not (0.0 <= self.min_unmasked_ratio <= 1.0):
             raise ValueError(
                 f"min_unmasked_ratio must be in [0, 1], got {self.min_unmasked_ratio}"
@@ -80,15 +136,44 @@ class PreprocessSettings:
     max_video_frames: int = 500
     source_type: str = "image_set"
 
+    # "files": ffmpeg writes every sampled frame as JPEG
+    # "stream": frames are piped from ffmpeg and quality-gated before encoding
+    # "budget": max_video_frames is split over the videos by duration and the
+    #           sharpest of budget_candidates_per_window frames is kept per window
+    video_extraction: str = "files"
+    budget_candidates_per_window: int = 4
+
+    # "files" mode only: ffmpeg processes run at once (0 = one per CPU) and the
+    # keyframe-aligned segment length long videos are split into (0 = never split)
+    video_workers: int = 1
+    video_segment_seconds: float = 0.0
+
+    # image normalization: thread pool size (0 = one per CPU), long-side cap in
+    # pixels (0 = keep full resolution), and JPEG draft-mode decoding when downscaling
+    ingest_workers: int = 1
+    ingest_max_side: int = 0
+    ingest_jpeg_draft: bool = True
+    # hardlink/copy upright baseline RGB JPEGs into frames/ instead of re-encoding
+    ingest_passthrough: bool = True
+
     min_sharpness: float = 80.0
     min_brightness: float = 0.12
     max_brightness: float = 0.88
     max_clip_high: float = 0.02
     max_clip_low: float = 0.02
+    # 1 = exact metrics on the full frame; 2 or 4 = metrics on a 1/scale reduction of it with
+    # sharpness calibrated back to full-resolution units (see quality.SHARPNESS_CALIBRATION)
+    quality_scale: int = 1
 
     dedupe_phash_size: int = 16
     dedupe_hamming_threshold: int = 6
 
+    # long side (px) of the downscaled frames_work/ tier written for kept frames; 0 = no work tier
+    work_max_side: int = 0
+
+    # fused per-frame analysis pass: 0 = one process per CPU, 1 = run in-process
+    analysis_workers: int = 0
+
     masking: MaskingSettings = field(default_factory=MaskingSettings)
 
     def __post_init__(self) -> None:
@@ -100,6 +185,39 @@ class PreprocessSettings:
                 f"max_video_frames must be > 0, got {self.max_video_frames}"
             )
 
+        if self.video_extraction not in {"files", "stream", "budget"}:
+            raise ValueError(
+                f"video_extraction must be one of files|stream|budget, got '{self.video_extraction}'"
+            )
+
+        if self.quality_scale not in {1, 2, 4}:
+            raise ValueError(f"quality_scale must be one of 1|2|4, got {self.quality_scale}")
+
+        if self.work_max_side < 0:
+            raise ValueError(f"work_max_side must be >= 0, got {self.work_max_side}")
+
+        if self.masking.frame_tier == "work" and self.work_max_side == 0:
+            raise ValueError("masking.frame_tier='work' requires work_max_side > 0")
+
+        if self.ingest_workers < 0:
+            raise ValueError(f"ingest_workers must be >= 0, got {self.ingest_workers}")
+
+        if self.ingest_max_side < 0:
+            raise ValueError(f"ingest_max_side must be >= 0, got {self.ingest_max_side}")
+
+        if self.video_workers < 0:
+            raise ValueError(f"video_workers must be >= 0, got {self.video_workers}")
+
+        if self.video_segment_seconds < 0:
+            raise ValueError(
+                f"video_segment_seconds must be >= 0, got {self.video_segment_seconds}"
+            )
+
+        if self.budget_candidates_per_window < 1:
+            raise ValueError(
+                f"budget_candidates_per_window must be >= 1, got {self.budget_candidates_per_window}"
+            )
+
         if self.min_sharpness < 0:
             raise ValueError(
                 f"min_sharpness must be >= 0, got {self.min_sharpness}"
@@ -138,4 +256,9 @@ class PreprocessSettings:
         if self.dedupe_hamming_threshold < 0:
             raise ValueError(
                 f"dedupe_hamming_threshold must be >= 0, got {self.dedupe_hamming_threshold}"
+            )
+
+        if self.analysis_workers < 0:
+            raise ValueError(
+                f"analysis_workers must be >= 0, got {self.analysis_workers}"
             )
\ No newline at end of file
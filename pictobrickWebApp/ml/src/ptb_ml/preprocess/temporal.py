@@ -0,0 +1,121 @@
+"""temporal.py — keyframe selection and optical-flow mask propagation for video frames.
+
+Used by masking when MaskingSettings.temporal is on: the backend runs on keyframes only
+and the frames in between get the keyframe mask warped along a dense Farneback flow.
+Flow is computed on a reduced grayscale decode and checked forward-backward; the
+consistent fraction is the confidence masking compares to min_flow_confidence.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional, Sequence
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from .hash_index import hamming
+
+_REDUCED_GRAY_FLAGS = {
+    1: cv2.IMREAD_GRAYSCALE,
+    2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+    4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+    8: cv2.IMREAD_REDUCED_GRAYSCALE_8,
+}
+
+# forward-backward round trip error (flow-resolution px) a pixel may have to count as consistent
+FB_TOLERANCE_PX = 1.0
+
+
+@dataclass(frozen=True)
+class FlowFrame:
+    gray:np.ndarray            # reduced uint8 grayscale the flow runs on
+    size:tuple[int, int]       # full-resolution (width, height)
+
+
+def plan_keyframes(
+        codes:Sequence[Optional[np.ndarray]],
+        *,
+        stride:int,
+        phash_distance:int = 0,
+) -> list[bool]:
+    """
+    Mark keyframes in a frame sequence: the first frame, every `stride`-th frame after the
+    previous keyframe, and (phash_distance > 0) any frame whose packed phash is further
+    than phash_distance from the previous keyframe's. Frames without a code use the stride only.
+    """
+    out:list[bool] = []
+    last_key = -1
+    last_code:Optional[np.ndarray] = None
+    for i, code in enumerate(codes):
+        is_key = last_key < 0 or i - last_key >= stride
+        if not is_key and phash_distance > 0 and code is not None and last_code is not None:
+            is_key = int(hamming(code[None, :], last_code)[0]) > phash_distance
+        if is_key:
+            last_key, last_code = i, code
+        out.append(is_key)
+    return out
+
+
+def read_flow_frame(path:Path, max_side:int) -> FlowFrame:
+    """Decode `path` as grayscale with its long side at most max_side (libjpeg reduced decode)."""
+    with Image.open(path) as im:
+        w, h = im.size
+    factor = 1
+    while factor < 8 and max(w, h) / (factor * 2) >= max_side:
+        factor *= 2
+    gray = cv2.imread(str(path), _REDUCED_GRAY_FLAGS[factor])
+    if gray is None:
+        raise ValueError(f"Could not read image at {path}")
+    gh, gw = gray.shape
+    if max(gh, gw) > max_side:
+        r = max_side / max(gh, gw)
+        gray = cv2.resize(gray, (max(1, round(gw * r)), max(1, round(gh * r))), interpolation=cv2.INTER_AREA)
+    return FlowFrame(gray=gray, size=(w, h))
+
+
+def _farneback(prev:np.ndarray, nxt:np.ndarray) -> np.ndarray:
+    return cv2.calcOpticalFlowFarneback(prev, nxt, None, 0.5, 3, 15, 3, 5, 1.2, 0)
+
+
+def _grid(h:int, w:int) -> tuple[np.ndarray, np.ndarray]:
+    return np.meshgrid(np.arange(w, dtype=np.float32), np.arange(h, dtype=np.float32))
+
+
+def backward_flow(key:FlowFrame, cur:FlowFrame) -> tuple[Optional[np.ndarray], float]:
+    """
+    Flow taking every pixel of `cur` to its position in `key`, plus the fraction of pixels
+    whose key->cur flow brings them back within FB_TOLERANCE_PX. Frames of different size
+    return (None, 0.0).
+    """
+    if key.size != cur.size or key.gray.shape != cur.gray.shape:
+        return None, 0.0
+
+    bw = _farneback(cur.gray, key.gray)
+    fw = _farneback(key.gray, cur.gray)
+
+    h, w = cur.gray.shape
+    gx, gy = _grid(h, w)
+    mx = gx + bw[..., 0]
+    my = gy + bw[..., 1]
+    fw_at = cv2.remap(fw, mx, my, cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+
+    inside = (mx >= 0) & (mx <= w - 1) & (my >= 0) & (my <= h - 1)
+    err = np.hypot(bw[..., 0] + fw_at[..., 0], bw[..., 1] + fw_at[..., 1])
+    confidence = float(np.mean(inside & (err < FB_TOLERANCE_PX)))
+    return bw, confidence
+
+
+def warp_mask(mask:np.ndarray, flow:np.ndarray, size:tuple[int, int]) -> np.ndarray:
+    """Pull a full-resolution boolean keyframe mask onto the current frame along `flow`."""
+    w, h = size
+    fh, fw = flow.shape[:2]
+    up = cv2.resize(flow, (w, h), interpolation=cv2.INTER_LINEAR)
+    gx, gy = _grid(h, w)
+    mx = gx + up[..., 0] * (w / fw)
+    my = gy + up[..., 1] * (h / fh)
+    warped = cv2.remap(
+        mask.astype(np.uint8), mx, my, cv2.INTER_NEAREST, borderMode=cv2.BORDER_REPLICATE
+    )
+    return warped.astype(bool)
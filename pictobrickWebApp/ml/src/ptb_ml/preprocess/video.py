@@ -1,11 +1,27 @@
 from __future__ import annotations
 
+import bisect
+import contextvars
+import json
+import logging
+import math
 import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
+from typing import Callable, Iterator, Optional
 
+import cv2
+import numpy as np
+
+from ..runtime import ProgressEvent, cpu_budget, emit_progress, parse_ffmpeg_line, run_process
 from .io import JobWorkSpace
+from .quality import QualityMetrics, metrics_from_gray, passes_quality, reduce_gray
 from .settings import PreprocessSettings
 
+log = logging.getLogger(__name__)
+
 
 def extract_frames_ffmpeg(
         ws: JobWorkSpace,
@@ -22,7 +38,10 @@ def extract_frames_ffmpeg(
     cmd = [
         "ffmpeg",
         "-hide_banner",
-        "-loglevel", "error", "-i",
+        "-loglevel", "error",
+        "-nostats", "-progress", "pipe:1",
+        "-threads", str(cpu_budget()),
+        "-i",
         str(video_path),
         "-vf", f"fps={settings.fps}",
         "-q:v", "2", "-start_number",
@@ -30,13 +49,24 @@ def extract_frames_ffmpeg(
         out_pattern
     ]
 
-    proc = subprocess.run(cmd, capture_output=True, text=True)
+    # -progress reports frame=N on stdout while the frames are written
+    def on_line(stream:str, line:str) -> None:
+        frames = parse_ffmpeg_line(line) if stream == "stdout" else None
+        if frames is not None:
+            emit_progress(ProgressEvent(stage="preprocess", step="ffmpeg", current=frames,
+                                        message=Path(video_path).name))
+
+    proc = run_process(
+        cmd,
+        stderr_path=ws.logs_dir / f"ffmpeg_{Path(video_path).stem}.stderr.log",
+        on_line=on_line,
+    )
     if proc.returncode != 0:
         raise RuntimeError("ffmpeg failed. \n"
                            f"cmd: {' '.join(cmd)}\n"
-                           f"stdderr: \n{proc.stderr}")
-    
-    
+                           f"stdderr: \n{proc.stderr_tail}")
+
+
     # Count how many frames were written to calculate next index
     frames= sorted(ws.frames_dir.glob("frame_??????.jpg"))
     if not frames:
@@ -45,3 +75,508 @@ def extract_frames_ffmpeg(
     last = frames[-1].stem
     num = int(last.split("_")[1])
     return num + 1
+
+
+# ----- Streaming extraction ----- #
+
+@dataclass(frozen=True)
+class VideoInfo:
+    width:int
+    height:int
+    duration_s:Optional[float]
+    fps:Optional[float] = None
+
+
+def probe_video(video_path:Path) -> VideoInfo:
+    """Read display width/height and duration of the first video stream with ffprobe."""
+    cmd = [
+        "ffprobe",
+        "-v", "error",
+        "-select_streams", "v:0",
+        "-show_entries", "stream=width,height,avg_frame_rate:stream_tags=rotate:stream_side_data=rotation:format=duration",
+        "-of", "json",
+        str(video_path),
+    ]
+    proc = subprocess.run(cmd, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError("ffprobe failed. \n"
+                           f"cmd: {' '.join(cmd)}\n"
+                           f"stderr: \n{proc.stderr}")
+
+    data = json.loads(proc.stdout or "{}")
+    streams = data.get("streams") or []
+    if not streams:
+        raise RuntimeError(f"ffprobe found no video stream in {video_path}")
+    st = streams[0]
+    w, h = int(st["width"]), int(st["height"])
+
+    # ffmpeg auto-rotates on decode, so report the displayed size
+    rotation = st.get("tags", {}).get("rotate")
+    for sd in st.get("side_data_list", []) or []:
+        if "rotation" in sd:
+            rotation = sd["rotation"]
+    if rotation is not None and int(float(rotation)) % 180 != 0:
+        w, h = h, w
+
+    fps: Optional[float] = None
+    num, _, den = str(st.get("avg_frame_rate", "")).partition("/")
+    try:
+        fps = float(num) / float(den or 1)
+    except (ValueError, ZeroDivisionError):
+        pass
+    if fps is not None and not (fps > 0 and math.isfinite(fps)):
+        fps = None
+
+    duration = data.get("format", {}).get("duration")
+    return VideoInfo(
+        width=w,
+        height=h,
+        duration_s=float(duration) if duration not in (None, "N/A") else None,
+        fps=fps,
+    )
+
+
+def iter_frames_ffmpeg(
+        video_path:Path,
+        *,
+        fps:float,
+        info:Optional[VideoInfo] = None,
+        stderr_path:Optional[Path] = None,
+) -> Iterator[np.ndarray]:
+    """
+    Decode a video at `fps` and yield HxWx3 uint8 BGR frames piped from ffmpeg as rawvideo.
+    Closing the generator early stops ffmpeg.
+    """
+    info = info or probe_video(video_path)
+    frame_bytes = info.width * info.height * 3
+
+    cmd = [
+        "ffmpeg",
+        "-hide_banner",
+        "-loglevel", "error",
+        "-threads", str(cpu_budget()),
+        "-i", str(video_path),
+        "-vf", f"fps={fps}",
+        "-f", "rawvideo",
+        "-pix_fmt", "bgr24",
+        "pipe:1",
+    ]
+
+    expected = math.ceil(info.duration_s * fps) if info.duration_s else None
+    stderr_f = open(stderr_path, "wb") if stderr_path is not None else subprocess.DEVNULL
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr_f)
+    finished = False
+    decoded = 0
+    try:
+        assert proc.stdout is not None
+        while True:
+            buf = proc.stdout.read(frame_bytes)
+            if len(buf) < frame_bytes:
+                break
+            decoded += 1
+            emit_progress(ProgressEvent(stage="preprocess", step="decode", current=decoded,
+                                        total=expected, message=video_path.name))
+            yield np.frombuffer(buf, dtype=np.uint8).reshape(info.height, info.width, 3)
+        finished = True
+    finally:
+        if not finished:
+            proc.kill()
+        if proc.stdout is not None:
+            proc.stdout.close()
+        returncode = proc.wait()
+        if stderr_path is not None:
+            stderr_f.close()
+
+    if returncode != 0:
+        detail = stderr_path.read_text(errors="replace") if stderr_path is not None else ""
+        raise RuntimeError("ffmpeg failed. \n"
+                           f"cmd: {' '.join(cmd)}\n"
+                           f"stderr: \n{detail}")
+
+
+@dataclass(frozen=True)
+class StreamExtractResult:
+    next_idx:int
+    kept:list[tuple[Path, QualityMetrics]] = field(default_factory=list)
+    # (label, reason, metrics); dropped frames are never written so the label is "<video>#<sample>"
+    dropped:list[tuple[str, str, QualityMetrics]] = field(default_factory=list)
+
+
+def extract_frames_streaming(
+        ws: JobWorkSpace,
+        video_path: Path,
+        *,
+        settings: PreprocessSettings,
+        start_idx:int = 0,
+        jpg_quality:int = 95,
+        on_frame:Optional[Callable[[Path], None]] = None,
+) -> StreamExtractResult:
+    """
+    Decode a video in-process and only encode the frames that pass_quality into ws.frames_dir.
+    Survivors are numbered contiguously from start_idx; on_frame sees each one once written.
+    """
+    video_path = Path(video_path)
+    try:
+        label_base = str(video_path.resolve().relative_to(ws.root))
+    except ValueError:
+        label_base = video_path.name
+
+    idx = start_idx
+    kept:list[tuple[Path, QualityMetrics]] = []
+    dropped:list[tuple[str, str, QualityMetrics]] = []
+
+    frames = iter_frames_ffmpeg(
+        video_path,
+        fps=settings.fps,
+        stderr_path=ws.logs_dir / f"ffmpeg_{video_path.stem}.stderr.log",
+    )
+    for sample, bgr in enumerate(frames):
+        gray = cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
+        m = metrics_from_gray(reduce_gray(gray, settings.quality_scale), scale=settings.quality_scale)
+        passed, reason = passes_quality(m, settings)
+        if not passed:
+            dropped.append((f"{label_base}#{sample:06d}", reason or "unknown", m))
+            continue
+
+        dst = ws.frame_path(idx, ext=".jpg")
+        if not cv2.imwrite(str(dst), bgr, [cv2.IMWRITE_JPEG_QUALITY, jpg_quality]):
+            raise RuntimeError(f"Could not write frame {dst}")
+        kept.append((dst, m))
+        idx += 1
+        if on_frame is not None:
+            on_frame(dst)
+
+    log.info(f"{video_path.name}: kept {len(kept)} / {len(kept) + len(dropped)} sampled frames")
+    return StreamExtractResult(next_idx=idx, kept=kept, dropped=dropped)
+
+
+# ----- Budgeted sampling ----- #
+
+def plan_frame_budget(durations:list[Optional[float]], budget:int, *, fps:float) -> list[int]:
+    """
+    Split a total frame budget over videos in proportion to their duration.
+    A video never gets more windows than sampling it at `fps` would give, and gets
+    at least one if the budget allows; videos with unknown duration get the mean share.
+    """
+    if budget <= 0 or not durations:
+        return [0] * len(durations)
+
+    caps = [math.ceil(d * fps) if d else budget for d in durations]
+    weights = [d if d else 0.0 for d in durations]
+    if not any(weights):
+        weights = [1.0] * len(durations)
+    elif not all(weights):
+        mean = sum(weights) / sum(1 for w in weights if w)
+        weights = [w or mean for w in weights]
+
+    # largest-remainder apportionment, then hand anything a cap clipped to the others
+    total_w = sum(weights)
+    exact = [budget * w / total_w for w in weights]
+    alloc = [min(int(x), c) for x, c in zip(exact, caps)]
+    if budget >= len(durations):
+        # every uploaded video contributes at least one frame
+        alloc = [max(a, 1) for a in alloc]
+        while sum(alloc) > budget:
+            alloc[alloc.index(max(alloc))] -= 1
+    order = sorted(range(len(exact)), key=lambda i: exact[i] - int(exact[i]), reverse=True)
+    left = budget - sum(alloc)
+    while left > 0:
+        progressed = False
+        for i in order:
+            if left == 0:
+                break
+            if alloc[i] < caps[i]:
+                alloc[i] += 1
+                left -= 1
+                progressed = True
+        if not progressed:
+            break
+    return alloc
+
+
+def extract_frames_budgeted(
+        ws: JobWorkSpace,
+        video_path: Path,
+        *,
+        settings: PreprocessSettings,
+        budget:int,
+        start_idx:int = 0,
+        info:Optional[VideoInfo] = None,
+        jpg_quality:int = 95,
+) -> int:
+    """
+    Split the video into `budget` equal windows, decode a few candidates per window and
+    write only the sharpest one. Decoding stops as soon as `budget` frames are written.
+    Returns the next free frame index.
+    """
+    video_path = Path(video_path)
+    if budget <= 0:
+        return start_idx
+    info = info or probe_video(video_path)
+
+    cands = settings.budget_candidates_per_window
+    if info.duration_s:
+        if info.fps:
+            # never ask for more candidates than the source has frames
+            cands = max(1, min(cands, int(info.duration_s * info.fps / budget)))
+        rate = budget * cands / info.duration_s
+    else:
+        log.warning(f"{video_path.name}: unknown duration, sampling at fps={settings.fps} until the budget is hit")
+        rate = settings.fps * cands
+
+    idx = start_idx
+    best: Optional[np.ndarray] = None
+    best_sharpness = -1.0
+    seen = 0
+
+    def _flush() -> None:
+        nonlocal idx, best, best_sharpness, seen
+        dst = ws.frame_path(idx, ext=".jpg")
+        if not cv2.imwrite(str(dst), best, [cv2.IMWRITE_JPEG_QUALITY, jpg_quality]):
+            raise RuntimeError(f"Could not write frame {dst}")
+        idx += 1
+        best, best_sharpness, seen = None, -1.0, 0
+
+    frames = iter_frames_ffmpeg(
+        video_path,
+        fps=rate,
+        info=info,
+        stderr_path=ws.logs_dir / f"ffmpeg_{video_path.stem}.stderr.log",
+    )
+    try:
+        for bgr in frames:
+            sharpness = float(cv2.Laplacian(cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY), cv2.CV_64F).var())
+            if sharpness > best_sharpness:
+                best, best_sharpness = bgr, sharpness
+            seen += 1
+            if seen == cands:
+                _flush()
+                if idx - start_idx >= budget:
+                    break
+    finally:
+        frames.close()
+
+    # a short final window (rounding at the end of the stream)
+    if best is not None and idx - start_idx < budget:
+        _flush()
+
+    log.info(f"{video_path.name}: wrote {idx - start_idx} / {budget} budgeted frames "
+             f"({cands} candidates per window at {rate:.3f} fps)")
+    return idx
+
+
+# ----- Parallel segment decoding ----- #
+
+def probe_keyframes(video_path:Path) -> list[float]:
+    """Keyframe timestamps (seconds) of the first video stream, read from packet flags."""
+    cmd = [
+        "ffprobe",
+        "-v", "error",
+        "-select_streams", "v:0",
+        "-show_entries", "packet=pts_time,flags",
+        "-of", "csv=p=0",
+        str(video_path),
+    ]
+    proc = subprocess.run(cmd, capture_output=True, text=True)
+    if proc.returncode != 0:
+        log.warning(f"ffprobe keyframe scan failed for {video_path.name}: {proc.stderr.strip()}")
+        return []
+
+    times:list[float] = []
+    for line in proc.stdout.splitlines():
+        pts, _, flags = line.partition(",")
+        if "K" in flags and pts not in ("", "N/A"):
+            times.append(float(pts))
+    return sorted(times)
+
+
+def plan_segments(
+        duration_s:Optional[float],
+        keyframes:list[float],
+        segment_seconds:float,
+) -> list[tuple[float, Optional[float]]]:
+    """
+    Split [0, duration) into (start, length) ranges of roughly segment_seconds.
+    Cuts snap to the nearest keyframe so each `-ss` seek lands exactly on one;
+    without keyframes the cuts are uniform. The last range has length None (to the end).
+    """
+    if not duration_s or segment_seconds <= 0 or duration_s <= segment_seconds:
+        return [(0.0, None)]
+
+    n = math.ceil(duration_s / segment_seconds)
+    targets = [duration_s * i / n for i in range(1, n)]
+    if keyframes:
+        cuts = sorted({min(keyframes, key=lambda k: abs(k - t)) for t in targets})
+        cuts = [c for c in cuts if 0.0 < c < duration_s]
+    else:
+        cuts = targets
+
+    starts = [0.0] + cuts
+    ends = cuts + [None]
+    return [(a, (b - a) if b is not None else None) for a, b in zip(starts, ends)]
+
+
+@dataclass(frozen=True)
+class _SegmentJob:
+    video:Path
+    video_pos:int
+    start_s:float
+    first_slot:int                # fps output slots [first_slot, end_slot) of the video
+    end_slot:Optional[int]        # None: to the end
+    start_idx:int
+    capacity:int
+
+
+def _segment_slot(cut_s:float, fps:float) -> int:
+    """
+    First fps output slot (pts in 1/fps units) a segment starting at keyframe cut_s owns.
+    The fps filter gives slot k the last frame whose pts rounds to <= k, so slots from
+    round(cut_s * fps) on only need frames from cut_s on; ceil stays on that safe side
+    of any float error, and the previous segment decodes past the cut to cover the rest.
+    """
+    return math.ceil(cut_s * fps)
+
+
+def _run_segment(
+        ws:JobWorkSpace,
+        job:_SegmentJob,
+        *,
+        fps:float,
+        threads:int,
+        on_frames:Optional[Callable[[int], None]] = None,
+) -> None:
+    cmd = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-nostats", "-progress", "pipe:1",
+           "-threads", str(threads)]
+    vf = f"fps={fps}"
+    if job.start_s > 0 or job.end_slot is not None:
+        # keep the source timestamps (zero-based, as in extract_frames_ffmpeg) so the fps
+        # grid is the whole video's rather than restarting at the cut, and trim to this
+        # segment's slots. The seek keeps every frame from the keyframe at the cut on;
+        # the small offset only guards against the rounding of ffprobe's pts_time.
+        cmd += ["-copyts", "-start_at_zero"]
+        if job.start_s > 0:
+            cmd += ["-noaccurate_seek", "-ss", f"{job.start_s + 1e-4:.6f}"]
+        vf += f",trim=start_pts={job.first_slot}"
+        if job.end_slot is not None:
+            vf += f":end_pts={job.end_slot}"
+    cmd += [
+        "-i", str(job.video),
+        "-vf", vf,
+        "-frames:v", str(job.capacity),
+        "-q:v", "2",
+        "-start_number", str(job.start_idx),
+        str(ws.frames_dir / "frame_%06d.jpg"),
+    ]
+
+    def on_line(stream:str, line:str) -> None:
+        frames = parse_ffmpeg_line(line) if stream == "stdout" else None
+        if frames is not None and on_frames is not None:
+            on_frames(frames)
+
+    proc = run_process(
+        cmd,
+        stderr_path=ws.logs_dir / f"ffmpeg_{job.video.stem}_{job.start_idx:06d}.stderr.log",
+        on_line=on_line,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError("ffmpeg failed. \n"
+                           f"cmd: {' '.join(cmd)}\n"
+                           f"stderr: \n{proc.stderr_tail}")
+
+
+def extract_videos_parallel(
+        ws: JobWorkSpace,
+        video_paths:list[Path],
+        *,
+        settings: PreprocessSettings,
+        start_idx:int = 0,
+) -> int:
+    """
+    Same output as calling extract_frames_ffmpeg on each video in turn (including the
+    max_video_frames soft cap), but long videos are decoded as keyframe-aligned segments
+    and segments of all videos run concurrently. Segments sample the video's own fps grid
+    and each owns a contiguous range of its slots (see _run_segment), so the frames at the
+    cuts are the same as in the serial decode.
+
+    Every segment writes into its own reserved index range; afterwards the frames are
+    renamed down to contiguous indices in (video, segment, frame) order.
+    Returns the next free frame index.
+    """
+    video_paths = [Path(v) for v in video_paths]
+    if not video_paths:
+        return start_idx
+
+    jobs:list[_SegmentJob] = []
+    idx = start_idx
+    for pos, vp in enumerate(video_paths):
+        info = probe_video(vp)
+        keyframes = probe_keyframes(vp) if settings.video_segment_seconds > 0 else []
+        segments = plan_segments(info.duration_s, keyframes, settings.video_segment_seconds)
+        # each segment ends where the next one's slots begin
+        slots = [_segment_slot(seg_start, settings.fps) for seg_start, _ in segments] + [None]
+        for k, (seg_start, _) in enumerate(segments):
+            first, end = slots[k], slots[k + 1]
+            if end is not None:
+                capacity = end - first
+            elif info.duration_s:
+                # +2 covers the fps filter rounding at the end of the video
+                capacity = max(0, math.ceil(info.duration_s * settings.fps) + 2 - first)
+            else:
+                capacity = settings.max_video_frames
+            if capacity <= 0:
+                continue  # cuts closer together than one sample
+            jobs.append(_SegmentJob(vp, pos, seg_start, first, end, idx, capacity))
+            idx += capacity
+
+    # the stage's share of the cores (runtime/governor.py), split over the segments
+    cpus = cpu_budget()
+    workers = min(settings.video_workers or cpus, len(jobs))
+    threads = max(1, cpus // workers)
+    log.info(f"Decoding {len(video_paths)} video(s) as {len(jobs)} segment(s) with {workers} worker(s)")
+
+    # frames written per segment, summed into one progress stream for all videos
+    written_by_job = [0] * len(jobs)
+    total_capacity = sum(j.capacity for j in jobs)
+    progress_lock = threading.Lock()
+
+    def _on_frames(k:int, frames:int) -> None:
+        with progress_lock:
+            written_by_job[k] = frames
+            current = sum(written_by_job)
+        emit_progress(ProgressEvent(stage="preprocess", step="ffmpeg", current=current,
+                                    total=total_capacity))
+
+    def _segment(k:int) -> None:
+        _run_segment(ws, jobs[k], fps=settings.fps, threads=threads,
+                     on_frames=lambda n: _on_frames(k, n))
+
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        # each segment reports into the caller's progress sink (see runtime/progress.py)
+        futures = [ex.submit(contextvars.copy_context().run, _segment, k) for k in range(len(jobs))]
+        for fut in futures:
+            fut.result()
+
+    # compact: targets are never above their source, so ascending renames can't collide
+    job_starts = [j.start_idx for j in jobs]
+    written = [p for p in ws.list_frames() if int(p.stem.split("_")[1]) >= start_idx]
+    next_idx = start_idx
+    total_before = len(ws.list_frames()) - len(written)
+    stop_after:Optional[int] = None
+    for p in written:
+        src_idx = int(p.stem.split("_")[1])
+        pos = jobs[bisect.bisect_right(job_starts, src_idx) - 1].video_pos
+        if stop_after is not None and pos > stop_after:
+            p.unlink()
+            continue
+        dst = ws.frame_path(next_idx, ext=p.suffix)
+        if dst != p:
+            p.rename(dst)
+        next_idx += 1
+        # Soft cap, as in the serial loop: finish the video that crosses it, drop later ones
+        if stop_after is None and total_before + next_idx - start_idx >= settings.max_video_frames:
+            stop_after = pos
+
+    if stop_after is not None and stop_after < len(video_paths) - 1:
+        log.info(f"Reached max frames limit of {settings.max_video_frames} after processing "
+                 f"{video_paths[stop_after].name}, dropped frames of later videos.")
+    return next_idx
@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import logging
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Sequence
+
+import cv2
+
+from ..runtime.governor import cpu_budget
+from .io import JobWorkSpace
+
+log = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class WorkFrame:
+    path: Path
+    width: int
+    height: int
+    # work size / full size
+    scale: float
+
+
+def _write_one(src: Path, dst: Path, max_side: int, jpg_quality: int) -> WorkFrame:
+    bgr = cv2.imread(str(src), cv2.IMREAD_COLOR)
+    if bgr is None:
+        raise ValueError(f"Could not read image at {src}")
+    h, w = bgr.shape[:2]
+
+    scale = min(1.0, max_side / max(w, h))
+    if scale >= 1.0:
+        # already small enough: share the full-tier file
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copyfile(src, dst)
+        return WorkFrame(path=dst, width=w, height=h, scale=1.0)
+
+    ww, wh = max(1, round(w * scale)), max(1, round(h * scale))
+    small = cv2.resize(bgr, (ww, wh), interpolation=cv2.INTER_AREA)
+    if not cv2.imwrite(str(dst), small, [cv2.IMWRITE_JPEG_QUALITY, jpg_quality]):
+        raise RuntimeError(f"Could not write frame {dst}")
+    return WorkFrame(path=dst, width=ww, height=wh, scale=ww / w)
+
+
+def write_work_tier(
+        ws: JobWorkSpace,
+        frame_paths: Sequence[Path],
+        *,
+        max_side: int,
+        workers: int = 1,
+        jpg_quality: int = 95,
+) -> dict[Path, WorkFrame]:
+    """
+    Write downscaled copies of frame_paths (long side <= max_side) into ws.frames_work_dir,
+    keeping file names. Any previous work tier is replaced. Returns {full path: WorkFrame}.
+    """
+    if max_side <= 0:
+        raise ValueError(f"max_side must be > 0, got {max_side}")
+
+    out_dir = ws.frames_work_dir
+    if out_dir.exists():
+        shutil.rmtree(out_dir)
+    out_dir.mkdir(parents=True)
+
+    srcs = [Path(p) for p in frame_paths]
+    if not srcs:
+        return {}
+
+    def _one(src: Path) -> WorkFrame:
+        return _write_one(src, out_dir / src.name, max_side, jpg_quality)
+
+    n_workers = min(workers or cpu_budget(), len(srcs))
+    if n_workers <= 1:
+        written = [_one(p) for p in srcs]
+    else:
+        # cv2 releases the GIL in imread/resize/imwrite
+        with ThreadPoolExecutor(max_workers=n_workers) as ex:
+            written = list(ex.map(_one, srcs))
+
+    log.info(f"Wrote {len(written)} work-tier frames (max side {max_side}px) to {out_dir}")
+    return dict(zip(srcs, written))
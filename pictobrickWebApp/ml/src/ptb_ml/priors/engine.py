@@ -8,6 +8,9 @@ import numpy as np
 import torch
 from PIL import Image
 
+from ptb_ml.preprocess.artifacts import ArtifactWriter
+from ptb_ml.runtime import pin_cpu_budget
+
 from .models import PriorsFrameResult, PriorsReq, PriorsResult
 from .settings import PriorsSettings
 
@@ -35,9 +38,10 @@ def _load_deeplab(device: str, classes_to_mask: tuple[str, ...]):
     return _init_deeplab_ctx(device=device, classes_to_mask=classes_to_mask)
 
 
-def _save_depth_png(depth_np: np.ndarray, path: Path, max_val: int) -> None:
+def _save_depth_png(
+    depth_np: np.ndarray, path: Path, max_val: int, writer: ArtifactWriter, compress_level: int = 6
+) -> None:
     """Save depth as 16-bit PNG for lossless precision."""
-    path.parent.mkdir(parents=True, exist_ok=True)
     d = depth_np.astype(np.float32)
     # Normalize to [0, max_val]
     d_min, d_max = d.min(), d.max()
@@ -45,21 +49,23 @@ def _save_depth_png(depth_np: np.ndarray, path: Path, max_val: int) -> None:
         d = (d - d_min) / (d_max - d_min) * max_val
     else:
         d = np.zeros_like(d)
-    Image.fromarray(d.astype(np.uint16)).save(str(path))
+    writer.write_png(d.astype(np.uint16), path, compress_level=compress_level)
 
 
-def _save_normals_png(normals: np.ndarray, path: Path) -> None:
+def _save_normals_png(
+    normals: np.ndarray, path: Path, writer: ArtifactWriter, compress_level: int = 6
+) -> None:
     """Save normals as 8-bit RGB PNG. Maps [-1,1] -> [0,255]."""
-    path.parent.mkdir(parents=True, exist_ok=True)
     n = ((normals + 1.0) / 2.0 * 255).clip(0, 255).astype(np.uint8)
-    Image.fromarray(n, mode="RGB").save(str(path))
+    writer.write_png(n, path, mode="RGB", compress_level=compress_level)
 
 
-def _save_segmentation_png(seg_mask: np.ndarray, path: Path) -> None:
+def _save_segmentation_png(
+    seg_mask: np.ndarray, path: Path, writer: ArtifactWriter, compress_level: int = 1
+) -> None:
     """Save segmentation mask as 8-bit PNG. 255=dynamic object, 0=static."""
-    path.parent.mkdir(parents=True, exist_ok=True)
     m = (seg_mask.astype(np.uint8) * 255)
-    Image.fromarray(m, mode="L").save(str(path))
+    writer.write_png(m, path, mode="L", compress_level=compress_level)
 
 
 def run_priors(req: PriorsReq, settings: PriorsSettings) -> PriorsResult:
@@ -87,6 +93,12 @@ def run_priors(req: PriorsReq, settings: PriorsSettings) -> PriorsResult:
             error=f"No frames found in {req.frames_dir}",
         )
 
+    if settings.num_threads > 0:
+        # process-wide in torch: pin the lease so the CPU governor leaves torch alone and
+        # gives the other stages what is left; otherwise it sets torch to the stage share
+        pin_cpu_budget(settings.num_threads)
+        torch.set_num_threads(settings.num_threads)
+
     # Load models once
     log.info("Loading Depth Anything V2...")
     depth_pipe = _load_depth_pipeline(settings.depth_model_id, device)
@@ -106,46 +118,52 @@ def run_priors(req: PriorsReq, settings: PriorsSettings) -> PriorsResult:
 
     frame_results: list[PriorsFrameResult] = []
 
-    for frame_path in frames:
-        log.info(f"Processing {frame_path.name}...")
-
-        # Load image once
-        pil_img = Image.open(frame_path).convert("RGB")
-        img_np = np.array(pil_img, dtype=np.uint8)
-
-        # --- Stage 1: Segmentation (dynamic object mask) ---
-        from ptb_ml.preprocess.masking import _deeplab_mask
-        seg_mask = _deeplab_mask(img_np, deeplab_ctx)  # bool HxW, True=dynamic
-
-        # --- Stage 2: Depth (mask dynamic objects before estimation) ---
-        # Zero out dynamic regions so they don't influence depth
-        masked_img = img_np.copy()
-        masked_img[seg_mask] = 0
-        masked_pil = Image.fromarray(masked_img)
-
-        depth_result = depth_pipe(masked_pil)
-        depth_np = np.array(depth_result["depth"], dtype=np.float32)
-
-        # --- Stage 3: Normals (mask dynamic objects) ---
-        normals_np = dsine.infer(masked_img)  # HxWx3 in [-1,1]
-
-        # --- Save outputs ---
-        stem = frame_path.stem  # e.g. frame_000001
-
-        depth_path = depth_dir / f"{stem}.png"
-        normals_path = normals_dir / f"{stem}.png"
-        seg_path = segmentation_dir / f"{stem}.png"
-
-        _save_depth_png(depth_np, depth_path, settings.depth_png_max_val)
-        _save_normals_png(normals_np, normals_path)
-        _save_segmentation_png(seg_mask, seg_path)
-
-        frame_results.append(PriorsFrameResult(
-            frame=frame_path.name,
-            depth_path=str(depth_path),
-            normals_path=str(normals_path),
-            segmentation_path=str(seg_path),
-        ))
+    # PNG encoding overlaps the next frame's inference; leaving the block waits for it
+    writer = ArtifactWriter(workers=settings.artifact_writer_workers, fsync=settings.artifact_fsync)
+    with writer:
+        for frame_path in frames:
+            log.info(f"Processing {frame_path.name}...")
+
+            # Load image once
+            pil_img = Image.open(frame_path).convert("RGB")
+            img_np = np.array(pil_img, dtype=np.uint8)
+
+            # --- Stage 1: Segmentation (dynamic object mask) ---
+            from ptb_ml.preprocess.masking import _deeplab_mask
+            seg_mask = _deeplab_mask(img_np, deeplab_ctx)  # bool HxW, True=dynamic
+
+            # --- Stage 2: Depth (mask dynamic objects before estimation) ---
+            # Zero out dynamic regions so they don't influence depth
+            masked_img = img_np.copy()
+            masked_img[seg_mask] = 0
+            masked_pil = Image.fromarray(masked_img)
+
+            depth_result = depth_pipe(masked_pil)
+            depth_np = np.array(depth_result["depth"], dtype=np.float32)
+
+            # --- Stage 3: Normals (mask dynamic objects) ---
+            normals_np = dsine.infer(masked_img)  # HxWx3 in [-1,1]
+
+            # --- Save outputs ---
+            stem = frame_path.stem  # e.g. frame_000001
+
+            depth_path = depth_dir / f"{stem}.png"
+            normals_path = normals_dir / f"{stem}.png"
+            seg_path = segmentation_dir / f"{stem}.png"
+
+            _save_depth_png(
+                depth_np, depth_path, settings.depth_png_max_val, writer,
+                settings.depth_png_compress_level,
+            )
+            _save_normals_png(normals_np, normals_path, writer, settings.normals_png_compress_level)
+            _save_segmentation_png(seg_mask, seg_path, writer, settings.segmentation_png_compress_level)
+
+            frame_results.append(PriorsFrameResult(
+                frame=frame_path.name,
+                depth_path=str(depth_path),
+                normals_path=str(normals_path),
+                segmentation_path=str(seg_path),
+            ))
 
     # Write manifest
     payload = {
@@ -17,11 +17,44 @@ class PriorsSettings:
         "person", "car", "bus", "truck", "motorcycle", "bicycle"
     )
 
+    # "full" = frames/, "work" = frames_work/. Shape completion reads colour from the
+    # same tier so depth and colour images line up.
+    frame_tier: str = "full"
+
+    # torch intra-op threads for inference on CPU; 0 = torch's default (one per core).
+    # run_pipeline sets a share of the cores when the priors run alongside SfM
+    num_threads: int = 0
+
     # Output
     depth_png_max_val: int = 65535  # 16-bit PNG for depth precision
+    # zlib level per artifact, 0 (store) .. 9 (smallest); PNGs are encoded in the background
+    depth_png_compress_level: int = 6
+    normals_png_compress_level: int = 6
+    segmentation_png_compress_level: int = 1
+    artifact_writer_workers: int = 2  # 0 = write on the inference thread
+    artifact_fsync: bool = False      # fsync outputs before run_priors returns
 
     def __post_init__(self) -> None:
         if self.device.strip().lower() not in {"auto", "cpu", "cuda"}:
             raise ValueError(
                 f"device must be one of auto|cpu|cuda, got '{self.device}'"
+            )
+
+        for name in ("depth_png_compress_level", "normals_png_compress_level",
+                     "segmentation_png_compress_level"):
+            level = getattr(self, name)
+            if not (0 <= level <= 9):
+                raise ValueError(f"{name} must be in [0, 9], got {level}")
+
+        if self.num_threads < 0:
+            raise ValueError(f"num_threads must be >= 0, got {self.num_threads}")
+
+        if self.artifact_writer_workers < 0:
+            raise ValueError(
+                f"artifact_writer_workers must be >= 0, got {self.artifact_writer_workers}"
+            )
+
+        if self.frame_tier not in {"full", "work"}:
+            raise ValueError(
+                f"frame_tier must be one of full|work, got '{self.frame_tier}'"
             )
\ No newline at end of file
@@ -0,0 +1,37 @@
+from .governor import (
+    CpuGovernor,
+    CpuLease,
+    cpu_budget,
+    cpu_lease,
+    current_lease,
+    get_governor,
+    pin_cpu_budget,
+)
+from .progress import (
+    ProgressEvent,
+    emit_progress,
+    parse_colmap_line,
+    parse_ffmpeg_line,
+    progress_sink,
+    report_stage,
+)
+from .subprocess_runner import ProcessResult, run_process, stream_process
+
+__all__ = [
+    "CpuGovernor",
+    "CpuLease",
+    "cpu_budget",
+    "cpu_lease",
+    "current_lease",
+    "get_governor",
+    "pin_cpu_budget",
+    "ProgressEvent",
+    "emit_progress",
+    "parse_colmap_line",
+    "parse_ffmpeg_line",
+    "progress_sink",
+    "report_stage",
+    "ProcessResult",
+    "run_process",
+    "stream_process",
+]
@@ -0,0 +1,175 @@
+"""
+Process-wide CPU governor: splits the machine's cores between the stages that are running
+right now, across all jobs in the process.
+
+A stage takes a lease for as long as it runs (`with cpu_lease("sfm", job_id):`). Every
+active lease gets an equal share of the cores, recomputed and logged whenever a lease is
+taken or released, so two concurrent jobs (or SfM and the priors of one job) no longer
+each start COLMAP, ffmpeg, torch and OpenCV with one thread per core.
+
+Consumers read their budget with cpu_budget() when they start work:
+
+    COLMAP      --FeatureExtraction/--FeatureMatching/--Mapper.num_threads per command
+    ffmpeg      -threads per decode segment
+    thread pools the preprocess workers=0 ("one per CPU") defaults
+
+so external tools pick up a rebalanced budget at their next invocation. torch and OpenCV
+thread pools are process-global rather than per caller; since every lease gets the same
+share, the governor sets torch.set_num_threads / cv2.setNumThreads to that share itself
+on each rebalance (torch only once something has imported it).
+
+A stage with an explicit thread count in its settings pins its lease with
+pin_cpu_budget(); the other leases share the remaining cores, and torch's pool is left
+to the pinned stage until it finishes.
+
+The lease lives in a ContextVar like the progress sink, so worker threads must run under
+contextvars.copy_context() to see their stage's budget.
+"""
+from __future__ import annotations
+
+import contextvars
+import logging
+import os
+import sys
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Iterator, Optional
+
+log = logging.getLogger(__name__)
+
+
+def available_cores() -> int:
+    """Cores this process may run on (respects CPU affinity / container cpusets)."""
+    try:
+        return len(os.sched_getaffinity(0)) or 1
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+@dataclass
+class CpuLease:
+    stage: str
+    job_id: str = ""
+    threads: int = 1      # current share, updated in place on every rebalance
+    pinned: bool = False  # explicit budget from the stage's settings, kept as is
+    governor: Optional["CpuGovernor"] = field(default=None, repr=False, compare=False)
+
+
+def _apply_cv2_threads(threads: int) -> None:
+    try:
+        import cv2
+        cv2.setNumThreads(threads)
+    except ImportError:
+        pass
+
+
+class CpuGovernor:
+    def __init__(self, total_threads: Optional[int] = None, *, apply_library_threads: bool = True) -> None:
+        if total_threads is not None and total_threads < 1:
+            raise ValueError(f"total_threads must be >= 1, got {total_threads}")
+        self.total_threads = total_threads or available_cores()
+        self.apply_library_threads = apply_library_threads
+        self._lock = threading.Lock()
+        self._leases: list[CpuLease] = []
+        self._applied_cv2: Optional[int] = None
+        self._applied_torch: Optional[int] = None
+
+    @property
+    def leases(self) -> tuple[CpuLease, ...]:
+        with self._lock:
+            return tuple(self._leases)
+
+    @contextmanager
+    def lease(self, stage: str, job_id: str = "") -> Iterator[CpuLease]:
+        lease = CpuLease(stage=stage, job_id=job_id, governor=self)
+        with self._lock:
+            self._leases.append(lease)
+            self._rebalance(f"{_label(lease)} started")
+        token = _current_lease.set(lease)
+        try:
+            yield lease
+        finally:
+            _current_lease.reset(token)
+            with self._lock:
+                self._leases.remove(lease)
+                self._rebalance(f"{_label(lease)} finished")
+
+    def pin(self, lease: CpuLease, threads: int) -> None:
+        """Fix a lease at an explicit thread count; the others share what is left."""
+        if threads < 1:
+            raise ValueError(f"threads must be >= 1, got {threads}")
+        with self._lock:
+            lease.threads = threads
+            lease.pinned = True
+            self._rebalance(f"{_label(lease)} pinned to {threads}")
+
+    def _rebalance(self, reason: str) -> None:
+        pinned = [l for l in self._leases if l.pinned]
+        shared = [l for l in self._leases if not l.pinned]
+        free = max(1, self.total_threads - sum(l.threads for l in pinned))
+        share = max(1, free // len(shared)) if shared else free
+        for lease in shared:
+            lease.threads = share
+        if self._leases:
+            running = ", ".join(
+                _label(l) + (f" ({l.threads} pinned)" if l.pinned else "") for l in self._leases
+            )
+            log.info(f"CPU budget ({reason}): {share}/{self.total_threads} threads each for {running}")
+        else:
+            log.info(f"CPU budget ({reason}): idle")
+
+        if not self.apply_library_threads:
+            return
+        if share != self._applied_cv2:
+            _apply_cv2_threads(share)
+            self._applied_cv2 = share
+        # a pinned stage has set torch's process-wide pool itself (run_priors); leave it
+        torch = sys.modules.get("torch")
+        if pinned or torch is None:
+            self._applied_torch = None
+        elif share != self._applied_torch:
+            torch.set_num_threads(share)
+            self._applied_torch = share
+
+
+def _label(lease: CpuLease) -> str:
+    return f"{lease.job_id}/{lease.stage}" if lease.job_id else lease.stage
+
+
+_current_lease: contextvars.ContextVar[Optional[CpuLease]] = contextvars.ContextVar(
+    "ptb_cpu_lease", default=None
+)
+_governor: Optional[CpuGovernor] = None
+_governor_lock = threading.Lock()
+
+
+def get_governor() -> CpuGovernor:
+    """The process-wide governor, sized to available_cores() on first use."""
+    global _governor
+    with _governor_lock:
+        if _governor is None:
+            _governor = CpuGovernor()
+        return _governor
+
+
+def cpu_lease(stage: str, job_id: str = ""):
+    """Context manager: hold a share of the process-wide governor's cores for a stage."""
+    return get_governor().lease(stage, job_id)
+
+
+def current_lease() -> Optional[CpuLease]:
+    return _current_lease.get()
+
+
+def pin_cpu_budget(threads: int) -> None:
+    """Pin the calling stage's lease to an explicit thread count (no-op without a lease)."""
+    lease = _current_lease.get()
+    if lease is not None and lease.governor is not None:
+        lease.governor.pin(lease, threads)
+
+
+def cpu_budget() -> int:
+    """Threads the calling stage may use now; all cores when it holds no lease."""
+    lease = _current_lease.get()
+    return lease.threads if lease is not None else available_cores()
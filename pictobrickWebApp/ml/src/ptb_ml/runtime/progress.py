@@ -0,0 +1,111 @@
+"""
+Progress events from long-running stages and the external tools they drive.
+
+Code that knows how far along it is calls emit_progress(); whoever runs the job installs
+a sink with `with progress_sink(callback):` for the duration of the run. The sink lives in
+a ContextVar, so concurrent jobs on different threads each see their own sink and
+library code never needs a progress argument threaded through it. Worker threads started
+by a stage must run under contextvars.copy_context() to report into the caller's sink.
+
+The parse_* helpers turn tool log lines into (current, total) counts:
+
+    COLMAP feature_extractor   "Processed file [12/150]"
+    COLMAP matchers            "Matching block [2/4, 3/4]", "Matching image [12/150]"
+    COLMAP mapper              "Registering image #37 (12)"   -> 12 registered so far
+    ffmpeg -progress           "frame=123"
+"""
+from __future__ import annotations
+
+import contextvars
+import logging
+import re
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Iterator, Optional
+
+log = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ProgressEvent:
+    stage: str                      # pipeline stage, e.g. "preprocess", "sfm"
+    step: str = ""                  # sub-step, e.g. "feature_extractor", "ffmpeg"
+    current: Optional[int] = None
+    total: Optional[int] = None
+    message: str = ""
+
+    @property
+    def fraction(self) -> Optional[float]:
+        if self.current is None or not self.total:
+            return None
+        return min(1.0, self.current / self.total)
+
+    def describe(self) -> str:
+        """Short human readable status, e.g. "sfm: mapper 12/150"."""
+        text = self.stage
+        if self.step:
+            text += f": {self.step}"
+        if self.current is not None:
+            text += f" {self.current}" + (f"/{self.total}" if self.total else "")
+        if self.message:
+            text += f" ({self.message})" if self.step or self.current is not None else f": {self.message}"
+        return text
+
+
+ProgressSink = Callable[[ProgressEvent], None]
+
+_sink: contextvars.ContextVar[Optional[ProgressSink]] = contextvars.ContextVar(
+    "ptb_progress_sink", default=None
+)
+
+
+@contextmanager
+def progress_sink(sink: ProgressSink) -> Iterator[None]:
+    token = _sink.set(sink)
+    try:
+        yield
+    finally:
+        _sink.reset(token)
+
+
+def emit_progress(event: ProgressEvent) -> None:
+    """Hand an event to the current sink; a failing sink never breaks the stage."""
+    sink = _sink.get()
+    if sink is None:
+        return
+    try:
+        sink(event)
+    except Exception as exc:
+        log.warning(f"Progress sink failed on {event}: {exc}")
+
+
+def report_stage(stage: str, message: str = "") -> None:
+    emit_progress(ProgressEvent(stage=stage, message=message))
+
+
+_COLMAP_COUNT = re.compile(r"(?:Processed file|Matching image|Processing image)\s*\[(\d+)/(\d+)\]")
+_COLMAP_BLOCK = re.compile(r"Matching block\s*\[(\d+)/(\d+),\s*(\d+)/(\d+)\]")
+_COLMAP_BLOCK1 = re.compile(r"Matching block\s*\[(\d+)/(\d+)\]")
+_COLMAP_REGISTER = re.compile(r"Registering image #\d+\s*\((?:num_reg_\w+=)?(\d+)\)")
+_FFMPEG_FRAME = re.compile(r"^\s*frame=\s*(\d+)")
+
+
+def parse_colmap_line(line: str) -> Optional[tuple[int, Optional[int]]]:
+    """(current, total) from a COLMAP log line; total is None for the mapper."""
+    m = _COLMAP_BLOCK.search(line)
+    if m:
+        i, n, j, k = (int(g) for g in m.groups())
+        return (i - 1) * k + j, n * k
+    m = _COLMAP_COUNT.search(line) or _COLMAP_BLOCK1.search(line)
+    if m:
+        return int(m.group(1)), int(m.group(2))
+    m = _COLMAP_REGISTER.search(line)
+    if m:
+        return int(m.group(1)), None
+    return None
+
+
+def parse_ffmpeg_line(line: str) -> Optional[int]:
+    """Frames written so far from an ffmpeg `-progress` (or stats) line."""
+    m = _FFMPEG_FRAME.search(line)
+    return int(m.group(1)) if m else None
@@ -0,0 +1,143 @@
+"""
+Asyncio subprocess runner that streams output instead of buffering it.
+
+stdout and stderr are read concurrently in chunks as the tool produces them: every chunk
+goes straight to its log file (flushed, so `tail -f` on a job's logs works while COLMAP
+runs), and complete lines (split on \\n and the \\r that progress bars use) are handed to
+an on_line callback, which is where progress parsing hooks in. Only the last tail_lines
+stderr lines are kept in memory, for error messages.
+
+run_process() is the blocking entry point for the pipeline's synchronous stages; it runs
+its own event loop, so it must not be called from a thread that is already running one.
+"""
+from __future__ import annotations
+
+import asyncio
+import codecs
+import re
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import BinaryIO, Callable, Optional, Sequence
+
+# (stream name "stdout" | "stderr", line without its terminator)
+LineCallback = Callable[[str, str], None]
+
+_LINE_SPLIT = re.compile(r"[\r\n]")
+_CHUNK = 64 * 1024
+
+
+@dataclass(frozen=True)
+class ProcessResult:
+    cmd: tuple[str, ...]
+    returncode: int
+    stdout_path: Optional[Path]
+    stderr_path: Optional[Path]
+    stderr_tail: str  # last stderr lines, for error messages
+
+    @property
+    def ok(self) -> bool:
+        return self.returncode == 0
+
+
+async def _pump(
+        stream: asyncio.StreamReader,
+        name: str,
+        log_path: Optional[Path],
+        on_line: Optional[LineCallback],
+        tail: Optional[deque],
+) -> None:
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    pending = ""
+    f: Optional[BinaryIO] = open(log_path, "wb") if log_path is not None else None
+    try:
+        while True:
+            chunk = await stream.read(_CHUNK)
+            final = not chunk
+            if f is not None and chunk:
+                f.write(chunk)
+                f.flush()
+            if on_line is None and tail is None:
+                if final:
+                    break
+                continue
+
+            pending += decoder.decode(chunk, final=final)
+            *lines, pending = _LINE_SPLIT.split(pending)
+            if final and pending:
+                lines.append(pending)
+            for line in lines:
+                if not line:
+                    continue
+                if tail is not None:
+                    tail.append(line)
+                if on_line is not None:
+                    on_line(name, line)
+            if final:
+                break
+    finally:
+        if f is not None:
+            f.close()
+
+
+async def stream_process(
+        cmd: Sequence[str],
+        *,
+        stdout_path: Optional[Path] = None,
+        stderr_path: Optional[Path] = None,
+        on_line: Optional[LineCallback] = None,
+        cwd: Optional[Path] = None,
+        tail_lines: int = 50,
+) -> ProcessResult:
+    """Run cmd to completion, streaming its output; the process is killed if the caller is cancelled."""
+    for p in (stdout_path, stderr_path):
+        if p is not None:
+            p.parent.mkdir(parents=True, exist_ok=True)
+
+    proc = await asyncio.create_subprocess_exec(
+        *cmd,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        cwd=str(cwd) if cwd is not None else None,
+    )
+    tail: deque = deque(maxlen=tail_lines)
+    try:
+        assert proc.stdout is not None and proc.stderr is not None
+        await asyncio.gather(
+            _pump(proc.stdout, "stdout", stdout_path, on_line, None),
+            _pump(proc.stderr, "stderr", stderr_path, on_line, tail),
+        )
+        returncode = await proc.wait()
+    except BaseException:
+        if proc.returncode is None:
+            proc.kill()
+            await proc.wait()
+        raise
+
+    return ProcessResult(
+        cmd=tuple(cmd),
+        returncode=returncode,
+        stdout_path=stdout_path,
+        stderr_path=stderr_path,
+        stderr_tail="\n".join(tail),
+    )
+
+
+def run_process(
+        cmd: Sequence[str],
+        *,
+        stdout_path: Optional[Path] = None,
+        stderr_path: Optional[Path] = None,
+        on_line: Optional[LineCallback] = None,
+        cwd: Optional[Path] = None,
+        tail_lines: int = 50,
+) -> ProcessResult:
+    """Blocking stream_process() on a private event loop."""
+    return asyncio.run(stream_process(
+        cmd,
+        stdout_path=stdout_path,
+        stderr_path=stderr_path,
+        on_line=on_line,
+        cwd=cwd,
+        tail_lines=tail_lines,
+    ))
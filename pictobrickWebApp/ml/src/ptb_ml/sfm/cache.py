@@ -0,0 +1,258 @@
+"""
+Feature/match cache for SfM reruns (SfmSettings.cache).
+
+The COLMAP database is kept between runs together with a small state file next to it
+(`database.cache.json`) recording, per image, a content hash of the frame (and its mask),
+plus keys of the settings that shaped extraction and matching:
+
+- extraction key changed, or no usable state/database  -> start from an empty database
+- images gone or changed                              -> their rows are deleted, with
+                                                         their rig frames on COLMAP >= 3.12
+- new (or changed) images                             -> feature_extractor on just those
+- matching key changed                                -> all matches dropped, full rematch
+- nothing new and matching key unchanged              -> matcher skipped
+
+COLMAP's matchers skip pairs that already have matches in the database, so rerunning
+the matcher after adding images only matches the new pairs. Mapper settings are not
+part of either key: a mapper-only change goes straight to the mapper.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import sqlite3
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Optional
+
+from .models import SfmReq
+from .settings import SfmSettings
+
+log = logging.getLogger(__name__)
+
+CACHE_VERSION = 1
+
+# pair_id = image_id1 * MAX_IMAGE_ID + image_id2 (image_id1 < image_id2), as in COLMAP
+MAX_IMAGE_ID = 2147483647
+
+# SensorType::CAMERA in COLMAP's frame_data / rig_sensors tables (3.12+)
+_SENSOR_CAMERA = 0
+
+# file extensions COLMAP's image reader picks up from image_path
+_IMAGE_EXTS = {".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff"}
+
+
+@dataclass(frozen=True)
+class CachePlan:
+    reset: bool                      # start from an empty database
+    extract: tuple[str, ...]         # image names that need feature extraction
+    remove: tuple[str, ...]          # image names to delete from the database first
+    clear_matches: bool              # matching settings changed
+    run_matcher: bool
+    extraction_key: str
+    matching_key: str
+    hashes: dict[str, str]
+
+
+def state_path_for(database_path: Path) -> Path:
+    return database_path.with_suffix(".cache.json")
+
+
+def _settings_key(values: dict) -> str:
+    return hashlib.sha1(json.dumps(values, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def extraction_key(req: SfmReq, settings: SfmSettings) -> str:
+    return _settings_key({
+        "camera_model": settings.camera_model,
+        "single_camera": settings.single_camera,
+        "max_image_size": settings.max_image_size,
+        "max_num_features": settings.max_num_features,
+        "masked": req.mask_dir is not None,
+    })
+
+
+def matching_key(req: SfmReq, settings: SfmSettings) -> str:
+    values: dict = {
+        "input_mode": req.input_mode,
+        "max_num_matches": settings.max_num_matches,
+    }
+    if req.input_mode == "sequential" or settings.unordered_matching == "sequence":
+        values.update(
+            overlap=settings.sequential_overlap,
+            quadratic_overlap=settings.sequential_quadratic_overlap,
+            loop_detection=settings.sequential_loop_detection,
+            loop_detection_period=settings.sequential_loop_detection_period,
+            loop_detection_num_images=settings.sequential_loop_detection_num_images,
+        )
+    if req.input_mode == "unordered":
+        values.update(
+            unordered_matching=settings.unordered_matching,
+            retrieval_top_k=settings.retrieval_top_k,
+            retrieval_min_images=settings.retrieval_min_images,
+            retrieval_phash_weight=settings.retrieval_phash_weight,
+        )
+    return _settings_key(values)
+
+
+def list_images(req: SfmReq) -> list[str]:
+    """Names of the images COLMAP will read for this request."""
+    if req.image_list_path is not None:
+        return [
+            line.strip() for line in req.image_list_path.read_text(encoding="utf-8").splitlines()
+            if line.strip()
+        ]
+    return sorted(
+        p.name for p in req.image_dir.iterdir()
+        if p.is_file() and p.suffix.lower() in _IMAGE_EXTS
+    )
+
+
+def hash_images(req: SfmReq, names: list[str]) -> dict[str, str]:
+    """Content hash per image, covering its mask when masks are used."""
+    out: dict[str, str] = {}
+    for name in names:
+        h = hashlib.blake2b(digest_size=16)
+        h.update((req.image_dir / name).read_bytes())
+        if req.mask_dir is not None:
+            mask_p = req.mask_dir / f"{name}.png"
+            if mask_p.exists():
+                h.update(mask_p.read_bytes())
+        out[name] = h.hexdigest()
+    return out
+
+
+def load_state(path: Path) -> Optional[dict]:
+    try:
+        state = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    return state if state.get("version") == CACHE_VERSION else None
+
+
+def save_state(path: Path, plan: CachePlan, *, extracted: bool, matched: bool) -> None:
+    """Record what the database now holds; written via a temp file so a crash leaves the old state."""
+    state = {
+        "version": CACHE_VERSION,
+        "extraction_key": plan.extraction_key,
+        "matching_key": plan.matching_key,
+        "images": plan.hashes if extracted else {},
+        "matched": matched,
+    }
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(state, indent=2), encoding="utf-8")
+    tmp.replace(path)
+
+
+def plan_cache(req: SfmReq, settings: SfmSettings, database_path: Path) -> CachePlan:
+    names = list_images(req)
+    hashes = hash_images(req, names)
+    x_key = extraction_key(req, settings)
+    m_key = matching_key(req, settings)
+
+    state = load_state(state_path_for(database_path))
+    usable = (
+        state is not None
+        and database_path.exists()
+        and state.get("extraction_key") == x_key
+    )
+    cached: dict[str, str] = state.get("images", {}) if usable else {}
+    remove = tuple(n for n, h in cached.items() if hashes.get(n) != h)
+    if not usable or (remove and not _supports_image_removal(database_path)):
+        return CachePlan(
+            reset=True, extract=tuple(names), remove=(), clear_matches=False, run_matcher=True,
+            extraction_key=x_key, matching_key=m_key, hashes=hashes,
+        )
+
+    extract = tuple(n for n in names if cached.get(n) != hashes[n])
+    clear = state.get("matching_key") != m_key
+    run_matcher = clear or bool(extract) or not state.get("matched", False)
+    return CachePlan(
+        reset=False, extract=extract, remove=remove, clear_matches=clear, run_matcher=run_matcher,
+        extraction_key=x_key, matching_key=m_key, hashes=hashes,
+    )
+
+
+def _tables(con: sqlite3.Connection) -> set[str]:
+    return {r[0] for r in con.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+
+
+def _supports_image_removal(database_path: Path) -> bool:
+    """Databases this module knows how to delete images from; anything else is rebuilt."""
+    with sqlite3.connect(database_path) as con:
+        tables = _tables(con)
+    if not {"images", "keypoints", "descriptors", "matches", "two_view_geometries"} <= tables:
+        return False
+    # COLMAP >= 3.12 ties every image to a frame of a rig
+    return "frames" not in tables or {"frame_data", "rigs"} <= tables
+
+
+def _remove_image_frames(con: sqlite3.Connection, image_id: int, tables: set[str]) -> None:
+    """Drop the image from its frames, frames left without data, and rigs left without frames."""
+    frame_ids = [
+        r[0] for r in con.execute(
+            "SELECT frame_id FROM frame_data WHERE data_id = ? AND sensor_type = ?",
+            (image_id, _SENSOR_CAMERA),
+        )
+    ]
+    con.execute(
+        "DELETE FROM frame_data WHERE data_id = ? AND sensor_type = ?", (image_id, _SENSOR_CAMERA)
+    )
+    for frame_id in frame_ids:
+        if con.execute("SELECT 1 FROM frame_data WHERE frame_id = ?", (frame_id,)).fetchone():
+            continue
+        row = con.execute("SELECT rig_id FROM frames WHERE frame_id = ?", (frame_id,)).fetchone()
+        con.execute("DELETE FROM frames WHERE frame_id = ?", (frame_id,))
+        if row is None:
+            continue
+        if not con.execute("SELECT 1 FROM frames WHERE rig_id = ?", (row[0],)).fetchone():
+            con.execute("DELETE FROM rigs WHERE rig_id = ?", (row[0],))
+            if "rig_sensors" in tables:
+                con.execute("DELETE FROM rig_sensors WHERE rig_id = ?", (row[0],))
+
+
+def remove_images(database_path: Path, names: tuple[str, ...]) -> None:
+    """Delete images with their features and every pair they are part of."""
+    if not names:
+        return
+    with sqlite3.connect(database_path) as con:
+        tables = _tables(con)
+        ids = [
+            r[0] for n in names
+            for r in con.execute("SELECT image_id FROM images WHERE name = ?", (n,))
+        ]
+        for image_id in ids:
+            if "frames" in tables:
+                _remove_image_frames(con, image_id, tables)
+            for table in ("matches", "two_view_geometries"):
+                con.execute(
+                    f"DELETE FROM {table} WHERE pair_id % ? = ? OR pair_id / ? = ?",
+                    (MAX_IMAGE_ID, image_id, MAX_IMAGE_ID, image_id),
+                )
+            for table in ("keypoints", "descriptors", "images"):
+                con.execute(f"DELETE FROM {table} WHERE image_id = ?", (image_id,))
+    log.info(f"SfM cache: removed {len(ids)} stale images from {database_path.name}")
+
+
+def clear_matches(database_path: Path) -> None:
+    with sqlite3.connect(database_path) as con:
+        con.execute("DELETE FROM matches")
+        con.execute("DELETE FROM two_view_geometries")
+
+
+def existing_camera_id(database_path: Path) -> Optional[int]:
+    """The camera shared by the cached images, for single_camera extraction of new ones."""
+    if not database_path.exists():
+        return None
+    with sqlite3.connect(database_path) as con:
+        row = con.execute("SELECT camera_id FROM images LIMIT 1").fetchone()
+    return int(row[0]) if row else None
+
+
+def describe(plan: CachePlan) -> dict:
+    d = asdict(plan)
+    d.pop("hashes")
+    d["extract"] = len(plan.extract)
+    d["remove"] = len(plan.remove)
+    return d
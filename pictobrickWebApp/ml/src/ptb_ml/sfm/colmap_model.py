@@ -0,0 +1,276 @@
+"""
+Reader for COLMAP binary sparse models (cameras.bin, images.bin, points3D.bin).
+
+Pure NumPy: no COLMAP binary is needed on the host. The variable-length records are
+walked once to find offsets; the payloads (2D observations, point headers, tracks)
+are then decoded in bulk with structured np.frombuffer views instead of per-field
+parsing. Layouts follow COLMAP's src/colmap/scene/reconstruction_io (little-endian).
+
+Poses are world-to-camera: x_cam = R(q) @ x_world + t, with q = (w, x, y, z).
+"""
+from __future__ import annotations
+
+import struct
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+# model_id -> (name, number of params)
+CAMERA_MODELS: dict[int, tuple[str, int]] = {
+    0: ("SIMPLE_PINHOLE", 3),
+    1: ("PINHOLE", 4),
+    2: ("SIMPLE_RADIAL", 4),
+    3: ("RADIAL", 5),
+    4: ("OPENCV", 8),
+    5: ("OPENCV_FISHEYE", 8),
+    6: ("FULL_OPENCV", 12),
+    7: ("FOV", 5),
+    8: ("SIMPLE_RADIAL_FISHEYE", 4),
+    9: ("RADIAL_FISHEYE", 5),
+    10: ("THIN_PRISM_FISHEYE", 12),
+    11: ("RAD_TAN_THIN_PRISM_FISHEYE", 16),
+}
+
+POINT2D_DTYPE = np.dtype([("xy", "<f8", (2,)), ("point3d_id", "<i8")])
+TRACK_DTYPE = np.dtype([("image_id", "<i4"), ("point2d_idx", "<i4")])
+
+# points3D.bin record header: id, xyz, rgb, error, track length
+_POINT_HEADER_DTYPE = np.dtype([
+    ("id", "<u8"),
+    ("xyz", "<f8", (3,)),
+    ("rgb", "u1", (3,)),
+    ("error", "<f8"),
+    ("track_length", "<u8"),
+])
+_IMAGE_HEADER = struct.Struct("<i4d3di")  # image_id, qvec, tvec, camera_id
+_CAMERA_HEADER = struct.Struct("<iiQQ")   # camera_id, model_id, width, height
+
+
+@dataclass(frozen=True)
+class Camera:
+    camera_id: int
+    model: str
+    width: int
+    height: int
+    params: np.ndarray  # model-specific, e.g. PINHOLE = fx, fy, cx, cy
+
+    def intrinsic_matrix(self) -> np.ndarray:
+        """3x3 K from the focal length / principal point params (distortion ignored)."""
+        p = self.params
+        if self.model in ("SIMPLE_PINHOLE", "SIMPLE_RADIAL", "RADIAL",
+                          "SIMPLE_RADIAL_FISHEYE", "RADIAL_FISHEYE", "FOV"):
+            fx = fy = p[0]
+            cx, cy = p[1], p[2]
+        else:
+            fx, fy, cx, cy = p[0], p[1], p[2], p[3]
+        return np.array([[fx, 0.0, cx], [0.0, fy, cy], [0.0, 0.0, 1.0]], dtype=np.float64)
+
+
+@dataclass(frozen=True)
+class ModelStats:
+    """The summary `colmap model_analyzer` prints."""
+    cameras: int
+    registered_images: int
+    points3d: int
+    observations: int
+    mean_track_length: float
+    mean_observations_per_image: float
+    reprojection_error: float  # px, mean over points with a valid error
+
+
+@dataclass(frozen=True)
+class ImagesData:
+    image_ids: np.ndarray    # (N,) int32
+    names: tuple[str, ...]
+    camera_ids: np.ndarray   # (N,) int32
+    qvecs: np.ndarray        # (N, 4) float64, w x y z
+    tvecs: np.ndarray        # (N, 3) float64
+    points2d: tuple[np.ndarray, ...]  # per image, POINT2D_DTYPE views (point3d_id -1 = none)
+
+
+@dataclass(frozen=True)
+class Points3DData:
+    ids: np.ndarray            # (M,) uint64
+    xyz: np.ndarray            # (M, 3) float64
+    rgb: np.ndarray            # (M, 3) uint8
+    errors: np.ndarray         # (M,) float64, -1 = not computed
+    track_lengths: np.ndarray  # (M,) int64
+    tracks: np.ndarray         # (sum track_lengths,) TRACK_DTYPE, point i at track_offsets[i]:[i+1]
+    track_offsets: np.ndarray  # (M + 1,) int64
+
+    def track(self, i: int) -> np.ndarray:
+        return self.tracks[self.track_offsets[i]:self.track_offsets[i + 1]]
+
+
+@dataclass(frozen=True)
+class ColmapModel:
+    cameras: dict[int, Camera]
+    images: ImagesData
+    points3d: Points3DData
+
+    def rotations(self) -> np.ndarray:
+        return quat_to_rotation_matrices(self.images.qvecs)
+
+    def extrinsics(self) -> dict[str, np.ndarray]:
+        return extrinsics_by_name(self.images)
+
+    def stats(self) -> ModelStats:
+        return model_stats(self.cameras, self.images, self.points3d)
+
+
+def quat_to_rotation_matrices(q: np.ndarray) -> np.ndarray:
+    """(N, 4) unit quaternions (w, x, y, z) -> (N, 3, 3) rotation matrices."""
+    q = np.asarray(q, dtype=np.float64).reshape(-1, 4)
+    w, x, y, z = q[:, 0], q[:, 1], q[:, 2], q[:, 3]
+    R = np.empty((len(q), 3, 3), dtype=np.float64)
+    R[:, 0, 0] = 1 - 2 * (y * y + z * z)
+    R[:, 0, 1] = 2 * (x * y - z * w)
+    R[:, 0, 2] = 2 * (x * z + y * w)
+    R[:, 1, 0] = 2 * (x * y + z * w)
+    R[:, 1, 1] = 1 - 2 * (x * x + z * z)
+    R[:, 1, 2] = 2 * (y * z - x * w)
+    R[:, 2, 0] = 2 * (x * z - y * w)
+    R[:, 2, 1] = 2 * (y * z + x * w)
+    R[:, 2, 2] = 1 - 2 * (x * x + y * y)
+    return R
+
+
+def extrinsics_by_name(images: ImagesData) -> dict[str, np.ndarray]:
+    """Image name -> 4x4 world-to-camera matrix [R | t]."""
+    T = np.tile(np.eye(4, dtype=np.float64), (len(images.names), 1, 1))
+    T[:, :3, :3] = quat_to_rotation_matrices(images.qvecs)
+    T[:, :3, 3] = images.tvecs
+    return dict(zip(images.names, T))
+
+
+def _read_bytes(path: Path) -> bytes:
+    if not path.exists():
+        raise FileNotFoundError(f"COLMAP model file not found: {path}")
+    return path.read_bytes()
+
+
+def read_cameras_bin(path: Path) -> dict[int, Camera]:
+    buf = _read_bytes(Path(path))
+    (n,) = struct.unpack_from("<Q", buf, 0)
+    off = 8
+    cameras: dict[int, Camera] = {}
+    for _ in range(n):
+        camera_id, model_id, width, height = _CAMERA_HEADER.unpack_from(buf, off)
+        off += _CAMERA_HEADER.size
+        if model_id not in CAMERA_MODELS:
+            raise ValueError(f"Unknown COLMAP camera model id {model_id} in {path}")
+        name, num_params = CAMERA_MODELS[model_id]
+        params = np.frombuffer(buf, dtype="<f8", count=num_params, offset=off).copy()
+        off += 8 * num_params
+        cameras[camera_id] = Camera(camera_id, name, int(width), int(height), params)
+    return cameras
+
+
+def read_images_bin(path: Path, *, with_points2d: bool = True) -> ImagesData:
+    """
+    Parse images.bin. The 2D observations are zero-copy structured views into the file
+    buffer; with_points2d=False skips them (poses only).
+    """
+    buf = _read_bytes(Path(path))
+    (n,) = struct.unpack_from("<Q", buf, 0)
+    off = 8
+
+    image_ids = np.empty(n, dtype=np.int32)
+    camera_ids = np.empty(n, dtype=np.int32)
+    poses = np.empty((n, 7), dtype=np.float64)
+    names: list[str] = []
+    points2d: list[np.ndarray] = []
+    for i in range(n):
+        rec = _IMAGE_HEADER.unpack_from(buf, off)
+        image_ids[i], poses[i], camera_ids[i] = rec[0], rec[1:8], rec[8]
+        off += _IMAGE_HEADER.size
+        end = buf.index(b"\0", off)
+        names.append(buf[off:end].decode("utf-8"))
+        off = end + 1
+        (num_points2d,) = struct.unpack_from("<Q", buf, off)
+        off += 8
+        if with_points2d:
+            points2d.append(np.frombuffer(buf, dtype=POINT2D_DTYPE, count=num_points2d, offset=off))
+        off += num_points2d * POINT2D_DTYPE.itemsize
+
+    return ImagesData(
+        image_ids=image_ids,
+        names=tuple(names),
+        camera_ids=camera_ids,
+        qvecs=poses[:, :4],
+        tvecs=poses[:, 4:],
+        points2d=tuple(points2d),
+    )
+
+
+def read_points3d_bin(path: Path) -> Points3DData:
+    buf = _read_bytes(Path(path))
+    (n,) = struct.unpack_from("<Q", buf, 0)
+    header = _POINT_HEADER_DTYPE.itemsize
+    track_len_at = _POINT_HEADER_DTYPE.fields["track_length"][1]
+
+    # only the record offsets need a sequential walk
+    starts = np.empty(n, dtype=np.int64)
+    lengths = np.empty(n, dtype=np.int64)
+    unpack_len = struct.Struct("<Q").unpack_from
+    off = 8
+    for i in range(n):
+        (L,) = unpack_len(buf, off + track_len_at)
+        starts[i], lengths[i] = off, L
+        off += header + L * TRACK_DTYPE.itemsize
+
+    # every byte after the count is either a record header or track payload, so two
+    # boolean selections split the file into contiguous header and track arrays
+    raw = np.frombuffer(buf, dtype=np.uint8, count=off)
+    edges = np.zeros(off + 1, dtype=np.int8)
+    edges[starts] = 1
+    edges[starts + header] -= 1
+    in_header = np.cumsum(edges[:-1], dtype=np.int8).view(bool)
+    in_header[:8] = True  # the point count
+    headers = raw[8:][in_header[8:]].view(_POINT_HEADER_DTYPE)
+    tracks = raw[~in_header].view(TRACK_DTYPE)
+
+    track_offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(lengths, out=track_offsets[1:])
+
+    return Points3DData(
+        ids=headers["id"].copy(),
+        xyz=headers["xyz"].copy(),
+        rgb=headers["rgb"].copy(),
+        errors=headers["error"].copy(),
+        track_lengths=lengths,
+        tracks=tracks,
+        track_offsets=track_offsets,
+    )
+
+
+def model_stats(cameras: dict[int, Camera], images: ImagesData, points3d: Points3DData) -> ModelStats:
+    n_images = len(images.names)
+    n_points = len(points3d.ids)
+    observations = int(points3d.track_lengths.sum())
+    valid = points3d.errors >= 0
+    return ModelStats(
+        cameras=len(cameras),
+        registered_images=n_images,
+        points3d=n_points,
+        observations=observations,
+        mean_track_length=observations / n_points if n_points else 0.0,
+        mean_observations_per_image=observations / n_images if n_images else 0.0,
+        reprojection_error=float(points3d.errors[valid].mean()) if valid.any() else 0.0,
+    )
+
+
+def read_model(model_dir: Path, *, with_points2d: bool = True) -> ColmapModel:
+    """Read a binary sparse model directory (e.g. sparse/0)."""
+    model_dir = Path(model_dir)
+    return ColmapModel(
+        cameras=read_cameras_bin(model_dir / "cameras.bin"),
+        images=read_images_bin(model_dir / "images.bin", with_points2d=with_points2d),
+        points3d=read_points3d_bin(model_dir / "points3D.bin"),
+    )
+
+
+def read_model_stats(model_dir: Path) -> ModelStats:
+    """model_analyzer-style statistics of a binary sparse model, without the 2D observations."""
+    return read_model(model_dir, with_points2d=False).stats()
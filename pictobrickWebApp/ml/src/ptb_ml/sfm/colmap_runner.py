@@ -3,8 +3,9 @@ from __future__ import annotations
 from dataclasses import dataclass
 from pathlib import Path
 import shlex
-import subprocess
 
+from ..runtime import ProgressEvent, current_lease, emit_progress, parse_colmap_line, run_process
+from ..runtime.subprocess_runner import LineCallback
 from .models import SfmReq
 from .settings import SfmSettings
 
@@ -27,6 +28,17 @@ def _append_arg(cmd: list[str], flag: str, value: object | None) -> None:
     cmd.extend([flag, str(value)])
 
 
+def _append_num_threads(cmd: list[str], flag: str, settings: SfmSettings) -> None:
+    # explicit num_threads, else the stage's CPU governor share (runtime/governor.py),
+    # else COLMAP's default of one thread per core
+    threads = settings.num_threads
+    lease = current_lease()
+    if threads == 0 and lease is not None:
+        threads = lease.threads
+    if threads > 0:
+        cmd.extend([flag, str(threads)])
+
+
 def quote_cmd(cmd: list[str] | tuple[str, ...]) -> str:
     return shlex.join(list(cmd))
 
@@ -35,6 +47,7 @@ def build_feature_extractor_cmd(
     req: SfmReq,
     settings: SfmSettings,
     database_path: Path,
+    existing_camera_id: int | None = None,
 ) -> list[str]:
     cmd: list[str] = [
         settings.colmap_bin,
@@ -55,6 +68,12 @@ def build_feature_extractor_cmd(
     if req.image_list_path is not None:
         cmd.extend(["--image_list_path", str(req.image_list_path)])
 
+    _append_num_threads(cmd, "--FeatureExtraction.num_threads", settings)
+
+    # images added to a cached database join its camera instead of getting a new one
+    if existing_camera_id is not None:
+        cmd.extend(["--ImageReader.existing_camera_id", str(existing_camera_id)])
+
     return cmd
 
 
@@ -62,7 +81,9 @@ def build_matcher_cmd(
     req: SfmReq,
     settings: SfmSettings,
     database_path: Path,
+    pairs_path: Path | None = None,
 ) -> tuple[str, list[str]]:
+    """Unordered sets with a planned pairs file (sfm/pairs.py) match just those pairs."""
     if req.input_mode == "sequential":
         name = "sequential_matcher"
         cmd: list[str] = [
@@ -86,6 +107,22 @@ def build_matcher_cmd(
                 "--SequentialMatching.loop_detection_num_images",
                 str(settings.sequential_loop_detection_num_images),
             ])
+        _append_num_threads(cmd, "--FeatureMatching.num_threads", settings)
+        return name, cmd
+
+    if pairs_path is not None:
+        name = "matches_importer"
+        cmd = [
+            settings.colmap_bin,
+            "matches_importer",
+            "--database_path", str(database_path),
+            "--match_list_path", str(pairs_path),
+            "--match_type", "pairs",
+            "--FeatureMatching.use_gpu", _bool01(settings.use_gpu),
+            "--FeatureMatching.gpu_index", settings.gpu_index,
+            "--FeatureMatching.max_num_matches", str(settings.max_num_matches),
+        ]
+        _append_num_threads(cmd, "--FeatureMatching.num_threads", settings)
         return name, cmd
 
     name = "exhaustive_matcher"
@@ -97,6 +134,7 @@ def build_matcher_cmd(
         "--FeatureMatching.gpu_index", settings.gpu_index,
         "--FeatureMatching.max_num_matches", str(settings.max_num_matches),
     ]
+    _append_num_threads(cmd, "--FeatureMatching.num_threads", settings)
     return name, cmd
 
 
@@ -105,7 +143,9 @@ def build_mapper_cmd(
     settings: SfmSettings,
     database_path: Path,
     sparse_dir: Path,
+    snapshot_dir: Path | None = None,
 ) -> list[str]:
+    """snapshot_dir turns on periodic model snapshots for the mapper watchdog."""
     cmd: list[str] = [
         settings.colmap_bin,
         "mapper",
@@ -117,6 +157,15 @@ def build_mapper_cmd(
     if settings.mapper_ba_use_gpu:
         cmd.extend(["--Mapper.ba_use_gpu", "1"])
 
+    _append_num_threads(cmd, "--Mapper.num_threads", settings)
+
+    if snapshot_dir is not None:
+        cmd.extend([
+            "--Mapper.snapshot_path", str(snapshot_dir),
+            "--Mapper.snapshot_frames_freq", str(settings.watchdog_snapshot_freq),
+        ])
+    _append_arg(cmd, "--Mapper.max_reg_trials", settings.mapper_max_reg_trials)
+
     _append_arg(
         cmd,
         "--Mapper.ba_global_max_num_iterations",
@@ -137,23 +186,39 @@ def run_colmap_command(
     cmd: list[str],
     logs_dir: Path,
     cwd: Path | None = None,
+    progress_total: int | None = None,
+    on_line: LineCallback | None = None,
 ) -> ColmapCommandResult:
+    """
+    Run one COLMAP step, streaming its output into logs_dir as it runs and reporting
+    parsed progress lines as "sfm" ProgressEvents. progress_total is the denominator for
+    steps whose log has none (the mapper's registered image count). on_line sees every
+    log line too; an exception raised from it kills the process and propagates.
+    """
     logs_dir.mkdir(parents=True, exist_ok=True)
 
     stdout_path = logs_dir / f"{name}.stdout.log"
     stderr_path = logs_dir / f"{name}.stderr.log"
 
-    proc = subprocess.run(
+    def _on_line(stream: str, line: str) -> None:
+        if on_line is not None:
+            on_line(stream, line)
+        parsed = parse_colmap_line(line)
+        if parsed is not None:
+            current, total = parsed
+            emit_progress(ProgressEvent(
+                stage="sfm", step=name, current=current, total=total or progress_total,
+            ))
+
+    emit_progress(ProgressEvent(stage="sfm", step=name, current=0, total=progress_total))
+    proc = run_process(
         cmd,
-        cwd=str(cwd) if cwd is not None else None,
-        text=True,
-        capture_output=True,
-        check=False,
+        stdout_path=stdout_path,
+        stderr_path=stderr_path,
+        on_line=_on_line,
+        cwd=cwd,
     )
 
-    stdout_path.write_text(proc.stdout or "", encoding="utf-8")
-    stderr_path.write_text(proc.stderr or "", encoding="utf-8")
-
     if proc.returncode != 0:
         raise RuntimeError(
             f"COLMAP command failed: {quote_cmd(cmd)}\n"
@@ -167,4 +232,4 @@ def run_colmap_command(
         cmd=tuple(cmd),
         stdout_path=stdout_path,
         stderr_path=stderr_path,
-    )
\ No newline at end of file
+    )
@@ -1,8 +1,13 @@
 from __future__ import annotations
 
+import logging
+import sqlite3
+from dataclasses import replace
 from pathlib import Path
 import shutil
 
+from . import cache, pairs
+from ..runtime.subprocess_runner import LineCallback
 from .colmap_runner import (
     build_feature_extractor_cmd,
     build_mapper_cmd,
@@ -10,8 +15,13 @@ from .colmap_runner import (
     quote_cmd,
     run_colmap_command,
 )
+from ..sfm_qc.match_graph import MatchGraphPrediction, analyze_match_graph, predict_blue
+from ..sfm_qc.settings import SfmQcSettings
 from .models import SfmReq, SfmResult
 from .settings import SfmSettings
+from .watchdog import COLMAP_MAX_REG_TRIALS, MapperAborted, MapperWatchdog
+
+log = logging.getLogger(__name__)
 
 
 """def _prepare_workspace(output_dir: Path) -> tuple[Path, Path, Path]:
@@ -48,6 +58,117 @@ def _resolve_workspace(req: SfmReq) -> tuple[Path, Path, Path]:
     return database_path, sparse_dir, logs_dir
 
 
+def _resolve_cached_workspace(req: SfmReq) -> tuple[Path, Path, Path]:
+    """Like _resolve_workspace, but database.db is kept for sfm/cache.py to reconcile."""
+    database_path = req.database_path or (req.output_dir / "database.db")
+    sparse_dir = req.sparse_dir or (req.output_dir / "sparse")
+    logs_dir = req.logs_dir or (req.output_dir / "logs")
+
+    database_path.parent.mkdir(parents=True, exist_ok=True)
+    if sparse_dir.exists():
+        shutil.rmtree(sparse_dir)
+    sparse_dir.mkdir(parents=True, exist_ok=True)
+    logs_dir.mkdir(parents=True, exist_ok=True)
+
+    return database_path, sparse_dir, logs_dir
+
+
+def _run_step(
+    name: str,
+    cmd: list[str],
+    logs_dir: Path,
+    commands: list[str],
+    log_paths: list[Path],
+    progress_total: int | None = None,
+    on_line: LineCallback | None = None,
+) -> None:
+    commands.append(quote_cmd(cmd))
+    res = run_colmap_command(
+        name=name, cmd=cmd, logs_dir=logs_dir, progress_total=progress_total, on_line=on_line,
+    )
+    log_paths.extend([res.stdout_path, res.stderr_path])
+
+
+def _run_cached_features(
+    req: SfmReq,
+    settings: SfmSettings,
+    database_path: Path,
+    logs_dir: Path,
+    commands: list[str],
+    log_paths: list[Path],
+) -> list[str]:
+    """Bring the cached database up to date with the frames; returns the skipped steps."""
+    plan = cache.plan_cache(req, settings, database_path)
+    log.info(f"SfM cache plan: {cache.describe(plan)}")
+    state_path = cache.state_path_for(database_path)
+    skipped: list[str] = []
+
+    if plan.reset:
+        database_path.unlink(missing_ok=True)
+    else:
+        cache.remove_images(database_path, plan.remove)
+        if plan.clear_matches:
+            cache.clear_matches(database_path)
+
+    if plan.extract:
+        extract_req = req
+        camera_id = None
+        if not plan.reset:
+            list_path = database_path.with_suffix(".new_images.txt")
+            list_path.write_text("\n".join(plan.extract) + "\n", encoding="utf-8")
+            extract_req = replace(req, image_list_path=list_path)
+            if settings.single_camera:
+                camera_id = cache.existing_camera_id(database_path)
+        feature_cmd = build_feature_extractor_cmd(extract_req, settings, database_path, camera_id)
+        _run_step("feature_extractor", feature_cmd, logs_dir, commands, log_paths)
+    else:
+        skipped.append("feature_extractor")
+    cache.save_state(state_path, plan, extracted=True, matched=not plan.run_matcher)
+
+    pairs_path = _pairs_path_for(req, settings, database_path)
+    matcher_name, matcher_cmd = build_matcher_cmd(req, settings, database_path, pairs_path)
+    if plan.run_matcher:
+        if pairs_path is not None:
+            pairs.write_pairs_file(req, settings, pairs_path)
+        _run_step(matcher_name, matcher_cmd, logs_dir, commands, log_paths)
+        cache.save_state(state_path, plan, extracted=True, matched=True)
+    else:
+        skipped.append(matcher_name)
+
+    return skipped
+
+
+def _pairs_path_for(req: SfmReq, settings: SfmSettings, database_path: Path) -> Path | None:
+    """Where the planned pairs file goes when this request matches one (sfm/pairs.py), else None."""
+    if pairs.pair_mode(req, settings, len(cache.list_images(req))) is None:
+        return None
+    return database_path.with_suffix(".pairs.txt")
+
+
+def _precheck(
+    settings: SfmSettings, qc_settings: SfmQcSettings, database_path: Path
+) -> MatchGraphPrediction | None:
+    """Match-graph prediction for the matched database; None when it cannot be read."""
+    try:
+        stats = analyze_match_graph(
+            database_path,
+            min_inliers=settings.precheck_min_inliers,
+            min_pairs_per_image=settings.precheck_min_pairs_per_image,
+        )
+    except sqlite3.Error as exc:
+        log.warning(f"Match-graph pre-check skipped, cannot read {database_path}: {exc}")
+        return None
+    prediction = predict_blue(stats, qc_settings)
+    log.info(
+        f"Match graph: {stats.num_verified_pairs} verified pairs over {stats.num_images} images, "
+        f"{stats.num_components} components (largest {stats.largest_component}), "
+        f"median inliers {stats.median_inliers:.0f}, "
+        f"{stats.frac_well_connected:.0%} well connected; "
+        f"QC score <= {prediction.score_bound:.3f}"
+    )
+    return prediction
+
+
 def _find_sparse_models(sparse_dir: Path) -> list[Path]:
     if not sparse_dir.exists():
         return []
@@ -56,7 +177,15 @@ def _find_sparse_models(sparse_dir: Path) -> list[Path]:
     return sorted(models, key=lambda p: int(p.name))
 
 
-def run_sfm(req: SfmReq, settings: SfmSettings) -> SfmResult:
+def run_sfm(
+    req: SfmReq,
+    settings: SfmSettings,
+    qc_settings: SfmQcSettings | None = None,
+) -> SfmResult:
+    """
+    qc_settings enables the match-graph pre-check (settings.precheck) and the mapper
+    watchdog (settings.watchdog) against those QC targets.
+    """
     if not settings.enabled:
         return SfmResult(
             ok=False,
@@ -96,38 +225,107 @@ def run_sfm(req: SfmReq, settings: SfmSettings) -> SfmResult:
             error=f"Input mask_dir does not exist: {req.mask_dir}",
         )
 
-    database_path, sparse_dir, logs_dir = _resolve_workspace(req)
+    # streamed features (sfm/streaming.py) hand over through the cache state
+    use_cache = settings.cache or settings.stream_features
+    if use_cache:
+        database_path, sparse_dir, logs_dir = _resolve_cached_workspace(req)
+    else:
+        database_path, sparse_dir, logs_dir = _resolve_workspace(req)
 
     commands: list[str] = []
     log_paths: list[Path] = []
+    cached_steps: list[str] = []
 
     try:
-        feature_cmd = build_feature_extractor_cmd(req, settings, database_path)
-        commands.append(quote_cmd(feature_cmd))
-        res = run_colmap_command(
-            name="feature_extractor",
-            cmd=feature_cmd,
-            logs_dir=logs_dir,
-        )
-        log_paths.extend([res.stdout_path, res.stderr_path])
-
-        matcher_name, matcher_cmd = build_matcher_cmd(req, settings, database_path)
-        commands.append(quote_cmd(matcher_cmd))
-        res = run_colmap_command(
-            name=matcher_name,
-            cmd=matcher_cmd,
-            logs_dir=logs_dir,
-        )
-        log_paths.extend([res.stdout_path, res.stderr_path])
-
-        mapper_cmd = build_mapper_cmd(req, settings, database_path, sparse_dir)
-        commands.append(quote_cmd(mapper_cmd))
-        res = run_colmap_command(
-            name="mapper",
-            cmd=mapper_cmd,
-            logs_dir=logs_dir,
-        )
-        log_paths.extend([res.stdout_path, res.stderr_path])
+        if use_cache:
+            cached_steps = _run_cached_features(
+                req, settings, database_path, logs_dir, commands, log_paths
+            )
+        else:
+            feature_cmd = build_feature_extractor_cmd(req, settings, database_path)
+            _run_step("feature_extractor", feature_cmd, logs_dir, commands, log_paths)
+
+            pairs_path = _pairs_path_for(req, settings, database_path)
+            if pairs_path is not None:
+                pairs.write_pairs_file(req, settings, pairs_path)
+            matcher_name, matcher_cmd = build_matcher_cmd(req, settings, database_path, pairs_path)
+            _run_step(matcher_name, matcher_cmd, logs_dir, commands, log_paths)
+
+        prediction: MatchGraphPrediction | None = None
+        if settings.precheck and qc_settings is not None:
+            prediction = _precheck(settings, qc_settings, database_path)
+        score_bound = prediction.score_bound if prediction is not None else None
+        if prediction is not None and not prediction.blue_reachable:
+            reason = (
+                f"Mapper skipped by match-graph pre-check: best reachable QC score "
+                f"{prediction.score_bound:.3f} < blue_threshold {qc_settings.blue_threshold} "
+                f"(largest connected component {prediction.stats.largest_component}"
+                f"/{prediction.stats.num_images} images)"
+            )
+            log.warning(reason)
+            return SfmResult(
+                ok=False,
+                job_id=req.job_id,
+                input_mode=req.input_mode,
+                image_dir=req.image_dir,
+                output_dir=req.output_dir,
+                database_path=database_path,
+                sparse_dir=sparse_dir,
+                best_model_dir=None,
+                commands=tuple(commands),
+                log_paths=tuple(log_paths),
+                num_sparse_models=0,
+                error=reason,
+                cached_steps=tuple(cached_steps),
+                aborted=reason,
+                precheck_score_bound=score_bound,
+            )
+
+        num_images = len(cache.list_images(req))
+        watchdog: MapperWatchdog | None = None
+        snapshot_dir: Path | None = None
+        if settings.watchdog and qc_settings is not None:
+            snapshot_dir = sparse_dir.parent / "snapshots"
+            shutil.rmtree(snapshot_dir, ignore_errors=True)
+            snapshot_dir.mkdir(parents=True)
+            watchdog = MapperWatchdog(
+                num_images=num_images,
+                qc_settings=qc_settings,
+                max_reg_trials=settings.mapper_max_reg_trials or COLMAP_MAX_REG_TRIALS,
+                snapshot_dir=snapshot_dir,
+                min_registered=settings.watchdog_min_registered,
+                optimism=settings.watchdog_optimism,
+            )
+
+        mapper_cmd = build_mapper_cmd(req, settings, database_path, sparse_dir, snapshot_dir)
+        try:
+            _run_step(
+                "mapper", mapper_cmd, logs_dir, commands, log_paths,
+                progress_total=num_images,
+                on_line=watchdog.on_line if watchdog is not None else None,
+            )
+        except MapperAborted as exc:
+            log.warning(str(exc))
+            return SfmResult(
+                ok=False,
+                job_id=req.job_id,
+                input_mode=req.input_mode,
+                image_dir=req.image_dir,
+                output_dir=req.output_dir,
+                database_path=database_path,
+                sparse_dir=sparse_dir,
+                best_model_dir=None,
+                commands=tuple(commands),
+                log_paths=tuple(log_paths),
+                num_sparse_models=0,
+                error=str(exc),
+                cached_steps=tuple(cached_steps),
+                aborted=str(exc),
+                precheck_score_bound=score_bound,
+            )
+        finally:
+            if snapshot_dir is not None:
+                shutil.rmtree(snapshot_dir, ignore_errors=True)
 
         models = _find_sparse_models(sparse_dir)
         best_model_dir = models[0] if models else None
@@ -145,6 +343,8 @@ def run_sfm(req: SfmReq, settings: SfmSettings) -> SfmResult:
             log_paths=tuple(log_paths),
             num_sparse_models=len(models),
             error=None,
+            cached_steps=tuple(cached_steps),
+            precheck_score_bound=score_bound,
         )
 
     except Exception as exc:
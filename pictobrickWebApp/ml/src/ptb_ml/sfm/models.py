@@ -54,4 +54,11 @@ class SfmResult:
     log_paths: tuple[Path, ...] = field(default_factory=tuple)
 
     num_sparse_models: int = 0
-    error: str | None = None
\ No newline at end of file
+    error: str | None = None
+    # COLMAP steps skipped because the cached database was still valid
+    cached_steps: tuple[str, ...] = field(default_factory=tuple)
+    # set when the match-graph pre-check skipped the mapper or the mapper watchdog stopped
+    # it, because the reconstruction could not reach blue
+    aborted: str | None = None
+    # upper bound on the SfM QC score from the match-graph pre-check, if it ran
+    precheck_score_bound: float | None = None
\ No newline at end of file
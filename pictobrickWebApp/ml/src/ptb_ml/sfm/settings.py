@@ -18,18 +18,97 @@ class SfmSettings:
     use_gpu: bool = True
     gpu_index: str = "-1"  # "-1" lets COLMAP choose
 
+    # "full" = frames/, "work" = frames_work/ (see PreprocessSettings.work_max_side)
+    frame_tier: str = "full"
+
     max_image_size: int = 3200
     max_num_features: int = 8192
     max_num_matches: int = 32768
 
-    # Sequential matching knobs
+    # Sequential matching knobs (also used by unordered_matching="sequence")
     sequential_overlap: int = 10
     sequential_quadratic_overlap: bool = True
     sequential_loop_detection: bool = False
     sequential_loop_detection_period: int = 10
     sequential_loop_detection_num_images: int = 50
 
+    # Unordered (image_set) matching: "exhaustive" matches all n^2/2 pairs, "retrieval"
+    # only each image's retrieval_top_k most similar images by phash + colour histogram
+    # (see sfm/pairs.py), "sequence" orders the images into a similarity tour and matches
+    # it like a video with the sequential_* overlap knobs, "auto" switches to retrieval
+    # above retrieval_min_images images
+    unordered_matching: str = "auto"
+    retrieval_top_k: int = 20
+    retrieval_min_images: int = 100
+    retrieval_phash_weight: float = 0.5  # rest of the score is colour histogram similarity
+
+    # CPU threads for feature extraction, matching and the mapper; 0 = one per core.
+    # run_pipeline sets a share of the cores when SfM runs alongside the priors
+    num_threads: int = 0
+
+    # Keep database.db between runs and only extract/match what changed (see sfm/cache.py)
+    cache: bool = False
+
+    # Extract features in chunks while preprocess is still writing frames (see
+    # sfm/streaming.py); run_pipeline falls back to a single extraction pass when masking
+    # is enabled or SfM reads the work tier. Implies the cached database path in run_sfm.
+    stream_features: bool = False
+    stream_chunk_size: int = 32
+
+    # Match-graph pre-check (see sfm_qc/match_graph.py): skip the mapper when the verified
+    # two-view geometries in database.db already rule out a blue QC score; only active when
+    # run_sfm gets SfmQcSettings
+    precheck: bool = True
+    precheck_min_inliers: int = 15        # inliers for a verified pair to count as an edge
+    precheck_min_pairs_per_image: int = 2  # verified pairs for an image to be well connected
+
+    # Mapper watchdog (see sfm/watchdog.py): stop the mapper once the SfM QC blue score is
+    # out of reach; only active when run_sfm gets SfmQcSettings
+    watchdog: bool = False
+    # The watchdog only observes: the mapper reconstructs the same with it on or off. Each
+    # snapshot writes the whole model to disk, though, so a low frequency adds mapper I/O.
+    watchdog_snapshot_freq: int = 10      # registered images between model snapshots
+    watchdog_min_registered: int = 10     # snapshot size before points / error are projected
+    watchdog_optimism: float = 1.5        # slack on projected points and reprojection error
+
     # Mapper / BA knobs
     mapper_ba_use_gpu: bool = False
     mapper_ba_global_max_num_iterations: int | None = None
-    mapper_ba_global_function_tolerance: float | None = None
\ No newline at end of file
+    # None = COLMAP's default (3); the watchdog reads registration failures against it
+    mapper_max_reg_trials: int | None = None
+    mapper_ba_global_function_tolerance: float | None = None
+
+    def __post_init__(self) -> None:
+        if self.frame_tier not in {"full", "work"}:
+            raise ValueError(
+                f"frame_tier must be one of full|work, got '{self.frame_tier}'"
+            )
+        if self.unordered_matching not in {"exhaustive", "retrieval", "sequence", "auto"}:
+            raise ValueError(
+                "unordered_matching must be one of exhaustive|retrieval|sequence|auto, "
+                f"got '{self.unordered_matching}'"
+            )
+        if self.retrieval_top_k < 1:
+            raise ValueError(f"retrieval_top_k must be >= 1, got {self.retrieval_top_k}")
+        if self.retrieval_min_images < 0:
+            raise ValueError(f"retrieval_min_images must be >= 0, got {self.retrieval_min_images}")
+        if self.stream_chunk_size < 1:
+            raise ValueError(f"stream_chunk_size must be >= 1, got {self.stream_chunk_size}")
+        if self.num_threads < 0:
+            raise ValueError(f"num_threads must be >= 0, got {self.num_threads}")
+        if self.precheck_min_inliers < 0:
+            raise ValueError(f"precheck_min_inliers must be >= 0, got {self.precheck_min_inliers}")
+        if self.precheck_min_pairs_per_image < 1:
+            raise ValueError(
+                f"precheck_min_pairs_per_image must be >= 1, got {self.precheck_min_pairs_per_image}"
+            )
+        if self.watchdog_snapshot_freq < 1:
+            raise ValueError(f"watchdog_snapshot_freq must be >= 1, got {self.watchdog_snapshot_freq}")
+        if self.watchdog_optimism < 1.0:
+            raise ValueError(f"watchdog_optimism must be >= 1, got {self.watchdog_optimism}")
+        if self.mapper_max_reg_trials is not None and self.mapper_max_reg_trials < 1:
+            raise ValueError(f"mapper_max_reg_trials must be >= 1, got {self.mapper_max_reg_trials}")
+        if not 0.0 <= self.retrieval_phash_weight <= 1.0:
+            raise ValueError(
+                f"retrieval_phash_weight must be in [0, 1], got {self.retrieval_phash_weight}"
+            )
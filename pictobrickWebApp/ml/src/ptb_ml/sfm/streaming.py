@@ -0,0 +1,178 @@
+"""
+Streaming feature extraction (SfmSettings.stream_features): run COLMAP's feature_extractor
+on frames while preprocess is still decoding, scoring and deduping the rest of the video.
+
+Preprocess reports each batch of frames as it writes them (PreprocessReq.on_frames). They
+are queued in chunks of stream_chunk_size and a background thread runs
+`feature_extractor --image_list_path <chunk>` per chunk against the same database.db,
+later chunks joining the first chunk's camera when single_camera is set.
+
+finish() records what was extracted in the SfM cache state (sfm/cache.py), so run_sfm
+takes the cached path and only reconciles the database with the final frame set before
+matching and mapping. Frames whose content changed after they were streamed are
+re-extracted, frames no longer present are removed, and frames never streamed are
+extracted there. If a chunk fails, the state is dropped and run_sfm extracts everything
+as usual.
+
+Only the full-resolution, unmasked frames can be streamed. Masks and the work tier are
+written after the whole set has been filtered, so run_pipeline falls back to the
+normal path for those.
+"""
+from __future__ import annotations
+
+import contextvars
+import logging
+import queue
+import threading
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from typing import Iterable, Optional
+
+from ..runtime import cpu_lease
+from . import cache
+from .colmap_runner import build_feature_extractor_cmd, quote_cmd, run_colmap_command
+from .models import SfmReq
+from .settings import SfmSettings
+
+log = logging.getLogger(__name__)
+
+
+@dataclass
+class StreamingIngestResult:
+    ok: bool
+    extracted: int = 0
+    chunks: int = 0
+    commands: list[str] = field(default_factory=list)
+    log_paths: list[Path] = field(default_factory=list)
+    error: Optional[str] = None
+
+
+class StreamingFeatureExtractor:
+    def __init__(
+        self,
+        *,
+        job_id: str,
+        image_dir: Path,
+        database_path: Path,
+        logs_dir: Path,
+        settings: SfmSettings,
+    ) -> None:
+        # extraction does not depend on the input mode; the final SfmReq sets it
+        self._req = SfmReq(
+            job_id=job_id,
+            image_dir=image_dir,
+            output_dir=database_path.parent,
+            input_mode="sequential",
+            database_path=database_path,
+            logs_dir=logs_dir,
+        )
+        self.database_path = database_path
+        self.logs_dir = logs_dir
+        self.settings = settings
+
+        self._pending: list[str] = []
+        self._queue: queue.Queue[Optional[list[str]]] = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._hashes: dict[str, str] = {}
+        self._error: Optional[BaseException] = None
+        self._result = StreamingIngestResult(ok=True)
+
+    def add(self, frames: Iterable[Path]) -> None:
+        """PreprocessReq.on_frames hook: queue newly written frames for extraction."""
+        self._pending.extend(Path(f).name for f in frames)
+        while len(self._pending) >= self.settings.stream_chunk_size:
+            chunk = self._pending[:self.settings.stream_chunk_size]
+            del self._pending[:self.settings.stream_chunk_size]
+            self._submit(chunk)
+
+    def finish(self) -> StreamingIngestResult:
+        """Extract the last partial chunk, wait for the worker and hand over to run_sfm."""
+        if self._pending:
+            self._submit(self._pending)
+            self._pending = []
+        self._stop()
+
+        res = self._result
+        state_path = cache.state_path_for(self.database_path)
+        if self._error is not None:
+            res.ok = False
+            res.error = str(self._error)
+            log.warning(f"Streaming feature extraction failed, run_sfm will extract all frames: {self._error}")
+            state_path.unlink(missing_ok=True)
+            return res
+        if self._thread is None:
+            return res
+
+        plan = cache.CachePlan(
+            reset=False, extract=(), remove=(), clear_matches=False, run_matcher=True,
+            extraction_key=cache.extraction_key(self._req, self.settings),
+            matching_key="",  # nothing matched yet
+            hashes=dict(self._hashes),
+        )
+        cache.save_state(state_path, plan, extracted=True, matched=False)
+        log.info(f"Streamed features for {res.extracted} frames in {res.chunks} chunks")
+        return res
+
+    def close(self) -> None:
+        """Stop without handing over, e.g. when preprocess failed."""
+        self._pending = []
+        self._stop()
+
+    def _submit(self, chunk: list[str]) -> None:
+        if self._thread is None:
+            self._start()
+        self._queue.put(list(chunk))
+
+    def _start(self) -> None:
+        # a fresh database: the cache state written by finish() describes exactly this run
+        self.database_path.parent.mkdir(parents=True, exist_ok=True)
+        self.database_path.unlink(missing_ok=True)
+        cache.state_path_for(self.database_path).unlink(missing_ok=True)
+        self.logs_dir.mkdir(parents=True, exist_ok=True)
+
+        ctx = contextvars.copy_context()  # progress sink of the job
+        self._thread = threading.Thread(
+            target=ctx.run, args=(self._worker,), name="sfm-stream", daemon=True
+        )
+        self._thread.start()
+
+    def _stop(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    def _worker(self) -> None:
+        with cpu_lease("sfm_features", self._req.job_id):
+            while True:
+                chunk = self._queue.get()
+                if chunk is None:
+                    return
+                if self._error is not None:
+                    continue  # drain the queue after a failure
+                try:
+                    self._extract(chunk)
+                except Exception as exc:
+                    self._error = exc
+
+    def _extract(self, names: list[str]) -> None:
+        res = self._result
+        list_path = self.database_path.with_suffix(f".chunk_{res.chunks:04d}.txt")
+        list_path.write_text("\n".join(names) + "\n", encoding="utf-8")
+        req = replace(self._req, image_list_path=list_path)
+        # hashed before extraction: a frame rewritten meanwhile no longer matches and is redone
+        hashes = cache.hash_images(req, names)
+
+        camera_id = None
+        if res.chunks and self.settings.single_camera:
+            camera_id = cache.existing_camera_id(self.database_path)
+        cmd = build_feature_extractor_cmd(req, self.settings, self.database_path, camera_id)
+        res.commands.append(quote_cmd(cmd))
+        out = run_colmap_command(
+            name=f"feature_extractor.chunk_{res.chunks:04d}", cmd=cmd, logs_dir=self.logs_dir,
+        )
+        res.log_paths.extend([out.stdout_path, out.stderr_path])
+        list_path.unlink(missing_ok=True)
+
+        self._hashes.update(hashes)
+        res.chunks += 1
+        res.extracted += len(names)
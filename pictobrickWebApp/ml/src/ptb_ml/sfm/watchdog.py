@@ -0,0 +1,159 @@
+"""
+Mapper watchdog (SfmSettings.watchdog): stop `colmap mapper` early once the reconstruction
+can no longer reach SfmQcSettings.blue_threshold, so the pipeline goes down the orange
+route without waiting for the mapper to finish.
+
+While the mapper runs, the watchdog keeps an optimistic projection of the final QC metrics
+and scores it with the same compute_score the QC stage uses:
+
+    registered images  upper bound from the mapper log: every image that failed
+                       registration max_reg_trials times (SfmSettings.mapper_max_reg_trials,
+                       else COLMAP's default) is out of the model for good
+    points / error     from the newest model snapshot (--Mapper.snapshot_path), once it
+                       has min_registered images: points per registered image scaled up to
+                       the registered bound, times `optimism`; reprojection error divided
+                       by `optimism`. Before that, both are assumed perfect.
+
+Only the first reconstruction is watched. COLMAP writes sparse/N when the mapper exits, so
+aborting during a later model would also throw away the earlier ones; once a second
+initialization starts, the watchdog stands down.
+
+The watchdog never changes mapper options; it only adds the snapshot flags.
+"""
+from __future__ import annotations
+
+import logging
+import re
+import struct
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+from ..sfm_qc.models import SfmQcMetrics
+from ..sfm_qc.scoring import compute_score
+from ..sfm_qc.settings import SfmQcSettings
+from .colmap_model import ModelStats, read_model_stats
+
+log = logging.getLogger(__name__)
+
+_REGISTERING = re.compile(r"Registering image #(\d+)")
+_REGISTER_FAILED = "Could not register"
+_INITIALIZING = "Initializing with image pair"
+# IncrementalMapperOptions::max_reg_trials when --Mapper.max_reg_trials is not passed
+COLMAP_MAX_REG_TRIALS = 3
+
+
+class MapperAborted(RuntimeError):
+    """Raised from the mapper's log callback to stop it; the message is the reason."""
+
+
+class MapperWatchdog:
+    def __init__(
+        self,
+        *,
+        num_images: int,
+        qc_settings: SfmQcSettings,
+        max_reg_trials: int = COLMAP_MAX_REG_TRIALS,
+        snapshot_dir: Optional[Path] = None,
+        min_registered: int = 10,
+        optimism: float = 1.5,
+        poll_s: float = 2.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.num_images = num_images
+        self.qc_settings = qc_settings
+        self.max_reg_trials = max_reg_trials
+        self.snapshot_dir = snapshot_dir
+        self.min_registered = min_registered
+        self.optimism = optimism
+        self.poll_s = poll_s
+        self._clock = clock
+
+        self._failures: dict[int, int] = {}
+        self._exhausted: set[int] = set()
+        self._pending: Optional[int] = None   # image whose registration attempt is running
+        self._registrations = 0
+        self._standing_down = False
+        self._last_poll = clock()
+        self._snapshot_name: Optional[str] = None
+        self.snapshot: Optional[ModelStats] = None
+        self.last_bound: Optional[float] = None
+
+    @property
+    def registered_bound(self) -> int:
+        return self.num_images - len(self._exhausted)
+
+    def on_line(self, _stream: str, line: str) -> None:
+        """Log line hook for run_colmap_command; raises MapperAborted to stop the mapper."""
+        if self._standing_down:
+            return
+
+        if _INITIALIZING in line and self._registrations:
+            log.info("Mapper watchdog: first reconstruction finished, standing down")
+            self._standing_down = True
+            return
+
+        m = _REGISTERING.search(line)
+        if m:
+            self._registrations += 1
+            self._pending = int(m.group(1))
+        elif _REGISTER_FAILED in line and self._pending is not None:
+            n = self._failures.get(self._pending, 0) + 1
+            self._failures[self._pending] = n
+            if n >= self.max_reg_trials:
+                self._exhausted.add(self._pending)
+                self._check()
+            self._pending = None
+
+        if self._clock() - self._last_poll >= self.poll_s:
+            self._last_poll = self._clock()
+            if self._read_snapshot():
+                self._check()
+
+    def projected_metrics(self) -> SfmQcMetrics:
+        """Best final metrics still possible given what the mapper has shown so far."""
+        registered = self.registered_bound
+        snap = self.snapshot
+        if snap is not None and snap.registered_images >= self.min_registered:
+            points = snap.points3d / snap.registered_images * registered * self.optimism
+            error = snap.reprojection_error / self.optimism
+        else:
+            points = float(self.qc_settings.target_points3d)
+            error = 0.0
+        return SfmQcMetrics(
+            registered_images=registered,
+            points3d=int(points),
+            reprojection_error=error,
+            pct_registered=registered / self.num_images if self.num_images else 0.0,
+        )
+
+    def _check(self) -> None:
+        metrics = self.projected_metrics()
+        bound = compute_score(metrics, self.qc_settings)
+        self.last_bound = bound
+        if bound < self.qc_settings.blue_threshold:
+            raise MapperAborted(
+                f"Mapper aborted by watchdog: best reachable QC score {bound:.3f} < "
+                f"blue_threshold {self.qc_settings.blue_threshold} "
+                f"(registered <= {metrics.registered_images}, points ~{metrics.points3d}, "
+                f"reprojection error >= {metrics.reprojection_error:.2f}px)"
+            )
+
+    def _read_snapshot(self) -> bool:
+        """Load the newest complete snapshot; True if a new one was read."""
+        if self.snapshot_dir is None or not self.snapshot_dir.exists():
+            return False
+        # snapshot dirs are named by timestamp
+        snaps = sorted(
+            (p for p in self.snapshot_dir.iterdir() if p.is_dir()),
+            key=lambda p: (len(p.name), p.name),
+        )
+        if not snaps or snaps[-1].name == self._snapshot_name:
+            return False
+        try:
+            stats = read_model_stats(snaps[-1])
+        except (OSError, ValueError, IndexError, struct.error):
+            return False  # still being written, try again on the next poll
+        self._snapshot_name = snaps[-1].name
+        self.snapshot = stats
+        return True
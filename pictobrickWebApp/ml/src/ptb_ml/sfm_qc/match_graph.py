@@ -0,0 +1,142 @@
+"""
+Match-graph pre-check: predict from COLMAP's database.db, after matching and before the
+mapper, whether the reconstruction can still reach the blue route.
+
+Verified two-view geometries (two_view_geometries rows with at least min_inliers inliers
+and a usable config) form a graph over the images. A single sparse model only contains
+images connected in that graph, and every 3D point is triangulated from at least one
+verified correspondence, so for the largest connected component
+
+    registered images <= component size
+    3D points         <= inlier correspondences inside the component
+
+Scoring those upper bounds with compute_score (reprojection error assumed perfect) gives
+an upper bound on the QC score. When even that is below blue_threshold the mapper cannot
+produce a blue model and can be skipped.
+"""
+from __future__ import annotations
+
+import sqlite3
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+
+from ..sfm.cache import MAX_IMAGE_ID
+from .models import SfmQcMetrics
+from .scoring import compute_score
+from .settings import SfmQcSettings
+
+# TwoViewGeometry::ConfigurationType values that carry usable inliers
+# (0 undefined, 1 degenerate and 7 watermark are left out)
+_VERIFIED_CONFIGS = (2, 3, 4, 5, 6, 8)
+
+
+@dataclass(frozen=True)
+class MatchGraphStats:
+    num_images: int
+    num_verified_pairs: int
+    median_inliers: float
+    num_components: int              # isolated images count as components
+    largest_component: int
+    largest_component_inliers: int   # sum of pair inliers inside the largest component
+    frac_well_connected: float       # images with >= min_pairs_per_image verified pairs
+
+
+@dataclass(frozen=True)
+class MatchGraphPrediction:
+    stats: MatchGraphStats
+    score_bound: float               # upper bound on the SfM QC score
+    blue_reachable: bool
+
+
+def decode_pair_ids(pair_ids: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """COLMAP pair_id -> (image_id1, image_id2), image_id1 < image_id2."""
+    pair_ids = np.asarray(pair_ids, dtype=np.int64)
+    id2 = pair_ids % MAX_IMAGE_ID
+    id1 = (pair_ids - id2) // MAX_IMAGE_ID
+    return id1, id2
+
+
+def _components(n: int, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Connected component label per node (union-find with path halving)."""
+    parent = np.arange(n)
+
+    def find(x: int) -> int:
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for x, y in zip(a.tolist(), b.tolist()):
+        rx, ry = find(x), find(y)
+        if rx != ry:
+            parent[max(rx, ry)] = min(rx, ry)
+    return np.array([find(i) for i in range(n)], dtype=np.int64)
+
+
+def analyze_match_graph(
+    database_path: Path,
+    *,
+    min_inliers: int = 15,
+    min_pairs_per_image: int = 2,
+) -> MatchGraphStats:
+    with sqlite3.connect(f"file:{database_path}?mode=ro", uri=True) as con:
+        image_ids = np.array(
+            [r[0] for r in con.execute("SELECT image_id FROM images ORDER BY image_id")],
+            dtype=np.int64,
+        )
+        placeholders = ",".join("?" * len(_VERIFIED_CONFIGS))
+        rows = con.execute(
+            f"SELECT pair_id, rows FROM two_view_geometries "
+            f"WHERE rows >= ? AND config IN ({placeholders})",
+            (min_inliers, *_VERIFIED_CONFIGS),
+        ).fetchall()
+
+    n = len(image_ids)
+    pairs = np.array(rows, dtype=np.int64).reshape(-1, 2)
+    id1, id2 = decode_pair_ids(pairs[:, 0])
+    inliers = pairs[:, 1]
+
+    # image ids -> dense 0..n-1; pairs referring to deleted images are dropped
+    pos1 = np.searchsorted(image_ids, id1)
+    pos2 = np.searchsorted(image_ids, id2)
+    known = (pos1 < n) & (pos2 < n)
+    known[known] &= (image_ids[pos1[known]] == id1[known]) & (image_ids[pos2[known]] == id2[known])
+    a, b, inliers = pos1[known], pos2[known], inliers[known]
+
+    labels = _components(n, a, b)
+    if n:
+        sizes = np.bincount(labels, minlength=n)
+        biggest = int(np.argmax(sizes))
+        largest = int(sizes[biggest])
+        largest_inliers = int(inliers[labels[a] == biggest].sum())
+        degree = np.bincount(np.concatenate([a, b]), minlength=n)
+        well_connected = float(np.mean(degree >= min_pairs_per_image))
+    else:
+        largest, largest_inliers, well_connected = 0, 0, 0.0
+
+    return MatchGraphStats(
+        num_images=n,
+        num_verified_pairs=int(len(a)),
+        median_inliers=float(np.median(inliers)) if len(inliers) else 0.0,
+        num_components=int(len(np.unique(labels))),
+        largest_component=largest,
+        largest_component_inliers=largest_inliers,
+        frac_well_connected=well_connected,
+    )
+
+
+def predict_blue(stats: MatchGraphStats, settings: SfmQcSettings) -> MatchGraphPrediction:
+    metrics = SfmQcMetrics(
+        registered_images=stats.largest_component,
+        points3d=stats.largest_component_inliers,
+        reprojection_error=0.0,
+        pct_registered=stats.largest_component / stats.num_images if stats.num_images else 0.0,
+    )
+    bound = compute_score(metrics, settings)
+    return MatchGraphPrediction(
+        stats=stats,
+        score_bound=bound,
+        blue_reachable=bound >= settings.blue_threshold,
+    )
@@ -10,11 +10,12 @@ PipelinePath = Literal["blue", "orange"]
 @dataclass(frozen=True)
 class SfmQcReq:
     job_id: str
-    sparse_model_dir: Path  # path to sparse/0
+    sparse_model_dir: Path | None  # path to sparse/0, None when SfM produced no model
     num_input_images: int   # total frames passed to SfM
 
     def __post_init__(self) -> None:
-        object.__setattr__(self, "sparse_model_dir", Path(self.sparse_model_dir))
+        if self.sparse_model_dir is not None:
+            object.__setattr__(self, "sparse_model_dir", Path(self.sparse_model_dir))
 
 
 @dataclass(frozen=True)
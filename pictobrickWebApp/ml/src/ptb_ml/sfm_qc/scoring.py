@@ -0,0 +1,68 @@
+"""
+QC scoring, kept free of the model reader so the SfM stage (match-graph pre-check, mapper
+watchdog) can score projected metrics without an import cycle.
+"""
+from __future__ import annotations
+
+from .models import SfmQcMetrics
+from .settings import SfmQcSettings
+
+
+def _score_metric(
+    value: float,
+    minimum: float,
+    target: float,
+    lower_is_better: bool = False,
+) -> float:
+    """
+    Returns a 0.0-1.0 score for a single metric.
+    Below minimum → 0.0. At or beyond target → 1.0. Linear in between.
+    """
+    if lower_is_better:
+        # Flip so minimum/target logic still applies
+        value = -value
+        minimum = -minimum
+        target = -target
+
+    if value <= minimum:
+        return 0.0
+    if value >= target:
+        return 1.0
+    return (value - minimum) / (target - minimum)
+
+
+def compute_score(
+    metrics: SfmQcMetrics,
+    settings: SfmQcSettings,
+) -> float:
+    """Weighted 0.0-1.0 QC score; also used by the SfM mapper watchdog on projected metrics."""
+    # Hard floor checks — any single failure forces score to 0.0
+    if metrics.registered_images < settings.min_registered_images:
+        return 0.0
+    if metrics.points3d < settings.min_points3d:
+        return 0.0
+    if metrics.reprojection_error > settings.max_reprojection_error:
+        return 0.0
+
+    s_images = _score_metric(
+        metrics.registered_images,
+        minimum=settings.min_registered_images,
+        target=settings.target_registered_images,
+    )
+    s_points = _score_metric(
+        metrics.points3d,
+        minimum=settings.min_points3d,
+        target=settings.target_points3d,
+    )
+    s_reproj = _score_metric(
+        metrics.reprojection_error,
+        minimum=settings.max_reprojection_error,
+        target=settings.target_reprojection_error,
+        lower_is_better=True,
+    )
+
+    return (
+        s_images * settings.weight_registered_images
+        + s_points * settings.weight_points3d
+        + s_reproj * settings.weight_reprojection_error
+    )
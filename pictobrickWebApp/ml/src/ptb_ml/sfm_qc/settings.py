@@ -22,8 +22,6 @@ class SfmQcSettings:
     # Score threshold for Blue vs Orange routing
     blue_threshold: float = 0.5
 
-    colmap_bin: str = "colmap"
-
     def __post_init__(self) -> None:
         weights = (
             self.weight_registered_images
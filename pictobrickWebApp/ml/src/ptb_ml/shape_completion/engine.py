@@ -286,7 +286,7 @@ def run_shape_completion(
     poses:dict[str, np.ndarray] = {}
     if req.sparse_model_dir is not None:
         log.info("Reading SfM camera poses...")
-        poses = read_colmap_poses(req.sparse_model_dir, req.colmap_bin)
+        poses = read_colmap_poses(req.sparse_model_dir)
         log.info(f"Loaded {len(poses)} poses — "
                  f"{'pose-guided' if poses else 'identity fallback'} integration")
 
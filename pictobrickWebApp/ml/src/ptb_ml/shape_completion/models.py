@@ -13,7 +13,6 @@ class ShapeCompletionReq:
     segmentation_dir: Path
     output_dir: Path
     sparse_model_dir: Path | None = None  # None = Orange path, use identity
-    colmap_bin: str = "colmap"
 
 
     def __post_init__(self) -> None:
@@ -0,0 +1,16 @@
+import sys
+from pathlib import Path
+from typing import Callable
+
+import pytest
+
+
+@pytest.fixture
+def fake_colmap(tmp_path: Path) -> Callable[[str], Path]:
+    """Writes a Python script body as an executable `colmap` in tmp_path; use as SfmSettings.colmap_bin."""
+    def make(script: str) -> Path:
+        colmap = tmp_path / "colmap"
+        colmap.write_text(f"#!{sys.executable}\n" + script)
+        colmap.chmod(0o755)
+        return colmap
+    return make
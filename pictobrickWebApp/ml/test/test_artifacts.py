@@ -0,0 +1,42 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from ptb_ml.preprocess.artifacts import ArtifactWriteError, ArtifactWriter
+
+
+@pytest.mark.parametrize("workers", [0, 3])
+def test_writer_roundtrips_pngs(tmp_path: Path, workers: int):
+    rng = np.random.default_rng(0)
+    arrays = {
+        tmp_path / "a" / f"{i}.png": rng.integers(0, 255, (40, 60), dtype=np.uint8) for i in range(10)
+    }
+    depth = (rng.random((20, 30)) * 65535).astype(np.uint16)
+
+    with ArtifactWriter(workers=workers, max_pending=2, fsync=True) as writer:
+        for p, a in arrays.items():
+            writer.write_png(a, p, mode="L", compress_level=1)
+        writer.write_png(depth, tmp_path / "b" / "depth.png", compress_level=9)
+
+    for p, a in arrays.items():
+        assert np.array_equal(np.asarray(Image.open(p)), a)
+    assert np.array_equal(np.asarray(Image.open(tmp_path / "b" / "depth.png")), depth)
+
+
+def test_writer_raises_write_errors_on_flush(tmp_path: Path):
+    blocker = tmp_path / "not_a_dir"
+    blocker.write_text("x")
+    writer = ArtifactWriter(workers=2)
+    writer.write_png(np.zeros((4, 4), np.uint8), tmp_path / "ok.png", mode="L")
+    # the parent exists as a file, so only the background open() fails
+    writer._dirs.add(blocker)
+    writer.write_png(np.zeros((4, 4), np.uint8), blocker / "bad.png", mode="L")
+    with pytest.raises(ArtifactWriteError):
+        writer.close()
+    assert (tmp_path / "ok.png").exists()
+
+    # a failed write also stops later submissions
+    with pytest.raises(ArtifactWriteError):
+        writer.write_png(np.zeros((4, 4), np.uint8), tmp_path / "later.png", mode="L")
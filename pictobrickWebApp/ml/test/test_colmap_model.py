@@ -0,0 +1,103 @@
+import struct
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from ptb_ml.sfm.colmap_model import quat_to_rotation_matrices, read_model
+from ptb_ml.sfm_qc.analyzer import run_model_analyzer
+from ptb_ml.shape_completion.pose_reader import read_colmap_poses
+
+
+def _write_model(root: Path, rng: np.random.Generator) -> dict:
+    """Write a small binary model in COLMAP's layout and return what went into it."""
+    root.mkdir(parents=True)
+    cams = {1: (0, 640, 480, [500.0, 320.0, 240.0]),          # SIMPLE_PINHOLE
+            2: (4, 800, 600, [700.0, 710.0, 400.0, 300.0, 0.1, -0.01, 0.0, 0.0])}  # OPENCV
+    with (root / "cameras.bin").open("wb") as f:
+        f.write(struct.pack("<Q", len(cams)))
+        for cid, (model, w, h, params) in cams.items():
+            f.write(struct.pack("<iiQQ", cid, model, w, h))
+            f.write(struct.pack(f"<{len(params)}d", *params))
+
+    q = rng.normal(size=(3, 4))
+    q /= np.linalg.norm(q, axis=1, keepdims=True)
+    t = rng.normal(size=(3, 3))
+    names = ["frame_000000.jpg", "frame_000001.jpg", "frame_000002.jpg"]
+    n2d = [5, 0, 7]
+    with (root / "images.bin").open("wb") as f:
+        f.write(struct.pack("<Q", len(names)))
+        for i, name in enumerate(names):
+            f.write(struct.pack("<i4d3di", i + 1, *q[i], *t[i], 1 + i % 2))
+            f.write(name.encode() + b"\0")
+            f.write(struct.pack("<Q", n2d[i]))
+            for j in range(n2d[i]):
+                f.write(struct.pack("<ddq", j * 1.5, j * 2.5, j if j % 2 else -1))
+
+    tracks = [[(1, 0), (3, 2)], [(1, 1), (2, 0), (3, 4)], [(3, 6), (1, 3)], [(1, 4), (3, 5)]]
+    errors = [0.5, 1.0, -1.0, 1.5]
+    with (root / "points3D.bin").open("wb") as f:
+        f.write(struct.pack("<Q", len(tracks)))
+        for k, track in enumerate(tracks):
+            f.write(struct.pack("<Q3d3Bd", 100 + k, k, 2.0 * k, 3.0 * k, k, 2 * k, 3 * k, errors[k]))
+            f.write(struct.pack("<Q", len(track)))
+            for image_id, idx in track:
+                f.write(struct.pack("<ii", image_id, idx))
+
+    return {"q": q, "t": t, "names": names, "n2d": n2d, "tracks": tracks, "errors": errors}
+
+
+def _scalar_rotation(qw, qx, qy, qz):
+    return np.array([
+        [1 - 2*qy**2 - 2*qz**2, 2*qx*qy - 2*qz*qw, 2*qx*qz + 2*qy*qw],
+        [2*qx*qy + 2*qz*qw, 1 - 2*qx**2 - 2*qz**2, 2*qy*qz - 2*qx*qw],
+        [2*qx*qz - 2*qy*qw, 2*qy*qz + 2*qx*qw, 1 - 2*qx**2 - 2*qy**2],
+    ])
+
+
+def test_read_binary_model(tmp_path: Path):
+    ref = _write_model(tmp_path / "0", np.random.default_rng(3))
+    model = read_model(tmp_path / "0")
+
+    assert model.cameras[1].model == "SIMPLE_PINHOLE"
+    assert model.cameras[2].intrinsic_matrix()[0, 0] == 700.0
+    assert model.images.names == tuple(ref["names"])
+    assert [len(p) for p in model.images.points2d] == ref["n2d"]
+    assert model.images.points2d[2]["point3d_id"][:3].tolist() == [-1, 1, -1]
+
+    R = model.rotations()
+    for i, q in enumerate(ref["q"]):
+        assert np.allclose(R[i], _scalar_rotation(*q))
+        assert np.allclose(R[i] @ R[i].T, np.eye(3))
+
+    pts = model.points3d
+    assert pts.ids.tolist() == [100, 101, 102, 103]
+    assert np.allclose(pts.xyz[2], [2.0, 4.0, 6.0])
+    assert pts.rgb[3].tolist() == [3, 6, 9]
+    for k, track in enumerate(ref["tracks"]):
+        assert [tuple(e) for e in pts.track(k).tolist()] == track
+
+    stats = model.stats()
+    assert (stats.cameras, stats.registered_images, stats.points3d, stats.observations) == (2, 3, 4, 9)
+    assert stats.mean_track_length == pytest.approx(9 / 4)
+    # the point without a computed error (-1) is left out, as model_analyzer does
+    assert stats.reprojection_error == pytest.approx(1.0)
+
+
+def test_qc_and_pose_reader_without_colmap(tmp_path: Path):
+    ref = _write_model(tmp_path / "0", np.random.default_rng(4))
+
+    stats = run_model_analyzer(tmp_path / "0")
+    assert (stats.registered_images, stats.points3d) == (3, 4)
+
+    poses = read_colmap_poses(tmp_path / "0")
+    assert list(poses) == ref["names"]
+    T = poses["frame_000001.jpg"]
+    assert np.allclose(T[:3, :3], quat_to_rotation_matrices(ref["q"][1])[0])
+    assert np.allclose(T[:3, 3], ref["t"][1])
+    assert T[3].tolist() == [0.0, 0.0, 0.0, 1.0]
+
+    (tmp_path / "0" / "points3D.bin").write_bytes(b"\x05")
+    with pytest.raises(RuntimeError):
+        run_model_analyzer(tmp_path / "0")
+    assert read_colmap_poses(tmp_path / "missing") == {}
@@ -0,0 +1,140 @@
+from pathlib import Path
+
+import cv2
+import imagehash
+import numpy as np
+import pytest
+
+from PIL import Image
+
+from ptb_ml.preprocess.analyze import analyze_frame
+from ptb_ml.preprocess.dedupe import dedupe_keep_best, phash_batch, phash_input, score
+from ptb_ml.preprocess.hash_index import HammingIndex, hamming, pack_hash_bits, pack_hashes
+from ptb_ml.preprocess.quality import QualityMetrics
+from ptb_ml.preprocess.settings import MaskingSettings, PreprocessSettings
+
+TEST_IMAGE = Path(__file__).parent / "test_files" / "house-exterior-8717154.jpg"
+
+
+def _clustered_hashes(n: int, hash_size: int, seed: int = 0) -> list[imagehash.ImageHash]:
+    """Random cluster centres plus a few flipped bits per member."""
+    rng = np.random.default_rng(seed)
+    nbits = hash_size * hash_size
+    centres = rng.integers(0, 2, size=(max(1, n // 4), nbits), dtype=np.uint8).astype(bool)
+    out = []
+    for _ in range(n):
+        bits = centres[rng.integers(len(centres))].copy()
+        flip = rng.choice(nbits, size=rng.integers(0, 10), replace=False)
+        bits[flip] = ~bits[flip]
+        out.append(imagehash.ImageHash(bits.reshape(hash_size, hash_size)))
+    return out
+
+
+def _greedy_reference(keep, hashes, threshold):
+    """The original O(n^2) dedupe loop."""
+    selected, removed = [], []
+    for (p, m), h in zip(keep, hashes):
+        for i, (sp, sm, sh) in enumerate(selected):
+            if (h - sh) <= threshold:
+                if score(m) > score(sm):
+                    removed.append(sp)
+                    selected[i] = (p, m, h)
+                else:
+                    removed.append(p)
+                break
+        else:
+            selected.append((p, m, h))
+    return [(p, m) for p, m, _ in selected], removed
+
+
+def test_hamming_matches_imagehash():
+    hashes = _clustered_hashes(50, 16, seed=1)
+    codes = pack_hashes(np.stack([h.hash.reshape(-1) for h in hashes]))
+    d = hamming(codes, codes[0])
+    assert d.tolist() == [h - hashes[0] for h in hashes]
+
+
+def test_index_first_within_is_lowest_slot():
+    hashes = _clustered_hashes(200, 8, seed=2)
+    codes = [pack_hash_bits(h.hash) for h in hashes]
+    idx = HammingIndex(64, 4)
+    for c in codes[:100]:
+        idx.add(c)
+    for h, c in zip(hashes[100:], codes[100:]):
+        expected = next((i for i, o in enumerate(hashes[:100]) if h - o <= 4), None)
+        assert idx.first_within(c) == expected
+
+
+def test_dedupe_matches_greedy_reference():
+    rng = np.random.default_rng(3)
+    for hash_size, threshold in [(16, 6), (8, 3), (8, 12)]:
+        hashes = _clustered_hashes(300, hash_size, seed=hash_size + threshold)
+        keep = [
+            (Path(f"frame_{i:06d}.jpg"),
+             QualityMetrics(sharpness=float(rng.integers(0, 5)), brightness=float(rng.random()),
+                            clip_high=0.0, clip_low=0.0))
+            for i in range(len(hashes))
+        ]
+        settings = PreprocessSettings(dedupe_phash_size=hash_size, dedupe_hamming_threshold=threshold)
+        codes = {p: pack_hash_bits(h.hash) for (p, _), h in zip(keep, hashes)}
+        got = dedupe_keep_best(keep, settings, precomputed=codes)
+        assert got == _greedy_reference(keep, hashes, threshold)
+
+
+def test_phash_batch_matches_imagehash():
+    rng = np.random.default_rng(4)
+    images = [
+        Image.fromarray(rng.integers(0, 256, (12, 16, 3), dtype=np.uint8)).resize((160, 120), Image.BICUBIC)
+        for _ in range(40)
+    ]
+    images.append(Image.new("RGB", (64, 48), (128, 128, 128)))  # flat: DCT is all rounding noise
+    for hash_size in (8, 16, 5):
+        stack = np.stack([phash_input(im, hash_size) for im in images])
+        expected = [pack_hash_bits(imagehash.phash(im, hash_size=hash_size).hash) for im in images]
+        assert np.array_equal(phash_batch(stack, hash_size), np.stack(expected))
+
+
+def _jpeg_fixtures(root: Path) -> list[Path]:
+    """The test photo re-encoded as crops, quality levels and blur, like extracted frames."""
+    bgr = cv2.imread(str(TEST_IMAGE), cv2.IMREAD_COLOR)
+    h, w = bgr.shape[:2]
+    variants = {
+        "orig": bgr,
+        "left": bgr[:, : w * 2 // 3],
+        "top": bgr[: h // 2],
+        "soft": cv2.GaussianBlur(bgr, (0, 0), 2),
+        "dark": cv2.convertScaleAbs(bgr, alpha=0.4),
+    }
+    out = [TEST_IMAGE]
+    for name, img in variants.items():
+        for q in (60, 95):
+            p = root / f"{name}_q{q}.jpg"
+            cv2.imwrite(str(p), img, [cv2.IMWRITE_JPEG_QUALITY, q])
+            out.append(p)
+    return out
+
+
+def _luma_rounding_fixture(path: Path) -> Path:
+    """8x8 tiles of colours whose luma cv2 and PIL round differently; flips an 8x8 phash bit."""
+    colours = np.stack(np.meshgrid(*[np.arange(256, dtype=np.uint8)] * 3, indexing="ij"), -1).reshape(1, -1, 3)
+    pil_l = np.asarray(Image.fromarray(colours).convert("L"))
+    differ = colours[0][pil_l[0] != cv2.cvtColor(colours, cv2.COLOR_RGB2GRAY)[0]]
+    tiles = differ[np.random.default_rng(0).integers(len(differ), size=(8, 8))]
+    rgb = cv2.resize(tiles, (256, 256), interpolation=cv2.INTER_NEAREST)
+    cv2.imwrite(str(path), cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR))  # PNG: lossless
+    return path
+
+
+@pytest.mark.parametrize("hash_size", [8, 16])
+@pytest.mark.parametrize("quality_scale", [1, 2, 4])
+def test_fused_analysis_phash_matches_imagehash(tmp_path: Path, hash_size: int, quality_scale: int):
+    # masking off: no full-resolution sky mask, only the metrics need the frame
+    settings = PreprocessSettings(dedupe_phash_size=hash_size, quality_scale=quality_scale,
+                                  masking=MaskingSettings(enabled=False))
+    paths = _jpeg_fixtures(tmp_path) + [_luma_rounding_fixture(tmp_path / "tiles.png")]
+    stack = np.stack([analyze_frame(p, settings).phash_thumb for p in paths])
+    expected = []
+    for p in paths:
+        with Image.open(p) as im:
+            expected.append(pack_hash_bits(imagehash.phash(im, hash_size=hash_size).hash))
+    assert np.array_equal(phash_batch(stack, hash_size), np.stack(expected))
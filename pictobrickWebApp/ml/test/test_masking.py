@@ -0,0 +1,117 @@
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+import pytest
+
+from ptb_ml.preprocess.masking import (
+    _dilate_masked_out,
+    _dilate_masked_out_pil,
+    _sky_mask,
+    _sky_mask_float,
+    run_masking,
+)
+from ptb_ml.preprocess.settings import MaskingSettings
+from ptb_ml.preprocess.temporal import plan_keyframes
+
+TEST_IMAGE = Path(__file__).parent / "test_files" / "house-exterior-8717154.jpg"
+
+
+def _panning_frames(root: Path, n: int, step: int) -> list[Path]:
+    """Crops of the test image sliding right by `step` px per frame, like a slow pan."""
+    bgr = cv2.imread(str(TEST_IMAGE), cv2.IMREAD_COLOR)
+    h, w = bgr.shape[:2]
+    cw, ch = w // 2, h // 2
+    root.mkdir(parents=True, exist_ok=True)
+    out = []
+    for i in range(n):
+        p = root / f"frame_{i:06d}.jpg"
+        cv2.imwrite(str(p), bgr[:ch, i * step:i * step + cw], [cv2.IMWRITE_JPEG_QUALITY, 95])
+        out.append(p)
+    return out
+
+
+def _read_mask(path: str) -> np.ndarray:
+    return cv2.imread(path, cv2.IMREAD_GRAYSCALE) == 0
+
+
+@pytest.mark.parametrize("blue_strength,low_sat,high_val", [
+    (0.12, 0.25, 0.78), (0.0, 1.0, 0.0), (0.37, 0.05, 0.93),
+    (-0.05, 1.2, 0.78), (0.12, 0.25, -0.1),   # outside MaskingSettings: rules true at 0
+])
+def test_integer_sky_mask_matches_float_on_every_colour(blue_strength, low_sat, high_val):
+    # every uint8 RGB triple once, as a 4096x4096 image
+    rgb = np.stack(np.meshgrid(*[np.arange(256, dtype=np.uint8)] * 3, indexing="ij"), -1).reshape(4096, 4096, 3)
+    kw = dict(top_fraction=1.0, blue_strength=blue_strength, low_sat=low_sat, high_val=high_val)
+    with np.errstate(invalid="ignore"):
+        expected = _sky_mask_float(rgb, **kw)
+    assert np.array_equal(_sky_mask(rgb, **kw), expected)
+
+    photo = cv2.cvtColor(cv2.imread(str(TEST_IMAGE)), cv2.COLOR_BGR2RGB)
+    kw["top_fraction"] = 0.55
+    with np.errstate(invalid="ignore"):
+        assert np.array_equal(_sky_mask(photo, **kw), _sky_mask_float(photo, **kw))
+
+
+@pytest.mark.parametrize("dilation_px", [0, 1, 6, 15])
+def test_cv2_dilation_matches_pil_max_filter(dilation_px):
+    keep = np.random.default_rng(dilation_px).random((123, 201)) > 0.01
+    keep[0, 0] = keep[-1, -1] = keep[0, -1] = False  # masked-out pixels on the border
+    assert np.array_equal(_dilate_masked_out(keep, dilation_px), _dilate_masked_out_pil(keep, dilation_px))
+
+
+def test_plan_keyframes_stride_and_phash():
+    codes = [np.array([0], dtype=np.uint64)] * 3 + [np.array([0xFFFF], dtype=np.uint64)] * 4
+    assert plan_keyframes(codes, stride=3) == [True, False, False, True, False, False, True]
+    # the jump at frame 3 starts a keyframe on its own; the stride then counts from there
+    assert plan_keyframes(codes, stride=10, phash_distance=8) == [
+        True, False, False, True, False, False, False
+    ]
+
+
+def test_temporal_masking_propagates_between_keyframes(tmp_path: Path):
+    frames = _panning_frames(tmp_path / "frames", n=6, step=6)
+    base = dict(backend="sky_hsv", dilation_px=0)
+
+    exact = run_masking(frames, tmp_path / "frames", tmp_path / "exact", settings=MaskingSettings(**base))
+    temporal = run_masking(
+        frames, tmp_path / "frames", tmp_path / "temporal",
+        settings=MaskingSettings(**base, temporal=True, keyframe_stride=3),
+        temporal=True,
+    )
+
+    assert [f.provenance for f in temporal.frames] == ["keyframe", "propagated", "propagated"] * 2
+    assert temporal.frames[2].keyframe == str(frames[0])
+    for k in (0, 3):
+        key = _read_mask(exact.frames[k].mask)
+        for e, t in zip(exact.frames[k + 1:k + 3], temporal.frames[k + 1:k + 3]):
+            a, b = _read_mask(e.mask), _read_mask(t.mask)
+            # warping follows the pan: far closer than reusing the keyframe mask as-is
+            assert np.mean(a ^ b) < 0.03
+            assert np.sum(a ^ b) < 0.5 * np.sum(a ^ key)
+
+
+def test_temporal_masking_falls_back_on_scene_cut(tmp_path: Path):
+    frames = _panning_frames(tmp_path / "frames", n=4, step=6)
+    # frame 2 is a hard cut to an unrelated view
+    cut = cv2.imread(str(frames[2]), cv2.IMREAD_COLOR)
+    cv2.imwrite(str(frames[2]), cv2.flip(cut, -1))
+
+    res = run_masking(
+        frames, tmp_path / "frames", tmp_path / "masks",
+        settings=MaskingSettings(backend="sky_hsv", temporal=True, keyframe_stride=10),
+        temporal=True,
+    )
+    prov = [f.provenance for f in res.frames]
+    assert prov[:3] == ["keyframe", "propagated", "fallback"]
+    assert res.frames[2].flow_confidence < 0.8
+    # the inferred cut frame is the keyframe for what follows
+    assert res.frames[3].keyframe == str(frames[2])
+
+    # non-video callers keep per-frame inference even with the setting on
+    plain = run_masking(
+        frames, tmp_path / "frames", tmp_path / "plain",
+        settings=MaskingSettings(backend="sky_hsv", temporal=True),
+    )
+    assert {f.provenance for f in plain.frames} == {"inferred"}
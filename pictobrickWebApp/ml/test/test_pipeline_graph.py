@@ -0,0 +1,81 @@
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+# ptb_ml.pipeline imports every stage, the priors need torch
+pytest.importorskip("torch")
+
+from ptb_ml.pipeline import run as pipeline_run  # noqa: E402
+from ptb_ml.pipeline.graph import Task, run_graph  # noqa: E402
+from ptb_ml.preprocess.engine import PreprocessResult  # noqa: E402
+from ptb_ml.runtime import ProgressEvent, emit_progress, progress_sink  # noqa: E402
+
+
+def test_independent_branches_overlap_and_join():
+    both_running = threading.Barrier(2, timeout=5)
+
+    def branch(name):
+        def fn(_):
+            both_running.wait()        # deadlocks unless the two branches run concurrently
+            emit_progress(ProgressEvent(stage=name))
+            return name
+        return fn
+
+    events = []
+    with progress_sink(events.append):
+        results = run_graph([
+            Task("sfm", branch("sfm")),
+            Task("sfm_qc", lambda done: done["sfm"] + "+qc", deps=("sfm",)),
+            Task("priors", branch("priors")),
+            Task("join", lambda done: (done["sfm_qc"], done["priors"]), deps=("sfm_qc", "priors")),
+        ])
+    assert results["join"] == ("sfm+qc", "priors")
+    assert sorted(e.stage for e in events) == ["priors", "sfm"]
+
+
+def test_failure_stops_dependents_and_reraises():
+    started = []
+
+    def slow(_):
+        time.sleep(0.2)
+        started.append("slow")
+
+    def boom(_):
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError, match="boom"):
+        run_graph([
+            Task("boom", boom),
+            Task("slow", slow),
+            Task("after", lambda _: started.append("after"), deps=("boom",)),
+        ])
+    assert started == ["slow"]          # running work finishes, dependents never start
+
+
+def test_graph_validation_and_serial_mode():
+    with pytest.raises(ValueError, match="cycle"):
+        run_graph([Task("a", lambda _: 1, deps=("b",)), Task("b", lambda _: 2, deps=("a",))])
+    with pytest.raises(ValueError, match="unknown"):
+        run_graph([Task("a", lambda _: 1, deps=("missing",))])
+
+    order = []
+    run_graph(
+        [Task(n, lambda _, n=n: order.append(n)) for n in ("a", "b", "c")],
+        max_workers=1,
+    )
+    assert order == ["a", "b", "c"]
+
+
+def test_zero_kept_frames_fills_every_stage(tmp_path: Path, monkeypatch):
+    def no_frames(req):
+        root = Path(req.base_dir) / req.job_id
+        return PreprocessResult(job_root=root, manifest_path=root / "manifest.json", total_frames=3,
+                                kept_frames=0, dropped_frames=3, deduped_frames=0)
+
+    monkeypatch.setattr(pipeline_run, "run_preprocess", no_frames)
+    res = pipeline_run.run_pipeline(pipeline_run.PipelineReq(base_dir=tmp_path, job_id="j", input_paths=[]))
+    assert not res.ok and not res.sfm.ok
+    assert not res.sfm_qc.ok and res.sfm_qc.route == "orange" and res.sfm_qc.score == 0.0
+    assert (res.priors, res.shape_completion, res.voxelization, res.brickification, res.instructions) == (None,) * 5
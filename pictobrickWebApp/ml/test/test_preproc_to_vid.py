@@ -1,13 +1,24 @@
+import json
 import subprocess
 from pathlib import Path
 
+import numpy as np
 import pytest
 from PIL import Image
 
 from ptb_ml.preprocess.io import JobWorkSpace
 from ptb_ml.preprocess import ingest
-from ptb_ml.preprocess.video import extract_frames_ffmpeg
+from ptb_ml.preprocess.video import (
+    extract_frames_budgeted,
+    extract_frames_ffmpeg,
+    extract_frames_streaming,
+    extract_videos_parallel,
+    plan_frame_budget,
+    plan_segments,
+    probe_keyframes,
+)
 from ptb_ml.preprocess.settings import PreprocessSettings
+from ptb_ml.preprocess.work_tier import write_work_tier
 
 
 def _ffmpeg_available() -> bool:
@@ -63,6 +74,26 @@ def test_workspace_creates_tree(tmp_path: Path):
     assert ws.masks_dir.exists()
 
 
+def test_stage_inputs_avoids_copies_and_records_strategy(tmp_path: Path):
+    ws = JobWorkSpace.create(tmp_path / "jobs", "job_stage")
+    outside = tmp_path / "uploads" / "a.png"
+    owned = ws.root / "input" / "b.png"
+    _make_test_image(outside)
+    _make_test_image(owned)
+
+    staged = ws.stage_inputs([outside, owned])
+
+    assert [p.name for p in staged] == ["a.png", "b.png"]
+    assert all(p.exists() for p in staged)
+    assert outside.exists()      # uploads outside the job are left alone
+    assert not owned.exists()    # the job's own upload is renamed into inputs/
+
+    records = json.loads(ws.staging_path.read_text())["inputs"]
+    assert records[0]["strategy"] in {"reflink", "hardlink", "copy"}
+    assert records[1]["strategy"] == "rename"
+    assert records[1]["staged"] == "inputs/b.png"
+
+
 def test_stage_split_and_normalize_images(tmp_path: Path):
     # Arrange: make two input images
     inputs_dir = tmp_path / "inputs"
@@ -94,6 +125,73 @@ def test_stage_split_and_normalize_images(tmp_path: Path):
             assert im.size[0] > 0 and im.size[1] > 0
 
 
+def test_parallel_normalize_keeps_order_and_downscales(tmp_path: Path):
+    colors = [(i * 20, 255 - i * 20, 40) for i in range(8)]
+    imgs = []
+    for i, c in enumerate(colors):
+        p = tmp_path / "inputs" / f"img{i}.jpg"
+        p.parent.mkdir(parents=True, exist_ok=True)
+        Image.new("RGB", (1200, 800), c).save(p, format="JPEG", quality=95)
+        imgs.append(p)
+
+    ws = JobWorkSpace.create(tmp_path / "jobs", "job_parallel_ingest")
+    written, next_idx = ingest.normalize_images_to_frames(
+        ws, imgs, start_idx=2, workers=4, max_side=300
+    )
+
+    assert next_idx == 10
+    assert [p.name for p in written] == [f"frame_{i:06d}.jpg" for i in range(2, 10)]
+    for p, c in zip(written, colors):
+        with Image.open(p) as im:
+            assert im.size == (300, 200)
+            assert all(abs(a - b) <= 3 for a, b in zip(im.getpixel((150, 100)), c))
+
+
+def test_ingest_passthrough_only_for_normalized_jpegs(tmp_path: Path):
+    d = tmp_path / "inputs"
+    d.mkdir(parents=True)
+    img = Image.new("RGB", (64, 48), (200, 30, 30))
+
+    img.save(d / "baseline.jpg", format="JPEG", quality=90)
+    img.save(d / "progressive.jpg", format="JPEG", quality=90, progressive=True)
+    exif = Image.Exif()
+    exif[0x0112] = 6  # rotated 90 CW
+    img.save(d / "rotated.jpg", format="JPEG", quality=90, exif=exif)
+    img.convert("L").save(d / "gray.jpg", format="JPEG", quality=90)
+    _make_test_image(d / "plain.png")
+
+    names = ["baseline.jpg", "progressive.jpg", "rotated.jpg", "gray.jpg", "plain.png"]
+    ws = JobWorkSpace.create(tmp_path / "jobs", "job_passthrough")
+    res = ingest.ingest_images(ws, [d / n for n in names])
+
+    assert res.counts["hardlink"] + res.counts["copy"] == 1
+    assert res.counts["reencode"] == 4
+    assert res.written[0].read_bytes() == (d / "baseline.jpg").read_bytes()
+    with Image.open(res.written[2]) as im:
+        assert im.size == (48, 64)
+    with Image.open(res.written[3]) as im:
+        assert im.mode == "RGB"
+
+
+def test_work_tier_downscales_and_records_scale(tmp_path: Path):
+    ws = JobWorkSpace.create(tmp_path / "jobs", "job_work_tier")
+    big, small = ws.frame_path(0), ws.frame_path(1)
+    Image.new("RGB", (1600, 900), (10, 120, 200)).save(big, format="JPEG")
+    Image.new("RGB", (320, 240), (200, 120, 10)).save(small, format="JPEG")
+
+    work = write_work_tier(ws, [big, small], max_side=800)
+
+    assert work[big].path == ws.frames_work_dir / big.name
+    assert (work[big].width, work[big].height) == (800, 450)
+    assert work[big].scale == pytest.approx(0.5)
+    with Image.open(work[big].path) as im:
+        assert im.size == (800, 450)
+
+    # already under the limit: same pixels, scale 1
+    assert work[small].scale == 1.0
+    assert work[small].path.read_bytes() == small.read_bytes()
+
+
 @pytest.mark.skipif(not _ffmpeg_available(), reason="ffmpeg not available on PATH")
 def test_extract_frames_from_video_continues_numbering(tmp_path: Path):
     # Arrange: create one image and one synthetic video
@@ -130,4 +228,100 @@ def test_extract_frames_from_video_continues_numbering(tmp_path: Path):
 
     # next index should be last frame number + 1
     last_num = int(frames[-1].stem.split("_")[1])
-    assert next_after_video == last_num + 1
\ No newline at end of file
+    assert next_after_video == last_num + 1
+
+@pytest.mark.skipif(not _ffmpeg_available(), reason="ffmpeg not available on PATH")
+def test_streaming_extraction_writes_only_passing_frames(tmp_path: Path):
+    vid = tmp_path / "inputs" / "vid.mp4"
+    _make_test_video_ffmpeg(vid, seconds=2.0, fps=10, size="320x240")
+    ws = JobWorkSpace.create(tmp_path / "jobs", "job_stream")
+
+    # testsrc is sharp but has large pure white/black areas, so relax the clipping limits
+    lenient = dict(fps=2.0, max_clip_high=1.0, max_clip_low=1.0)
+    written = []
+    res = extract_frames_streaming(ws, vid, settings=PreprocessSettings(**lenient), start_idx=3,
+                                   on_frame=lambda p: written.append(p if p.exists() else None))
+    assert len(res.kept) == 4 and not res.dropped
+    assert res.next_idx == 7
+    assert [p.name for p in ws.list_frames()] == [f"frame_{i:06d}.jpg" for i in range(3, 7)]
+    assert written == [p for p, _ in res.kept]
+
+    # An impossible sharpness bar drops everything without writing any file
+    ws2 = JobWorkSpace.create(tmp_path / "jobs", "job_stream_drop")
+    res = extract_frames_streaming(ws2, vid, settings=PreprocessSettings(**lenient, min_sharpness=1e9))
+    assert res.next_idx == 0 and not res.kept
+    assert len(res.dropped) == 4
+    assert all(reason == "blur" for _, reason, _ in res.dropped)
+    assert ws2.list_frames() == []
+
+
+def test_plan_frame_budget_is_proportional_and_capped():
+    assert plan_frame_budget([10.0, 30.0], 8, fps=2.0) == [2, 6]
+    # a short clip still gets a frame
+    assert plan_frame_budget([1.0, 100.0], 50, fps=2.0) == [1, 49]
+    # clips can't be sampled faster than fps: ceil(1 * 2) + ceil(3 * 2) windows at most
+    assert plan_frame_budget([1.0, 3.0], 20, fps=2.0) == [2, 6]
+    # unknown durations share equally; nothing exceeds the total
+    assert sum(plan_frame_budget([None, None, None], 10, fps=2.0)) == 10
+    assert plan_frame_budget([5.0], 0, fps=2.0) == [0]
+
+
+@pytest.mark.skipif(not _ffmpeg_available(), reason="ffmpeg not available on PATH")
+def test_budgeted_extraction_never_exceeds_budget(tmp_path: Path):
+    vid = tmp_path / "inputs" / "vid.mp4"
+    _make_test_video_ffmpeg(vid, seconds=4.0, fps=10, size="320x240")
+    ws = JobWorkSpace.create(tmp_path / "jobs", "job_budget")
+
+    settings = PreprocessSettings(video_extraction="budget", budget_candidates_per_window=3)
+    next_idx = extract_frames_budgeted(ws, vid, settings=settings, budget=5, start_idx=2)
+
+    assert next_idx == 7
+    assert [p.name for p in ws.list_frames()] == [f"frame_{i:06d}.jpg" for i in range(2, 7)]
+
+
+def test_plan_segments_snaps_to_keyframes():
+    assert plan_segments(8.0, [0.0, 3.0], 10.0) == [(0.0, None)]
+    assert plan_segments(None, [], 2.0) == [(0.0, None)]
+    assert plan_segments(9.0, [0.0, 2.5, 3.25, 6.5], 3.0) == [(0.0, 3.25), (3.25, 3.25), (6.5, None)]
+    # no keyframe info: uniform cuts
+    assert plan_segments(8.0, [], 4.0) == [(0.0, 4.0), (4.0, None)]
+
+
+@pytest.mark.skipif(not _ffmpeg_available(), reason="ffmpeg not available on PATH")
+def test_parallel_video_extraction_matches_serial_numbering(tmp_path: Path):
+    vids = [tmp_path / "inputs" / f"vid{i}.mp4" for i in range(3)]
+    for v in vids:
+        _make_test_video_ffmpeg(v, seconds=1.0, fps=10, size="160x120")
+
+    serial_ws = JobWorkSpace.create(tmp_path / "jobs", "serial")
+    idx = 1
+    for v in vids:
+        idx = extract_frames_ffmpeg(serial_ws, v, settings=PreprocessSettings(fps=2.0), start_idx=idx)
+
+    ws = JobWorkSpace.create(tmp_path / "jobs", "parallel")
+    settings = PreprocessSettings(fps=2.0, video_workers=3)
+    next_idx = extract_videos_parallel(ws, vids, settings=settings, start_idx=1)
+
+    assert next_idx == idx
+    assert [p.name for p in ws.list_frames()] == [p.name for p in serial_ws.list_frames()]
+
+
+@pytest.mark.skipif(not _ffmpeg_available(), reason="ffmpeg not available on PATH")
+def test_segmented_extraction_keeps_the_serial_sampling_grid(tmp_path: Path):
+    # 25 fps with a keyframe every 7 frames: cuts land at 0.28 s steps, off the 3 fps grid
+    vid = tmp_path / "inputs" / "long.mp4"
+    vid.parent.mkdir(parents=True)
+    subprocess.run(["ffmpeg", "-v", "error", "-f", "lavfi", "-i", "testsrc2=size=160x120:rate=25:duration=6",
+                    "-g", "7", "-pix_fmt", "yuv420p", str(vid)], check=True)
+    assert len(plan_segments(6.0, probe_keyframes(vid), 1.5)) >= 2
+
+    serial_ws = JobWorkSpace.create(tmp_path / "jobs", "serial")
+    idx = extract_frames_ffmpeg(serial_ws, vid, settings=PreprocessSettings(fps=3.0))
+    ws = JobWorkSpace.create(tmp_path / "jobs", "segmented")
+    settings = PreprocessSettings(fps=3.0, video_segment_seconds=1.5, video_workers=4)
+    assert extract_videos_parallel(ws, [vid], settings=settings) == idx == 18
+
+    # same source frame at every sample time, including the ones next to the cuts
+    for a, b in zip(serial_ws.list_frames(), ws.list_frames(), strict=True):
+        assert a.name == b.name
+        assert np.array_equal(np.asarray(Image.open(a)), np.asarray(Image.open(b)))
@@ -0,0 +1,66 @@
+from pathlib import Path
+
+import cv2
+import pytest
+
+from ptb_ml.preprocess.analyze import analyze_frame
+from ptb_ml.preprocess.quality import compute_metrics, metrics_from_gray, passes_quality, reduce_gray
+from ptb_ml.preprocess.settings import MaskingSettings, PreprocessSettings
+
+TEST_IMAGE = Path(__file__).parent / "test_files" / "house-exterior-8717154.jpg"
+
+
+@pytest.mark.parametrize("scale", [2, 4])
+def test_reduced_metrics_track_exact_metrics(tmp_path: Path, scale: int):
+    bgr = cv2.imread(str(TEST_IMAGE), cv2.IMREAD_COLOR)
+    exact, fast = [], []
+    for sigma in (0, 1.5, 3, 6):
+        p = tmp_path / f"s{sigma}.jpg"
+        cv2.imwrite(str(p), cv2.GaussianBlur(bgr, (0, 0), sigma) if sigma else bgr)
+        exact.append(compute_metrics(p))
+        fast.append(compute_metrics(p, scale=scale))
+
+    for e, f in zip(exact, fast):
+        assert f.brightness == pytest.approx(e.brightness, abs=0.01)
+        assert f.clip_high == pytest.approx(e.clip_high, abs=0.01)
+        assert f.clip_low == pytest.approx(e.clip_low, abs=0.01)
+
+    # calibrated into full-resolution units, not the much larger raw reduced value
+    assert 0.5 < fast[0].sharpness / exact[0].sharpness < 2.0
+    # blur ordering is preserved
+    assert [f.sharpness for f in fast] == sorted((f.sharpness for f in fast), reverse=True)
+
+
+def test_half_scale_keeps_blur_decisions(tmp_path: Path):
+    min_sharpness = PreprocessSettings().min_sharpness
+    bgr = cv2.imread(str(TEST_IMAGE), cv2.IMREAD_COLOR)
+    for sigma in (0, 1, 1.5, 2, 3, 6):
+        p = tmp_path / f"s{sigma}.jpg"
+        cv2.imwrite(str(p), cv2.GaussianBlur(bgr, (0, 0), sigma) if sigma else bgr)
+        exact = compute_metrics(p).sharpness
+        fast = compute_metrics(p, scale=2).sharpness
+        assert (fast >= min_sharpness) == (exact >= min_sharpness), sigma
+
+
+@pytest.mark.parametrize("scale", [1, 2, 4])
+def test_scoring_paths_agree_on_keep_drop(tmp_path: Path, scale: int):
+    # file scoring (compute_metrics), the fused analysis pass and in-memory frames
+    # (extract_frames_streaming) must make the same call on a sharp/blurred pair
+    settings = PreprocessSettings(quality_scale=scale, masking=MaskingSettings(enabled=False))
+    bgr = cv2.imread(str(TEST_IMAGE), cv2.IMREAD_COLOR)
+    decisions = []
+    for sigma in (0, 3):
+        p = tmp_path / f"s{sigma}.jpg"
+        cv2.imwrite(str(p), cv2.GaussianBlur(bgr, (0, 0), sigma) if sigma else bgr)
+        from_file = compute_metrics(p, scale=scale)
+        from_analysis = analyze_frame(p, settings).metrics
+        gray = cv2.cvtColor(cv2.imread(str(p), cv2.IMREAD_COLOR), cv2.COLOR_BGR2GRAY)
+        from_memory = metrics_from_gray(reduce_gray(gray, scale), scale=scale)
+        assert from_file == from_analysis == from_memory
+        decisions.append(passes_quality(from_file, settings)[0])
+    assert decisions == [True, False]
+
+
+def test_quality_scale_is_validated():
+    with pytest.raises(ValueError):
+        PreprocessSettings(quality_scale=3)
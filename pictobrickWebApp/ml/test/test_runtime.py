@@ -0,0 +1,117 @@
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+
+from ptb_ml.runtime import (
+    CpuGovernor,
+    ProgressEvent,
+    cpu_budget,
+    parse_colmap_line,
+    parse_ffmpeg_line,
+    pin_cpu_budget,
+    progress_sink,
+    run_process,
+)
+from ptb_ml.sfm.colmap_runner import build_mapper_cmd, run_colmap_command
+from ptb_ml.sfm.models import SfmReq
+from ptb_ml.sfm.settings import SfmSettings
+
+# prints COLMAP-style progress on stderr and a \r-updated counter on stdout
+FAKE_TOOL = """\
+import sys, time
+for i in range(1, 4):
+    sys.stderr.write(f"I0101 feature_extraction.cc:1] Processed file [{i}/3]\\n")
+    sys.stderr.flush()
+    sys.stdout.write(f"frame={i}\\r")
+    sys.stdout.flush()
+sys.stdout.write("done\\n")
+sys.exit(int(sys.argv[1]))
+"""
+
+
+@pytest.fixture
+def fake_tool(tmp_path: Path) -> list[str]:
+    script = tmp_path / "tool.py"
+    script.write_text(FAKE_TOOL)
+    return [sys.executable, str(script)]
+
+
+def test_run_process_streams_lines_and_logs(tmp_path: Path, fake_tool):
+    lines: list[tuple[str, str]] = []
+    res = run_process(
+        fake_tool + ["0"],
+        stdout_path=tmp_path / "logs" / "out.log",
+        stderr_path=tmp_path / "logs" / "err.log",
+        on_line=lambda stream, line: lines.append((stream, line)),
+    )
+    assert res.ok
+    assert [l for s, l in lines if s == "stdout"] == ["frame=1", "frame=2", "frame=3", "done"]
+    assert len([l for s, l in lines if s == "stderr"]) == 3
+    assert (tmp_path / "logs" / "out.log").read_bytes() == b"frame=1\rframe=2\rframe=3\rdone\n"
+    assert res.stderr_tail.endswith("Processed file [3/3]")
+
+
+def test_colmap_command_reports_progress(tmp_path: Path, fake_tool):
+    events: list[ProgressEvent] = []
+    with progress_sink(events.append):
+        run_colmap_command(name="feature_extractor", cmd=fake_tool + ["0"], logs_dir=tmp_path)
+    assert [(e.current, e.total) for e in events] == [(0, None), (1, 3), (2, 3), (3, 3)]
+    assert events[-1].describe() == "sfm: feature_extractor 3/3"
+    assert events[-1].fraction == 1.0
+
+    # no sink installed: nothing is reported, failures still raise with the log paths
+    with pytest.raises(RuntimeError, match="stderr_log="):
+        run_colmap_command(name="mapper", cmd=fake_tool + ["3"], logs_dir=tmp_path)
+    assert "Processed file [3/3]" in (tmp_path / "mapper.stderr.log").read_text()
+
+
+def test_progress_line_parsers():
+    assert parse_colmap_line("Processed file [12/150]") == (12, 150)
+    assert parse_colmap_line("Matching image [5/20]") == (5, 20)
+    assert parse_colmap_line("Matching block [2/3, 1/3]") == (4, 9)
+    assert parse_colmap_line("Registering image #37 (12)") == (12, None)
+    assert parse_colmap_line("Elapsed time: 0.1 [minutes]") is None
+    assert parse_ffmpeg_line("frame=42") == 42
+    assert parse_ffmpeg_line("frame=  42 fps=0.0 q=2.0") == 42
+    assert parse_ffmpeg_line("out_time_us=1000") is None
+
+
+def test_cpu_governor_rebalances_between_stages(tmp_path: Path):
+    gov = CpuGovernor(total_threads=8, apply_library_threads=False)
+    req = SfmReq(job_id="a", image_dir=tmp_path, output_dir=tmp_path, input_mode="sequential")
+
+    def mapper_threads(settings: SfmSettings) -> str | None:
+        cmd = build_mapper_cmd(req, settings, tmp_path / "db", tmp_path / "sparse")
+        return cmd[cmd.index("--Mapper.num_threads") + 1] if "--Mapper.num_threads" in cmd else None
+
+    assert mapper_threads(SfmSettings()) is None       # no lease: COLMAP's own default
+    with gov.lease("sfm", "a") as sfm:
+        assert sfm.threads == 8 and cpu_budget() == 8
+        with gov.lease("priors", "b") as priors:
+            assert (sfm.threads, priors.threads) == (4, 4)
+            with gov.lease("preprocess", "c"):
+                assert sfm.threads == 2
+            assert mapper_threads(SfmSettings()) == "4"
+            assert mapper_threads(SfmSettings(num_threads=6)) == "6"
+        assert sfm.threads == 8 and [l.stage for l in gov.leases] == ["sfm"]
+    assert gov.leases == ()
+
+
+def test_cpu_governor_leaves_pinned_torch_threads_alone(tmp_path: Path, monkeypatch):
+    torch_calls: list[int] = []
+    monkeypatch.setitem(sys.modules, "torch", SimpleNamespace(set_num_threads=torch_calls.append))
+    cv2 = pytest.importorskip("cv2")
+    monkeypatch.setattr(cv2, "setNumThreads", lambda n: None)
+    gov = CpuGovernor(total_threads=8)
+
+    with gov.lease("priors", "a") as priors:
+        assert torch_calls == [8]
+        pin_cpu_budget(3)  # run_priors with PriorsSettings(num_threads=3)
+        with gov.lease("sfm", "a") as sfm:
+            assert (priors.threads, sfm.threads) == (3, 5)
+        assert priors.threads == 3 and torch_calls == [8]
+    assert torch_calls == [8, 8]  # unpinned again: back to the governor's share
+    pin_cpu_budget(2)  # no lease: nothing to pin
+    assert gov.leases == ()
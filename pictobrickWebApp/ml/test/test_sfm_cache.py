@@ -0,0 +1,196 @@
+import json
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+from ptb_ml.sfm.cache import remove_images
+from ptb_ml.sfm.engine import run_sfm
+from ptb_ml.sfm.models import SfmReq
+from ptb_ml.sfm.settings import SfmSettings
+from ptb_ml.sfm.streaming import StreamingFeatureExtractor
+
+# Stand-in for the colmap CLI: keeps a minimal database and logs every call.
+# FAKE_RIG_SCHEMA=1 adds COLMAP 3.12's rigs/frames tables: a rig per camera, a frame per image.
+FAKE_COLMAP = """\
+import json, os, sqlite3, sys
+from pathlib import Path
+
+argv = sys.argv[1:]
+opts = dict(zip(argv[1::2], argv[2::2]))
+db = Path(opts["--database_path"])
+with (db.parent / "calls.jsonl").open("a") as f:
+    f.write(json.dumps(argv) + "\\n")
+
+con = sqlite3.connect(db)
+for t in ("cameras(camera_id INTEGER PRIMARY KEY)",
+          "images(image_id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT UNIQUE, camera_id INTEGER)",
+          "keypoints(image_id INTEGER)", "descriptors(image_id INTEGER)",
+          "matches(pair_id INTEGER PRIMARY KEY)", "two_view_geometries(pair_id INTEGER PRIMARY KEY)"):
+    con.execute("CREATE TABLE IF NOT EXISTS " + t)
+rigs = os.environ.get("FAKE_RIG_SCHEMA") == "1"
+if rigs:
+    for t in ("rigs(rig_id INTEGER PRIMARY KEY AUTOINCREMENT, ref_sensor_id INTEGER, ref_sensor_type INTEGER)",
+              "rig_sensors(rig_id INTEGER, sensor_id INTEGER, sensor_type INTEGER)",
+              "frames(frame_id INTEGER PRIMARY KEY AUTOINCREMENT, rig_id INTEGER)",
+              "frame_data(frame_id INTEGER, data_id INTEGER, sensor_id INTEGER, sensor_type INTEGER)"):
+        con.execute("CREATE TABLE IF NOT EXISTS " + t)
+
+if argv[0] == "feature_extractor":
+    if "--image_list_path" in opts:
+        names = Path(opts["--image_list_path"]).read_text().split()
+    else:
+        names = sorted(os.listdir(opts["--image_path"]))
+    cam = int(opts.get("--ImageReader.existing_camera_id", 0)) or None
+    if cam is None:
+        cam = con.execute("INSERT INTO cameras VALUES (NULL)").lastrowid
+    for n in names:
+        if con.execute("SELECT 1 FROM images WHERE name=?", (n,)).fetchone():
+            continue
+        iid = con.execute("INSERT INTO images(name, camera_id) VALUES (?, ?)", (n, cam)).lastrowid
+        con.execute("INSERT INTO keypoints VALUES (?)", (iid,))
+        con.execute("INSERT INTO descriptors VALUES (?)", (iid,))
+        if rigs:
+            row = con.execute("SELECT rig_id FROM rigs WHERE ref_sensor_id=?", (cam,)).fetchone()
+            rig = row[0] if row else con.execute("INSERT INTO rigs VALUES (NULL, ?, 0)", (cam,)).lastrowid
+            fid = con.execute("INSERT INTO frames VALUES (NULL, ?)", (rig,)).lastrowid
+            con.execute("INSERT INTO frame_data VALUES (?, ?, ?, 0)", (fid, iid, cam))
+elif argv[0].endswith("_matcher"):
+    ids = [r[0] for r in con.execute("SELECT image_id FROM images ORDER BY image_id")]
+    for i in ids:
+        for j in ids:
+            if i < j:
+                con.execute("INSERT OR IGNORE INTO matches VALUES (?)", (i * 2147483647 + j,))
+                con.execute("INSERT OR IGNORE INTO two_view_geometries VALUES (?)", (i * 2147483647 + j,))
+elif argv[0] == "mapper":
+    (Path(opts["--output_path"]) / "0").mkdir(parents=True)
+con.commit()
+"""
+
+
+@pytest.fixture
+def sfm_job(tmp_path: Path, fake_colmap):
+    colmap = fake_colmap(FAKE_COLMAP)
+    images = tmp_path / "frames"
+    images.mkdir()
+    for i in range(3):
+        (images / f"frame_{i:06d}.jpg").write_bytes(bytes([i]) * 16)
+    req = SfmReq(job_id="j", image_dir=images, output_dir=tmp_path / "sfm", input_mode="unordered")
+    return req, str(colmap), tmp_path / "sfm"
+
+
+def _calls(out: Path) -> list[list[str]]:
+    path = out / "calls.jsonl"
+    calls = [json.loads(line) for line in path.read_text().splitlines()]
+    path.unlink()
+    return calls
+
+
+def _db(out: Path, sql: str) -> list:
+    with sqlite3.connect(out / "database.db") as con:
+        return con.execute(sql).fetchall()
+
+
+def test_sfm_cache_reuses_features_and_matches(sfm_job):
+    req, colmap, out = sfm_job
+    s = SfmSettings(colmap_bin=colmap, cache=True)
+
+    res = run_sfm(req, s)
+    assert res.ok and res.best_model_dir is not None
+    assert [c[0] for c in _calls(out)] == ["feature_extractor", "exhaustive_matcher", "mapper"]
+
+    # mapper-only change: straight to the mapper
+    res = run_sfm(req, SfmSettings(colmap_bin=colmap, cache=True, mapper_ba_global_max_num_iterations=10))
+    assert res.ok and res.cached_steps == ("feature_extractor", "exhaustive_matcher")
+    assert [c[0] for c in _calls(out)] == ["mapper"]
+
+    # a new frame: extract just that one into the existing camera, then match
+    (req.image_dir / "frame_000003.jpg").write_bytes(b"new")
+    run_sfm(req, s)
+    calls = _calls(out)
+    assert [c[0] for c in calls] == ["feature_extractor", "exhaustive_matcher", "mapper"]
+    opts = dict(zip(calls[0][1::2], calls[0][2::2]))
+    assert Path(opts["--image_list_path"]).read_text().split() == ["frame_000003.jpg"]
+    assert opts["--ImageReader.existing_camera_id"] == "1"
+    assert _db(out, "SELECT COUNT(*) FROM matches") == [(6,)]
+
+    # a changed frame is dropped with its pairs and re-extracted
+    (req.image_dir / "frame_000000.jpg").write_bytes(b"changed")
+    run_sfm(req, s)
+    assert [c[0] for c in _calls(out)] == ["feature_extractor", "exhaustive_matcher", "mapper"]
+    assert _db(out, "SELECT COUNT(*) FROM images") == [(4,)]
+    assert _db(out, "SELECT COUNT(*) FROM matches") == [(6,)]
+
+    # matching settings changed: features kept, matches rebuilt
+    run_sfm(req, SfmSettings(colmap_bin=colmap, cache=True, max_num_matches=1000))
+    assert [c[0] for c in _calls(out)] == ["exhaustive_matcher", "mapper"]
+
+    # extraction settings changed: start over
+    run_sfm(req, SfmSettings(colmap_bin=colmap, cache=True, max_num_matches=1000, max_num_features=100))
+    calls = _calls(out)
+    assert [c[0] for c in calls] == ["feature_extractor", "exhaustive_matcher", "mapper"]
+    assert "--image_list_path" not in calls[0]
+
+
+def test_sfm_cache_edits_rig_frame_schema(sfm_job, monkeypatch):
+    req, colmap, out = sfm_job
+    monkeypatch.setenv("FAKE_RIG_SCHEMA", "1")
+    s = SfmSettings(colmap_bin=colmap, cache=True)
+    run_sfm(req, s)
+    _calls(out)
+
+    # a changed frame is removed from its frame and re-extracted; the other features stay
+    (req.image_dir / "frame_000001.jpg").write_bytes(b"changed")
+    res = run_sfm(req, s)
+    calls = _calls(out)
+    assert res.ok and [c[0] for c in calls] == ["feature_extractor", "exhaustive_matcher", "mapper"]
+    opts = dict(zip(calls[0][1::2], calls[0][2::2]))
+    assert Path(opts["--image_list_path"]).read_text().split() == ["frame_000001.jpg"]
+    assert _db(out, "SELECT COUNT(*) FROM images") == [(3,)]
+    assert _db(out, "SELECT COUNT(*) FROM frames") == [(3,)]
+    assert _db(out, "SELECT COUNT(*) FROM frame_data f JOIN images i ON f.data_id = i.image_id") == [(3,)]
+    assert _db(out, "SELECT COUNT(*) FROM rigs") == [(1,)]
+
+    # the last image of a rig takes the rig with it
+    remove_images(out / "database.db", ("frame_000000.jpg", "frame_000001.jpg"))
+    assert _db(out, "SELECT COUNT(*) FROM rigs") == [(1,)]
+    remove_images(out / "database.db", ("frame_000002.jpg",))
+    assert _db(out, "SELECT COUNT(*) FROM frames") == [(0,)]
+    assert _db(out, "SELECT COUNT(*) FROM rigs") == [(0,)]
+
+
+def test_sfm_without_cache_starts_fresh(sfm_job):
+    req, colmap, out = sfm_job
+    s = SfmSettings(colmap_bin=colmap)
+    run_sfm(req, s)
+    _calls(out)
+    run_sfm(req, s)
+    assert [c[0] for c in _calls(out)] == ["feature_extractor", "exhaustive_matcher", "mapper"]
+    assert not (out / "database.cache.json").exists()
+
+
+def test_streamed_features_hand_over_to_run_sfm(sfm_job):
+    req, colmap, out = sfm_job
+    s = SfmSettings(colmap_bin=colmap, stream_features=True, stream_chunk_size=2)
+    streamer = StreamingFeatureExtractor(
+        job_id="j", image_dir=req.image_dir, database_path=out / "database.db",
+        logs_dir=out / "logs", settings=s,
+    )
+    frames = sorted(req.image_dir.iterdir())
+    streamer.add(frames[:1])
+    streamer.add(frames[1:])
+    res = streamer.finish()
+    assert res.ok and (res.chunks, res.extracted) == (2, 3)
+    calls = _calls(out)
+    assert [c[0] for c in calls] == ["feature_extractor", "feature_extractor"]
+    assert "--ImageReader.existing_camera_id" in calls[1]
+    assert _db(out, "SELECT COUNT(DISTINCT camera_id) FROM images") == [(1,)]
+
+    # a frame written after streaming ended is the only one run_sfm still extracts
+    (req.image_dir / "frame_000003.jpg").write_bytes(b"late")
+    res = run_sfm(req, s)
+    calls = _calls(out)
+    assert res.ok and [c[0] for c in calls] == ["feature_extractor", "exhaustive_matcher", "mapper"]
+    opts = dict(zip(calls[0][1::2], calls[0][2::2]))
+    assert Path(opts["--image_list_path"]).read_text().split() == ["frame_000003.jpg"]
+    assert _db(out, "SELECT COUNT(*) FROM images") == [(4,)]
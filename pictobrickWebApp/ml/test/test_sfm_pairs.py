@@ -0,0 +1,130 @@
+import json
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pytest
+
+from ptb_ml.preprocess.hash_index import code_to_hex, codes_from_hex
+from ptb_ml.sfm import pairs
+from ptb_ml.sfm.engine import run_sfm
+from ptb_ml.sfm.models import SfmReq
+from ptb_ml.sfm.settings import SfmSettings
+
+# logs every call; the mapper writes an empty model dir
+FAKE_COLMAP = """\
+import json, sys
+from pathlib import Path
+
+argv = sys.argv[1:]
+opts = dict(zip(argv[1::2], argv[2::2]))
+with (Path(opts["--database_path"]).parent / "calls.jsonl").open("a") as f:
+    f.write(json.dumps(argv) + "\\n")
+if argv[0] == "mapper":
+    (Path(opts["--output_path"]) / "0").mkdir(parents=True)
+"""
+
+
+def _write_scenes(image_dir: Path, per_scene: int = 6) -> dict[str, int]:
+    """Two scenes of overlapping crops with different texture and colour; name -> scene."""
+    image_dir.mkdir(parents=True)
+    rng = np.random.default_rng(0)
+    scene_of: dict[str, int] = {}
+    for scene, tint in enumerate([(40, 90, 220), (200, 120, 30)]):
+        base = cv2.GaussianBlur(rng.integers(0, 255, (480, 900), dtype=np.uint8), (0, 0), 6)
+        base = cv2.normalize(base, None, 0, 255, cv2.NORM_MINMAX)
+        colour = (base[..., None].astype(np.float32) / 255.0 * np.array(tint, np.float32)).astype(np.uint8)
+        for i in range(per_scene):
+            name = f"s{scene}_{i:02d}.jpg"
+            x = 40 * i
+            cv2.imwrite(str(image_dir / name), colour[:, x:x + 640])
+            scene_of[name] = scene
+    return scene_of
+
+
+def test_top_k_pairs_bound_and_symmetry():
+    sim = np.random.default_rng(1).random((30, 30)).astype(np.float32)
+    sim = (sim + sim.T) / 2
+    np.fill_diagonal(sim, -np.inf)
+    got = pairs.top_k_pairs(sim, 4)
+
+    assert len(got) <= 30 * 4
+    assert all(i < j for i, j in got)
+    got_set = set(got)
+    for i in range(30):
+        for j in np.argsort(-sim[i])[:4]:
+            assert (min(i, j), max(i, j)) in got_set
+    # k >= n - 1 degenerates to exhaustive
+    assert len(pairs.top_k_pairs(sim[:5, :5], 10)) == 10
+
+
+def test_retrieval_pairs_stay_within_scenes(tmp_path: Path):
+    scene_of = _write_scenes(tmp_path / "frames")
+    req = SfmReq(job_id="j", image_dir=tmp_path / "frames", output_dir=tmp_path / "sfm",
+                 input_mode="unordered")
+    n = pairs.write_pairs_file(req, SfmSettings(retrieval_top_k=3), tmp_path / "pairs.txt")
+
+    lines = [line.split() for line in (tmp_path / "pairs.txt").read_text().splitlines()]
+    assert len(lines) == n <= 12 * 3
+    assert all(scene_of[a] == scene_of[b] for a, b in lines)
+
+
+def test_manifest_phash_is_used(tmp_path: Path):
+    _write_scenes(tmp_path / "frames", per_scene=2)
+    names = sorted(p.name for p in (tmp_path / "frames").iterdir())
+    codes = np.random.default_rng(2).integers(0, 2**63, (len(names), 4), dtype=np.uint64)
+    hexes = [code_to_hex(c) for c in codes]
+    assert np.array_equal(codes_from_hex(hexes), codes)
+
+    manifest = tmp_path / "manifest.json"
+    manifest.write_text(json.dumps({"frames": [
+        {"path": f"frames/{n}", "phash": h} for n, h in zip(names, hexes)
+    ]}))
+    got, hists = pairs.compute_descriptors(
+        [tmp_path / "frames" / n for n in names], phash_hex=pairs.read_manifest_phash(manifest)
+    )
+    assert np.array_equal(got, codes)
+    assert np.allclose(hists.sum(axis=1), 1.0)
+
+
+def test_tour_order_recovers_a_shuffled_sequence():
+    rng = np.random.default_rng(5)
+    pos = rng.permutation(40).astype(np.float64)     # hidden position along a camera path
+    sim = np.exp(-np.abs(pos[:, None] - pos[None, :]) / 3.0).astype(np.float32)
+    np.fill_diagonal(sim, -np.inf)
+
+    order = pairs.tour_order(sim)
+    assert sorted(order.tolist()) == list(range(40))
+    walked = pos[order]
+    assert np.all(np.abs(np.diff(walked)) == 1)      # adjacent in the tour = adjacent on the path
+
+    seq = pairs.sequence_pairs(order, overlap=3, quadratic_overlap=False)
+    assert len(seq) == 39 + 38 + 37
+    assert all(abs(pos[i] - pos[j]) <= 3 for i, j in seq)
+    quad = pairs.sequence_pairs(order, overlap=3, quadratic_overlap=True)
+    assert len(quad) == len(seq) + 36                # offset 4 from 2**2
+
+
+@pytest.mark.parametrize("mode, expected", [
+    ("exhaustive", "exhaustive_matcher"),
+    ("retrieval", "matches_importer"),
+    ("sequence", "matches_importer"),
+    ("auto", "exhaustive_matcher"),
+])
+def test_run_sfm_picks_matcher(tmp_path: Path, fake_colmap, mode: str, expected: str):
+    _write_scenes(tmp_path / "frames", per_scene=3)
+    colmap = fake_colmap(FAKE_COLMAP)
+    req = SfmReq(job_id="j", image_dir=tmp_path / "frames", output_dir=tmp_path / "sfm",
+                 input_mode="unordered")
+
+    res = run_sfm(req, SfmSettings(colmap_bin=str(colmap), unordered_matching=mode, retrieval_top_k=2))
+    assert res.ok, res.error
+
+    calls = [json.loads(line) for line in (tmp_path / "sfm" / "calls.jsonl").read_text().splitlines()]
+    assert [c[0] for c in calls] == ["feature_extractor", expected, "mapper"]
+    if expected == "matches_importer":
+        opts = dict(zip(calls[1][1::2], calls[1][2::2]))
+        assert opts["--match_type"] == "pairs"
+        planned = Path(opts["--match_list_path"]).read_text().splitlines()
+        # default sequential_overlap=10 covers every pair of 6 images
+        assert len(planned) <= 6 * 2 if mode == "retrieval" else len(planned) == 15
@@ -0,0 +1,98 @@
+import json
+import sqlite3
+from pathlib import Path
+
+from ptb_ml.sfm.cache import MAX_IMAGE_ID
+from ptb_ml.sfm.engine import run_sfm
+from ptb_ml.sfm.models import SfmReq
+from ptb_ml.sfm.settings import SfmSettings
+from ptb_ml.sfm_qc.match_graph import analyze_match_graph, predict_blue
+from ptb_ml.sfm_qc.settings import SfmQcSettings
+
+# matcher verifies only consecutive pairs within chunks of CHUNK images
+FAKE_COLMAP = """\
+import json, os, sqlite3, sys
+from pathlib import Path
+
+CHUNK = int(os.environ.get("FAKE_CHUNK", "1000"))
+argv = sys.argv[1:]
+opts = dict(zip(argv[1::2], argv[2::2]))
+db = Path(opts["--database_path"])
+with (db.parent / "calls.jsonl").open("a") as f:
+    f.write(json.dumps(argv[0]) + "\\n")
+
+con = sqlite3.connect(db)
+con.execute("CREATE TABLE IF NOT EXISTS images(image_id INTEGER PRIMARY KEY, name TEXT)")
+con.execute("CREATE TABLE IF NOT EXISTS two_view_geometries"
+            "(pair_id INTEGER PRIMARY KEY, rows INTEGER, config INTEGER)")
+if argv[0] == "feature_extractor":
+    for n in sorted(os.listdir(opts["--image_path"])):
+        con.execute("INSERT INTO images(name) VALUES (?)", (n,))
+elif argv[0].endswith("_matcher"):
+    ids = [r[0] for r in con.execute("SELECT image_id FROM images ORDER BY image_id")]
+    for i, j in zip(ids, ids[1:]):
+        if (i - 1) // CHUNK == (j - 1) // CHUNK:
+            con.execute("INSERT INTO two_view_geometries VALUES (?, 500, 2)", (i * 2147483647 + j,))
+elif argv[0] == "mapper":
+    (Path(opts["--output_path"]) / "0").mkdir(parents=True)
+con.commit()
+"""
+
+
+def _make_db(path: Path, num_images: int, pairs: list[tuple[int, int, int, int]]) -> None:
+    with sqlite3.connect(path) as con:
+        con.execute("CREATE TABLE images(image_id INTEGER PRIMARY KEY, name TEXT)")
+        con.execute("CREATE TABLE two_view_geometries(pair_id INTEGER PRIMARY KEY, rows INTEGER, config INTEGER)")
+        con.executemany("INSERT INTO images VALUES (?, ?)", [(i, f"{i}.jpg") for i in range(1, num_images + 1)])
+        con.executemany(
+            "INSERT INTO two_view_geometries VALUES (?, ?, ?)",
+            [(i * MAX_IMAGE_ID + j, rows, config) for i, j, rows, config in pairs],
+        )
+
+
+def test_match_graph_stats(tmp_path: Path):
+    db = tmp_path / "database.db"
+    _make_db(db, 8, [
+        (1, 2, 100, 2), (2, 3, 200, 3), (1, 3, 40, 2),   # triangle
+        (4, 5, 60, 4),                                   # separate pair
+        (5, 6, 10, 2),                                   # too few inliers
+        (6, 7, 300, 1),                                  # degenerate geometry
+        (7, 99, 300, 2),                                 # image no longer in the database
+    ])
+    stats = analyze_match_graph(db, min_inliers=15, min_pairs_per_image=2)
+    assert stats.num_images == 8 and stats.num_verified_pairs == 4
+    assert stats.median_inliers == 80.0
+    assert stats.num_components == 5                     # {1,2,3} {4,5} {6} {7} {8}
+    assert stats.largest_component == 3 and stats.largest_component_inliers == 340
+    assert stats.frac_well_connected == 3 / 8
+
+    pred = predict_blue(stats, SfmQcSettings())
+    assert not pred.blue_reachable and pred.score_bound == 0.0
+
+
+def test_run_sfm_skips_mapper_on_fragmented_graph(tmp_path: Path, fake_colmap, monkeypatch):
+    colmap = fake_colmap(FAKE_COLMAP)
+    images = tmp_path / "frames"
+    images.mkdir()
+    for i in range(60):
+        (images / f"frame_{i:06d}.jpg").write_bytes(b"x")
+    req = SfmReq(job_id="j", image_dir=images, output_dir=tmp_path / "sfm", input_mode="sequential")
+    settings = SfmSettings(colmap_bin=str(colmap))
+    calls = tmp_path / "sfm" / "calls.jsonl"
+
+    # one chain over all frames: blue is still possible, the mapper runs
+    res = run_sfm(req, settings, SfmQcSettings())
+    assert res.ok and res.best_model_dir is not None and res.precheck_score_bound >= 0.5
+    assert json.loads(calls.read_text().splitlines()[-1]) == "mapper"
+
+    # fifteen disconnected chunks of 4: no model can reach min_registered_images
+    calls.unlink()
+    monkeypatch.setenv("FAKE_CHUNK", "4")
+    res = run_sfm(req, settings, SfmQcSettings())
+    assert not res.ok and res.best_model_dir is None
+    assert res.aborted.startswith("Mapper skipped by match-graph pre-check")
+    assert "mapper" not in [json.loads(l) for l in calls.read_text().splitlines()]
+
+    # without QC settings there is nothing to predict against
+    res = run_sfm(req, settings)
+    assert res.ok and res.precheck_score_bound is None
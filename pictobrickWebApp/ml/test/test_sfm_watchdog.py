@@ -0,0 +1,127 @@
+import struct
+import time
+from pathlib import Path
+
+import pytest
+
+from ptb_ml.sfm.colmap_runner import build_mapper_cmd
+from ptb_ml.sfm.engine import run_sfm
+from ptb_ml.sfm.models import SfmReq
+from ptb_ml.sfm.settings import SfmSettings
+from ptb_ml.sfm.watchdog import MapperAborted, MapperWatchdog
+from ptb_ml.sfm_qc.engine import run_sfm_qc
+from ptb_ml.sfm_qc.models import SfmQcReq
+from ptb_ml.sfm_qc.settings import SfmQcSettings
+
+# mapper that fails to register every image, then would keep going for a long time
+FAKE_COLMAP = """\
+import sys, time
+from pathlib import Path
+
+argv = sys.argv[1:]
+opts = dict(zip(argv[1::2], argv[2::2]))
+if argv[0] == "mapper":
+    assert "--Mapper.snapshot_path" in opts
+    print("Initializing with image pair #1 and #2", flush=True)
+    for image_id in range(3, 8):
+        for _ in range(int(opts.get("--Mapper.max_reg_trials", "3"))):
+            print(f"Registering image #{image_id} (2)", flush=True)
+            print("=> Could not register, trying another image.", flush=True)
+    time.sleep(60)
+    (Path(opts["--output_path"]) / "0").mkdir(parents=True)
+"""
+
+
+def _fail_image(dog: MapperWatchdog, image_id: int, trials: int) -> None:
+    for _ in range(trials):
+        dog.on_line("stdout", f"Registering image #{image_id} (num_reg_frames=2)")
+        dog.on_line("stdout", "=> Could not register, trying another image.")
+
+
+def _write_snapshot(path: Path, *, images: int, points: int, error: float) -> None:
+    path.mkdir(parents=True)
+    (path / "cameras.bin").write_bytes(struct.pack("<Q", 0))
+    with (path / "images.bin").open("wb") as f:
+        f.write(struct.pack("<Q", images))
+        for i in range(images):
+            f.write(struct.pack("<i4d3di", i + 1, 1, 0, 0, 0, 0, 0, 0, 1) + f"{i}.jpg\0".encode())
+            f.write(struct.pack("<Q", 0))
+    with (path / "points3D.bin").open("wb") as f:
+        f.write(struct.pack("<Q", points))
+        for k in range(points):
+            f.write(struct.pack("<Q3d3BdQ", k, 0, 0, 0, 0, 0, 0, error, 0))
+
+
+def test_registration_failures_bound_the_score():
+    dog = MapperWatchdog(num_images=20, qc_settings=SfmQcSettings(), max_reg_trials=2)
+    _fail_image(dog, 3, trials=1)
+    assert dog.registered_bound == 20           # a single failure may still be retried
+    for image_id in range(3, 18):
+        _fail_image(dog, image_id, trials=1 if image_id == 3 else 2)
+    assert dog.registered_bound == 5 and dog.last_bound > 0.5
+
+    # the sixth image out of reach drops below min_registered_images
+    with pytest.raises(MapperAborted, match="registered <= 4"):
+        _fail_image(dog, 18, trials=2)
+
+
+def test_snapshot_projection_and_stand_down(tmp_path: Path):
+    now = [0.0]
+    snaps = tmp_path / "snapshots"
+    snaps.mkdir()
+    dog = MapperWatchdog(num_images=100, qc_settings=SfmQcSettings(), max_reg_trials=3,
+                         snapshot_dir=snaps, clock=lambda: now[0])
+
+    # sparse but accurate so far: 20 points / 10 images still projects past the floors
+    _write_snapshot(snaps / "1000", images=10, points=20, error=1.5)
+    now[0] = 5.0
+    dog.on_line("stdout", "Registering image #12 (10)")
+    assert dog.snapshot.registered_images == 10
+    assert dog.projected_metrics().points3d == 300 and dog.last_bound >= 0.5
+
+    # reprojection error beyond max_reprojection_error even after the optimism slack
+    _write_snapshot(snaps / "1001", images=12, points=40, error=3.5)
+    now[0] = 10.0
+    with pytest.raises(MapperAborted):
+        dog.on_line("stdout", "Registering image #13 (12)")
+
+    # once a second model starts nothing can abort the mapper any more
+    dog2 = MapperWatchdog(num_images=10, qc_settings=SfmQcSettings(), max_reg_trials=1)
+    dog2.on_line("stdout", "Registering image #3 (2)")
+    dog2.on_line("stdout", "Initializing with image pair #5 and #6")
+    for image_id in range(5, 10):
+        _fail_image(dog2, image_id, trials=1)
+    assert dog2.registered_bound == 10
+
+
+def test_run_sfm_aborts_mapper_and_routes_orange(tmp_path: Path, fake_colmap):
+    colmap = fake_colmap(FAKE_COLMAP)
+    images = tmp_path / "frames"
+    images.mkdir()
+    for i in range(7):
+        (images / f"frame_{i:06d}.jpg").write_bytes(b"x")
+    req = SfmReq(job_id="j", image_dir=images, output_dir=tmp_path / "sfm", input_mode="sequential")
+
+    started = time.monotonic()
+    res = run_sfm(req, SfmSettings(colmap_bin=str(colmap), watchdog=True), SfmQcSettings())
+    assert time.monotonic() - started < 30
+    assert not res.ok and res.aborted and res.best_model_dir is None
+    assert not (tmp_path / "sfm" / "snapshots").exists()
+
+    qc = run_sfm_qc(SfmQcReq(job_id="j", sparse_model_dir=res.best_model_dir, num_input_images=7),
+                    SfmQcSettings())
+    assert qc.route == "orange" and not qc.ok
+
+
+def test_watchdog_only_adds_snapshot_flags(tmp_path: Path):
+    req = SfmReq(job_id="j", image_dir=tmp_path, output_dir=tmp_path, input_mode="sequential")
+    args = (tmp_path / "db", tmp_path / "sparse")
+    plain = build_mapper_cmd(req, SfmSettings(), *args)
+    watched = build_mapper_cmd(req, SfmSettings(watchdog=True), *args, snapshot_dir=tmp_path / "snap")
+    assert watched == plain + [
+        "--Mapper.snapshot_path", str(tmp_path / "snap"), "--Mapper.snapshot_frames_freq", "10",
+    ]
+    assert "--Mapper.max_reg_trials" not in watched
+
+    explicit = build_mapper_cmd(req, SfmSettings(mapper_max_reg_trials=2), *args)
+    assert explicit[explicit.index("--Mapper.max_reg_trials") + 1] == "2"